@@ -0,0 +1,275 @@
+"""
+Benchmarks of the history path and the CLI startup
+
+Runs against a local Frankfurter API stub (benchmarks/stub.py) with synthetic rates of
+1 day, 1 year and 25 years, each with 1 symbol and with all 30 symbols, and reports
+throughput (rows per second), peak Python memory and cold start time.
+Results are compared with benchmarks/baseline.json and the run fails on regressions.
+Baselines depend on the machine, update them where the benchmarks run:
+
+    python benchmarks/run.py                      # compare with the baseline
+    python benchmarks/run.py --update-baseline    # store current results as baseline
+    python benchmarks/run.py --filter 1y          # only benchmarks with 1y in their name
+"""
+import typing as t
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import exrates  # noqa: E402
+from exrates.client import FrankfurterClient  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STUB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub.py")
+BASE = 'EUR'
+PERIODS = {
+    '1d': ('2021-06-01', '2021-06-01'),
+    '1y': ('2020-06-01', '2021-05-31'),
+    '25y': ('1999-01-04', '2023-12-31'),
+}
+SYMBOLS = {
+    '1sym': ['USD'],
+    '30sym': [
+        'AUD', 'BGN', 'BRL', 'CAD', 'CHF', 'CNY', 'CZK', 'DKK', 'GBP', 'HKD', 'HUF', 'IDR', 'ILS', 'INR', 'ISK',
+        'JPY', 'KRW', 'MXN', 'MYR', 'NOK', 'NZD', 'PHP', 'PLN', 'RON', 'SEK', 'SGD', 'THB', 'TRY', 'USD', 'ZAR'
+    ],
+}
+# Metrics compared with the baseline, the first one a benchmark has is used for time
+TIME_METRICS = ('rows_per_second', 'seconds')
+# Metrics where a higher value is better, others are better lower
+HIGHER_IS_BETTER = {'rows_per_second'}
+DEFAULT_TOLERANCE = 0.35
+DEFAULT_MEMORY_TOLERANCE = 0.10
+DEFAULT_REPEAT = 5
+# Minimum duration of each timed sample
+MIN_SAMPLE_SECONDS = 0.1
+COLD_START_RUNS = 7
+
+
+@contextlib.contextmanager
+def stub_server() -> t.Iterator[str]:
+    """
+    Starts the API stub in another process, so its allocations are not measured
+    :return: Base URL of the stub
+    """
+    process = subprocess.Popen([sys.executable, STUB_PATH], stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(process.stdout.readline())
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def timed(fn: t.Callable[[], int], loops: int) -> float:
+    # Seconds of a number of runs, without garbage collection as timeit does
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        return time.perf_counter() - started
+    finally:
+        gc.enable()
+
+
+def measure(fn: t.Callable[[], int], repeat: int) -> t.Dict[str, float]:
+    """
+    Measures the best time of a function over several samples, then its peak memory in another run
+    Each sample runs the function enough times to last MIN_SAMPLE_SECONDS.
+    The first run is not measured, so responses of the stub are recorded
+    :param fn: Function to measure, returning the number of processed rows
+    :param repeat: Number of timed samples
+    :return: Dict of metrics
+    """
+    rows = fn()
+    loops = 1
+    while timed(fn, loops) < MIN_SAMPLE_SECONDS:
+        loops *= 2
+    best = min(timed(fn, loops) for _ in range(repeat)) / loops
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'rows': rows, 'seconds': best, 'rows_per_second': rows / best, 'peak_bytes': peak}
+
+
+def history_benchmarks(output_dir: str) -> t.Dict[str, t.Callable[[], int]]:
+    """
+    Builds the history benchmarks of every period and symbols combination
+    :param output_dir: Directory of written files
+    :return: Dict of benchmark names and functions
+    """
+    benchmarks = {}
+    for period, (start, end) in PERIODS.items():
+        for symbols_name, symbols in SYMBOLS.items():
+            name = f"{period}-{symbols_name}"
+            recorded = {}
+
+            def parse(start=start, end=end, symbols=symbols, recorded=recorded) -> int:
+                # Parsing and row building of a response recorded on the first run, without HTTP
+                if not recorded:
+                    recorded['raw'] = exrates.frankfurter_get_call(exrates.history_url(start, end, BASE, symbols))
+                return len(exrates.history_rows(exrates.parse_rates(recorded['raw'], start, end), BASE))
+
+            def history_print(start=start, end=end, symbols=symbols) -> int:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    return len(exrates.exrates_history(start, end, BASE, symbols, printable=True))
+
+            def history_write(start=start, end=end, symbols=symbols, name=name) -> int:
+                return exrates.stream_history(
+                    start, end, BASE, symbols, os.path.join(output_dir, name), printable=False
+                )
+
+            benchmarks[f"parse/{name}"] = parse
+            benchmarks[f"print/{name}"] = history_print
+            benchmarks[f"write_jsonl/{name}"] = history_write
+    return benchmarks
+
+
+def cold_start(code: str, env: t.Dict[str, str]) -> t.Dict[str, float]:
+    """
+    Measures the median time of running Python code in a new interpreter
+    :param code: Code to run
+    :param env: Environment of the interpreter
+    :return: Dict of metrics
+    """
+    timings = []
+    for _ in range(COLD_START_RUNS):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, env=env, cwd=ROOT, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return {'seconds': statistics.median(timings)}
+
+
+def cold_start_benchmarks(cache_dir: str) -> t.Tuple[t.Dict[str, str], t.Dict[str, str]]:
+    """
+    Builds the benchmarks of import and argument parsing time
+    A fresh currencies cache is written, so the API is not called
+    :param cache_dir: Directory of the currencies cache
+    :return: Dict of benchmark names and code to run, and the environment to run it with
+    """
+    cache_path = os.path.join(cache_dir, "currencies.json")
+    exrates.write_currencies_cache(exrates.FALLBACK_CURRENCIES, cache_path)
+    env = {**os.environ, "EXRATES_CURRENCIES_CACHE": cache_path, "PYTHONPATH": ROOT}
+    benchmarks = {
+        'cold_start/interpreter': "pass",
+        'cold_start/import': "import exrates",
+        'cold_start/parse_args': "import exrates; exrates.parse_args(['history', '--symbol', 'USD'])",
+    }
+    return benchmarks, env
+
+
+def run(name_filter: str, repeat: int) -> t.Dict[str, t.Dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir, stub_server() as base_url:
+        client = FrankfurterClient(base_url)
+        exrates.set_client(client)
+        # Print and write benchmarks of the baseline were measured with compact JSON output
+        compact, exrates.jsonlib.COMPACT = exrates.jsonlib.COMPACT, True
+        try:
+            for name, fn in history_benchmarks(temp_dir).items():
+                if name_filter in name:
+                    results[name] = measure(fn, repeat)
+                    print(f"{name:28} {format_metrics(results[name])}", file=sys.stderr)
+        finally:
+            exrates.jsonlib.COMPACT = compact
+            exrates.set_client(None)
+            client.close()
+        benchmarks, env = cold_start_benchmarks(temp_dir)
+        for name, code in benchmarks.items():
+            if name_filter in name:
+                results[name] = cold_start(code, env)
+                print(f"{name:28} {format_metrics(results[name])}", file=sys.stderr)
+    return results
+
+
+def format_metrics(metrics: t.Dict[str, float]) -> str:
+    parts = [f"{metrics['seconds'] * 1000:9.2f} ms"]
+    if 'rows_per_second' in metrics:
+        parts.append(f"{metrics['rows_per_second']:12,.0f} rows/s")
+    if 'peak_bytes' in metrics:
+        parts.append(f"{metrics['peak_bytes'] / 1024:10,.0f} KiB peak")
+    return "  ".join(parts)
+
+
+def regressions(
+        results: t.Dict[str, t.Dict[str, float]],
+        baseline: t.Dict[str, t.Dict[str, float]],
+        tolerance: float,
+        memory_tolerance: float
+) -> t.List[str]:
+    """
+    Compares results with a baseline
+    :param results: Dict of benchmark names and metrics
+    :param baseline: Dict of benchmark names and metrics of the baseline
+    :param tolerance: Relative loss of throughput or time allowed
+    :param memory_tolerance: Relative increase of peak memory allowed
+    :return: List of regression descriptions
+    """
+    found = []
+    for name, metrics in results.items():
+        time_metric = next(metric for metric in TIME_METRICS if metric in metrics)
+        for metric in (time_metric, 'peak_bytes'):
+            if metric not in metrics or metric not in baseline.get(name, {}):
+                continue
+            expected, value = baseline[name][metric], metrics[metric]
+            allowed = memory_tolerance if metric == 'peak_bytes' else tolerance
+            if metric in HIGHER_IS_BETTER:
+                regressed = value < expected * (1 - allowed)
+            else:
+                regressed = value > expected * (1 + allowed)
+            if regressed:
+                found.append(f"{name} {metric}: {value:,.4g} (baseline {expected:,.4g})")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Exrates benchmarks")
+    parser.add_argument('--filter', default='', help="Only run benchmarks whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Timed runs of each benchmark")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative loss of throughput or time allowed")
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE,
+                        help="Relative increase of peak memory allowed")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Path of baseline file")
+    parser.add_argument('--update-baseline', action='store_true', help="Store results as the new baseline")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.repeat)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as outfile:
+            json.dump({'python': platform.python_version(), 'results': results}, outfile, indent=2, sort_keys=True)
+            outfile.write('\n')
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline", file=sys.stderr)
+        return 1
+    with open(args.baseline, encoding='utf-8') as infile:
+        baseline = json.load(infile)['results']
+    found = regressions(results, baseline, args.tolerance, args.memory_tolerance)
+    for regression in found:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
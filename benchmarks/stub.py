@@ -0,0 +1,132 @@
+"""
+Local Frankfurter API stub serving synthetic rates
+
+Rates are deterministic functions of the day and currency, published on weekdays.
+Each response is built once and then served from memory, as a recorded response would be,
+so benchmarks measure the client and not the stub.
+
+Run standalone, it prints the port it listens on:
+    python benchmarks/stub.py [--port PORT]
+"""
+import typing as t
+import argparse
+import json
+import math
+import sys
+import threading
+from datetime import date as Date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Currencies published against EUR, with a reference rate
+CURRENCIES = {
+    'AUD': 1.5, 'BGN': 1.9558, 'BRL': 6.2, 'CAD': 1.5, 'CHF': 1.08, 'CNY': 7.8, 'CZK': 25.5,
+    'DKK': 7.44, 'GBP': 0.88, 'HKD': 9.4, 'HUF': 360.0, 'IDR': 17000.0, 'ILS': 3.9, 'INR': 88.0,
+    'ISK': 155.0, 'JPY': 130.0, 'KRW': 1350.0, 'MXN': 24.0, 'MYR': 5.0, 'NOK': 10.3, 'NZD': 1.65,
+    'PHP': 58.0, 'PLN': 4.5, 'RON': 4.87, 'SEK': 10.1, 'SGD': 1.6, 'THB': 37.0, 'TRY': 9.5,
+    'USD': 1.2, 'ZAR': 17.5
+}
+
+
+def synthetic_rate(day: Date, symbol: str) -> float:
+    """
+    Computes the EUR based rate of a currency on a day
+    :param day: Date
+    :param symbol: Currency
+    :return: Rate, rounded to 5 significant digits
+    """
+    if symbol == 'EUR':
+        return 1.0
+    index = sorted(CURRENCIES).index(symbol)
+    value = CURRENCIES[symbol] * (1 + 0.1 * math.sin(day.toordinal() / 50 + index))
+    return float(f"{value:.5g}")
+
+
+def day_rates(day: Date, base: str, symbols: t.List[str]) -> t.Dict[str, float]:
+    divisor = synthetic_rate(day, base)
+    return {
+        symbol: float(f"{synthetic_rate(day, symbol) / divisor:.5g}")
+        for symbol in symbols
+        if symbol != base
+    }
+
+
+def build_response(path: str, query: t.Dict[str, t.List[str]]) -> t.Dict:
+    """
+    Builds the response of the Frankfurter API to a path
+    :param path: Path without leading slash, e.g. currencies or 2021-01-01..2021-12-31
+    :param query: Parsed query string
+    :return: JSON response
+    """
+    if path == 'currencies':
+        return {symbol: symbol for symbol in ['EUR', *CURRENCIES]}
+    base = query.get('from', ['EUR'])[0]
+    symbols = query['to'][0].split(',') if query.get('to') else [s for s in ['EUR', *CURRENCIES] if s != base]
+    start, _, end = path.partition('..')
+    first = Date.fromisoformat(start)
+    if not end:
+        # Previous publication for days without one
+        while first.weekday() >= 5:
+            first -= timedelta(days=1)
+        return {'amount': 1.0, 'base': base, 'date': first.isoformat(), 'rates': day_rates(first, base, symbols)}
+    last = Date.fromisoformat(end)
+    rates = {}
+    day = first
+    while day <= last:
+        if day.weekday() < 5:
+            rates[day.isoformat()] = day_rates(day, base, symbols)
+        day += timedelta(days=1)
+    return {'amount': 1.0, 'base': base, 'start_date': first.isoformat(), 'end_date': last.isoformat(), 'rates': rates}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are sent separately, do not wait for the ACK of the headers
+    disable_nagle_algorithm = True
+    server: 'StubServer'
+
+    def do_GET(self) -> None:
+        body = self.server.response(self.path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: t.Tuple[str, int]):
+        super().__init__(address, StubHandler)
+        self._lock = threading.Lock()
+        self._responses: t.Dict[str, bytes] = {}
+
+    def response(self, path: str) -> bytes:
+        with self._lock:
+            body = self._responses.get(path)
+        if body is None:
+            url = urlsplit(path)
+            body = json.dumps(build_response(url.path.lstrip('/'), parse_qs(url.query))).encode('utf-8')
+            with self._lock:
+                self._responses[path] = body
+        return body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Frankfurter API stub with synthetic rates")
+    parser.add_argument('--port', type=int, default=0, help="Port to listen on. Any free port by default")
+    args = parser.parse_args()
+    with StubServer(("127.0.0.1", args.port)) as server:
+        print(server.server_address[1], flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
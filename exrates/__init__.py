@@ -1,11 +1,52 @@
+from __future__ import annotations
 import typing as t
 import argparse
-import requests
+import importlib
 import logging
 import os
 import sys
 import json
-from datetime import datetime
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from exrates import jsonlib, sources
+from exrates.store import DEFAULT_TODAY_TTL
+from exrates.singleflight import normalize_url
+from exrates.business_days import PublicationCalendar
+from exrates.metrics import Metrics
+from exrates.cross import ANCHOR_CURRENCY, anchor_symbols, derive_rates
+from exrates.writers import BATCH_SIZE as WRITE_BATCH_SIZE
+
+# The HTTP stack, the rate store and file formats are only imported when used,
+# so short CLI runs do not pay for them
+if t.TYPE_CHECKING:
+    from exrates.client import FrankfurterClient
+    from exrates.columnar import HistoryTable
+    from exrates.snapshot import Snapshot
+    from exrates.store import RateStore
+
+# Names of submodules available as exrates attributes, imported on first access
+LAZY_ATTRIBUTES = {
+    'FrankfurterClient': 'exrates.client',
+    'HistoryTable': 'exrates.columnar',
+    'RateStore': 'exrates.store',
+    'Snapshot': 'exrates.snapshot',
+    'WRITERS': 'exrates.writers',
+    'get_writer': 'exrates.writers',
+    'last_dates': 'exrates.writers',
+}
+
+
+def __getattr__(name: str) -> t.Any:
+    module_name = LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
 
 logger = logging.getLogger(__name__)
 
@@ -14,20 +55,289 @@ DEFAULT_DATE = datetime.now().strftime('%Y-%m-%d')
 FRANKFURTER_API_BASE_URL = "https://api.frankfurter.app"
 MIN_DATE = "1999-01-04"
 MIN_DATETIME = datetime.strptime(MIN_DATE, '%Y-%m-%d')
+# Path of the SQLite rate store. If not set, rates are always requested to the API
+RATE_STORE_PATH = os.environ.get("EXRATES_RATE_STORE")
+RATE_STORE_TODAY_TTL = float(os.environ.get("EXRATES_RATE_STORE_TTL", DEFAULT_TODAY_TTL))
+# Path of the SQLite cache of API responses and their validators. If not set, they are kept in memory
+HTTP_CACHE_PATH = os.environ.get("EXRATES_HTTP_CACHE")
+# Path of a snapshot file. If set, rates are read from it instead of the API
+SNAPSHOT_PATH = os.environ.get("EXRATES_SNAPSHOT")
+# Days to look back for the last publication when converting on a day without rates
+CONVERT_LOOKBACK_DAYS = 10
+# Days of each request a history range is split in, concurrent requests and retries of a failed one
+HISTORY_CHUNK_DAYS = int(os.environ.get("EXRATES_HISTORY_CHUNK_DAYS", 366))
+HISTORY_MAX_WORKERS = int(os.environ.get("EXRATES_HISTORY_MAX_WORKERS", 4))
+HISTORY_CHUNK_RETRIES = 2
+# If true, only EUR based rates are retrieved and other pairs are derived from them
+CROSS_RATES = os.environ.get("EXRATES_CROSS_RATES", "").lower() in ("1", "true", "yes")
+# Frankfurter rounds rates and conversions to this number of significant digits
+SIGNIFICANT_DIGITS = 5
+
+# File where supported currencies are cached, and seconds before it is stale
+CURRENCIES_CACHE_PATH = os.environ.get(
+    "EXRATES_CURRENCIES_CACHE",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "exrates",
+        "currencies.json"
+    )
+)
+CURRENCIES_CACHE_TTL = float(os.environ.get("EXRATES_CURRENCIES_TTL", 7 * 24 * 3600))
+# Minimum seconds between API calls to refresh supported currencies
+CURRENCIES_CHECK_INTERVAL = 3600.0
+# Currencies supported by the Frankfurter API, used when the API cannot be reached
+FALLBACK_CURRENCIES = {
+    'AUD': 'Australian Dollar', 'BGN': 'Bulgarian Lev', 'BRL': 'Brazilian Real',
+    'CAD': 'Canadian Dollar', 'CHF': 'Swiss Franc', 'CNY': 'Chinese Renminbi Yuan',
+    'CZK': 'Czech Koruna', 'DKK': 'Danish Krone', 'EUR': 'Euro',
+    'GBP': 'British Pound', 'HKD': 'Hong Kong Dollar', 'HUF': 'Hungarian Forint',
+    'IDR': 'Indonesian Rupiah', 'ILS': 'Israeli New Sheqel', 'INR': 'Indian Rupee',
+    'ISK': 'Icelandic Króna', 'JPY': 'Japanese Yen', 'KRW': 'South Korean Won',
+    'MXN': 'Mexican Peso', 'MYR': 'Malaysian Ringgit', 'NOK': 'Norwegian Krone',
+    'NZD': 'New Zealand Dollar', 'PHP': 'Philippine Peso', 'PLN': 'Polish Złoty',
+    'RON': 'Romanian Leu', 'SEK': 'Swedish Krona', 'SGD': 'Singapore Dollar',
+    'THB': 'Thai Baht', 'TRY': 'Turkish Lira', 'USD': 'United States Dollar',
+    'ZAR': 'South African Rand'
+}
+
+_rate_store: t.Optional[RateStore] = None
+_client: t.Optional[FrankfurterClient] = None
+_snapshot: t.Optional[Snapshot] = None
+_calendar: t.Optional[PublicationCalendar] = None
+_metrics: t.Optional[Metrics] = None
+
+
+def get_client() -> FrankfurterClient:
+    """
+    Retrieves the HTTP client shared by every API call
+    It is created on first use for FRANKFURTER_API_BASE_URL,
+    with a response cache in HTTP_CACHE_PATH, or in memory if not set
+    :return: Shared FrankfurterClient
+    """
+    global _client
+    if _client is None:
+        from exrates.client import FrankfurterClient
+        from exrates.httpcache import HttpCache
+        _client = FrankfurterClient(FRANKFURTER_API_BASE_URL, cache=HttpCache(HTTP_CACHE_PATH or ':memory:'))
+    return _client
+
+
+def set_client(client: t.Optional[FrankfurterClient]) -> None:
+    """
+    Replaces the HTTP client shared by every API call
+    :param client: FrankfurterClient to use. None to create a default one on next use
+    """
+    global _client
+    _client = client
+
+
+def get_rate_store() -> t.Optional[RateStore]:
+    """
+    Retrieves the rate store shared by history and convert calls
+    It is opened on first use from RATE_STORE_PATH
+    :return: Shared RateStore, None if no store is configured
+    """
+    global _rate_store
+    if _rate_store is None and RATE_STORE_PATH:
+        from exrates.store import RateStore
+        _rate_store = RateStore(RATE_STORE_PATH, RATE_STORE_TODAY_TTL)
+    return _rate_store
+
+
+def set_rate_store(store: t.Optional[RateStore]) -> None:
+    """
+    Replaces the rate store shared by history and convert calls
+    :param store: RateStore to use. None to always request rates to the API
+    """
+    global _rate_store
+    _rate_store = store
 
 
-def supported_currencies() -> t.Dict[str, str]:
+def get_snapshot() -> t.Optional[Snapshot]:
+    """
+    Retrieves the snapshot read by history and convert calls instead of the API
+    It is opened on first use from SNAPSHOT_PATH
+    :return: Shared Snapshot, None if no snapshot is configured
+    """
+    global _snapshot
+    if _snapshot is None and SNAPSHOT_PATH:
+        from exrates.snapshot import Snapshot
+        _snapshot = Snapshot(SNAPSHOT_PATH)
+    return _snapshot
+
+
+def set_snapshot(snapshot: t.Optional[Snapshot]) -> None:
+    """
+    Replaces the snapshot read by history and convert calls instead of the API
+    :param snapshot: Snapshot to use. None to use the API
+    """
+    global _snapshot
+    _snapshot = snapshot
+
+
+def get_calendar() -> PublicationCalendar:
+    """
+    Retrieves the publication calendar consulted before requesting rates
+    :return: Shared PublicationCalendar
+    """
+    global _calendar
+    if _calendar is None:
+        _calendar = PublicationCalendar()
+    return _calendar
+
+
+def set_calendar(calendar: t.Optional[PublicationCalendar]) -> None:
+    """
+    Replaces the publication calendar consulted before requesting rates
+    :param calendar: PublicationCalendar to use. None to create a default one on next use
+    """
+    global _calendar
+    _calendar = calendar
+
+
+def get_metrics() -> Metrics:
+    """
+    Retrieves the timers and counters of API calls and history stages
+    :return: Shared Metrics
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def set_metrics(metrics: t.Optional[Metrics]) -> None:
+    """
+    Replaces the timers and counters of API calls and history stages
+    :param metrics: Metrics to use. None to create a default one on next use
+    """
+    global _metrics
+    _metrics = metrics
+
+
+def supported_currencies(strict: bool = False) -> t.Dict[str, str]:
     """
     Retrieves supported currencies by the Frankfurter API
+    :param strict: If true, error responses raise instead of being decoded
     :return: Dict with currencies symbols as keys and description as value
     """
-    response = requests.get(f"{FRANKFURTER_API_BASE_URL}/currencies")
+    import requests
+    metrics = get_metrics()
+    with metrics.timer('fetch'):
+        try:
+            content = get_client().get_content("currencies")
+        except requests.exceptions.HTTPError as ex:
+            logger.error(f"Cannot get currency list, API unavailable: {ex}")
+            if strict:
+                raise
+            content = ex.response.content
+
+    with metrics.timer('decode'):
+        return jsonlib.loads(content)
+
+
+def read_currencies_cache(path: str = None) -> t.Tuple[t.Optional[t.Dict[str, str]], float, float]:
+    """
+    Reads the supported currencies cache file
+    :param path: Path of the cache file. CURRENCIES_CACHE_PATH by default
+    :return: Tuple of cached currencies (None if there is no valid cache),
+            epoch of the last successful API call and epoch of the last API call attempt
+    """
+    path = CURRENCIES_CACHE_PATH if path is None else path
     try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as ex:
-        logger.error(f"Cannot get currency list, API unavailable: {ex}")
+        with open(path, 'r', encoding='utf-8') as infile:
+            cache = json.load(infile)
+        return cache['currencies'], cache['fetched_at'], cache.get('checked_at', cache['fetched_at'])
+    except (OSError, ValueError, KeyError, TypeError) as ex:
+        logger.debug(f"No valid currencies cache at {path}: {ex}")
+        return None, 0.0, 0.0
 
-    return response.json()
+
+def write_currencies_cache(
+        currencies: t.Dict[str, str],
+        path: str = None,
+        fetched_at: t.Optional[float] = None,
+        checked_at: t.Optional[float] = None
+) -> None:
+    """
+    Writes the supported currencies cache file
+    The file is replaced atomically, so concurrent CLI runs never read a partial file
+    :param currencies: Dict with currencies symbols as keys and description as value
+    :param path: Path of the cache file. CURRENCIES_CACHE_PATH by default
+    :param fetched_at: Epoch of the last successful API call. Current time by default
+    :param checked_at: Epoch of the last API call attempt. fetched_at by default
+    """
+    path = CURRENCIES_CACHE_PATH if path is None else path
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    checked_at = fetched_at if checked_at is None else checked_at
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as outfile:
+            json.dump({'fetched_at': fetched_at, 'checked_at': checked_at, 'currencies': currencies}, outfile)
+        os.replace(temp_path, path)
+    except OSError as ex:
+        logger.warning(f"Cannot write currencies cache to {path}: {ex}")
+
+
+def valid_currencies(currencies: t.Any) -> bool:
+    """
+    Checks if a decoded currency list can be cached
+    :param currencies: Currency list as decoded from the API
+    :return: True if it is a non empty dict of 3-letter uppercase symbols and their names
+    """
+    return isinstance(currencies, dict) and bool(currencies) and all(
+        isinstance(symbol, str) and re.fullmatch('[A-Z]{3}', symbol) and isinstance(name, str)
+        for symbol, name in currencies.items()
+    )
+
+
+def cached_currencies(
+        refresh: bool = False,
+        path: str = None,
+        ttl: float = None
+) -> t.Dict[str, str]:
+    """
+    Retrieves supported currencies, using the cache file while it is not stale
+    When the API cannot be reached or answers an error, a stale cache or FALLBACK_CURRENCIES are used.
+    The API is called at most once every CURRENCIES_CHECK_INTERVAL seconds
+    :param refresh: If true, the API is called even if the cache is not stale
+    :param path: Path of the cache file. CURRENCIES_CACHE_PATH by default
+    :param ttl: Seconds before the cache is stale. CURRENCIES_CACHE_TTL by default
+    :return: Dict with currencies symbols as keys and description as value
+    """
+    ttl = CURRENCIES_CACHE_TTL if ttl is None else ttl
+    currencies, fetched_at, checked_at = read_currencies_cache(path)
+    now = time.time()
+    stale = currencies is None or now - fetched_at >= ttl
+    if not (stale or refresh) or now - checked_at < CURRENCIES_CHECK_INTERVAL:
+        get_metrics().count('currencies_cache_hits')
+        return currencies if currencies is not None else dict(FALLBACK_CURRENCIES)
+
+    get_metrics().count('currencies_cache_misses')
+    import requests
+    try:
+        # Error responses are a failed refresh, never a currency list
+        fetched = supported_currencies(strict=True)
+        if not valid_currencies(fetched):
+            raise ValueError(f"Unexpected currency list: {fetched}")
+        write_currencies_cache(fetched, path)
+        return fetched
+    except (requests.exceptions.RequestException, ValueError) as ex:
+        logger.warning(f"Cannot refresh currency list, using cached values: {ex}")
+    currencies = currencies if currencies is not None else dict(FALLBACK_CURRENCIES)
+    # Record the attempt so following runs do not call the API again right away
+    write_currencies_cache(currencies, path, fetched_at=fetched_at, checked_at=now)
+    return currencies
+
+
+def current_date() -> str:
+    """
+    Computes today's date when called. DEFAULT_DATE is only today's date when exrates is imported,
+    so long running processes use this instead
+    :return: Today's date (YYYY-MM-DD format)
+    """
+    return datetime.now().strftime('%Y-%m-%d')
 
 
 def valid_date(s: str) -> datetime:
@@ -51,18 +361,33 @@ def valid_date(s: str) -> datetime:
 def frankfurter_get_call(url: str) -> t.Dict:
     """
     Calls Frankfurter API via GET on given path
+    Concurrent calls of the same path share a single request and its response
+    :param url: path to call to
+    :return: API response as a Dict. Shared, it must not be mutated
+    """
+    client = get_client()
+    return client.flight.do(normalize_url(url), request_json, client, url)
+
+
+def request_json(client: FrankfurterClient, url: str) -> t.Dict:
+    """
+    Requests a path of Frankfurter API and decodes its response
+    :param client: FrankfurterClient to use
     :param url: path to call to
     :return: API response as a Dict
     """
+    import requests
+    metrics = get_metrics()
     try:
-        response = requests.get(f"{FRANKFURTER_API_BASE_URL}/{url}")
-        response.raise_for_status()
-        return response.json()
+        with metrics.timer('fetch'):
+            content = client.get_content(url)
+        with metrics.timer('decode'):
+            return jsonlib.loads(content)
     except requests.exceptions.HTTPError as ex:
         logger.error(f"Cannot get currency list, API unavailable: {ex}")
         raise
     # This error might occur instead of a 404 in the Frankfurter API
-    # Assume this means empty data
+    # Assume this means empty data. It is neither cached, nor stored for publication days
     except requests.exceptions.ChunkedEncodingError as ex:
         logger.info(f"Invalid chunk encoding when calling API: {ex}")
         return {}
@@ -72,13 +397,452 @@ def frankfurter_get_call(url: str) -> t.Dict:
         raise
 
 
-def exrates_history(
+def round_significant(value: float, digits: int = SIGNIFICANT_DIGITS) -> float:
+    """
+    Rounds a value to a number of significant digits, the same way Frankfurter API does
+    :param value: Value to round
+    :param digits: Number of significant digits
+    :return: Rounded value
+    """
+    return float(f"{value:.{digits}g}")
+
+
+def history_url(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str]
+) -> str:
+    """
+    Builds the Frankfurter API path to get exchange rates on a period
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :return: API path
+    """
+    if (end == DEFAULT_DATE and end == start) or end == start:
+        # When end date and start date is equal to today's date
+        # We build without .. param which causes ChunkEncodingError in API request
+        # Also for simplicity of response, when both end and start are the same date
+        return f"{start}" \
+               f"?from={base}" \
+               f"&to={','.join(symbol)}"
+    return f"{start}" \
+           f".." \
+           f"{end}" \
+           f"?from={base}" \
+           f"&to={','.join(symbol)}"
+
+
+def parse_rates(
+        raw_data: t.Dict,
+        start: str,
+        end: str
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Normalizes a Frankfurter API response to the rates of a period
+    The format received varies if an end date is given
+    :param raw_data: API response
+    :param start: Date of first day of the period (YYYY-MM-DD format)
+    :param end: Date of last day of the period (YYYY-MM-DD format)
+    :return: Dict of dates to a dict of symbols and rates
+    """
+    # Check that dates within response are between our params
+    # For example, if start = today and API data is not yet live
+    # we are sent yesterday's data
+    # In this case, sent empty response
+    if len(raw_data) == 0:
+        return {}
+    if 'end_date' in raw_data:
+        return {
+            date: rates
+            for date, rates in raw_data['rates'].items()
+            if start <= date <= end
+        }
+    if start <= raw_data['date'] <= end:
+        return {raw_data['date']: raw_data['rates']}
+    return {}
+
+
+def split_range(start: str, end: str, days: int) -> t.List[t.Tuple[str, str]]:
+    """
+    Splits a period in consecutive windows
+    :param start: Date of first day of the period (YYYY-MM-DD format)
+    :param end: Date of last day of the period (YYYY-MM-DD format)
+    :param days: Maximum number of days of each window
+    :return: List of (start, end) tuples of each window, in date order
+    """
+    window_start = datetime.strptime(start, '%Y-%m-%d')
+    last = datetime.strptime(end, '%Y-%m-%d')
+    windows = []
+    while window_start <= last:
+        window_end = min(window_start + timedelta(days=days - 1), last)
+        windows.append((window_start.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d')))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+
+def request_chunk(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str]
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Requests exchange rates on a period to the Frankfurter API in a single call
+    Days without publication at the ends of the period are not requested
+    The call is retried up to HISTORY_CHUNK_RETRIES times if it fails with a transient error
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :return: Dict of dates to a dict of symbols and rates
+    """
+    return sources.run(sources.chunk_plan(start, end, base, symbol))
+
+
+def request_rates(
         start: str,
         end: str,
         base: str,
         symbol: t.List[str],
+        chunk_days: t.Optional[int] = None,
+        max_workers: t.Optional[int] = None
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Requests exchange rates on a period to the Frankfurter API
+    Long periods are split in chunks which are requested concurrently
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param chunk_days: Maximum number of days of each request. HISTORY_CHUNK_DAYS by default
+    :param max_workers: Maximum number of concurrent requests. HISTORY_MAX_WORKERS by default
+    :return: Dict of dates to a dict of symbols and rates
+    """
+    chunks = split_range(start, end, chunk_days or HISTORY_CHUNK_DAYS)
+    if len(chunks) == 1:
+        return request_chunk(start, end, base, symbol)
+
+    logger.debug(f"Requesting {len(chunks)} chunks from {start} to {end}")
+    from concurrent.futures import ThreadPoolExecutor
+    rates = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers or HISTORY_MAX_WORKERS, len(chunks))) as executor:
+        # Results are merged in chunk order, so dates keep ascending order
+        for chunk_rates in executor.map(lambda chunk: request_chunk(*chunk, base, symbol), chunks):
+            rates.update(chunk_rates)
+    return rates
+
+
+def fetch_rates(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Retrieves exchange rates on a period
+    If a snapshot is configured, rates are only read from it.
+    If a rate store is available it is consulted first,
+    and only missing or stale days and symbols are requested to the API.
+    If CROSS_RATES is set, rates are derived from EUR based rates
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to use. Shared store by default
+    :return: Dict of dates to a dict of symbols and rates
+    """
+    return sources.run(sources.rates_plan(start, end, base, symbol, store))
+
+
+def history_rows(rates: t.Dict[str, t.Dict[str, float]], base: str) -> t.List[t.Dict]:
+    """
+    Builds the output rows of a history query
+    :param rates: Dict of dates to a dict of symbols and rates
+    :param base: Original currency
+    :return: List of dicts with date, base, symbol and rate keys
+    """
+    with get_metrics().timer('transform'):
+        return [
+            {
+                'date': date,
+                'base': base,
+                'symbol': symbol,
+                'rate': rate
+            }
+            for date in rates
+            for symbol, rate in rates[date].items()
+        ]
+
+
+def iter_rates(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None
+) -> t.Iterator[t.Tuple[str, t.Dict[str, float]]]:
+    """
+    Lazily retrieves exchange rates on a period, in date order
+    The period is split in HISTORY_CHUNK_DAYS chunks. Up to HISTORY_MAX_WORKERS chunks
+    are retrieved ahead of the one being consumed, so memory does not grow with the period
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: Iterator of (date, dict of symbols and rates) tuples
+    """
+    chunks = split_range(start, end, HISTORY_CHUNK_DAYS)
+    if len(chunks) == 1:
+        yield from fetch_rates(start, end, base, symbol, store).items()
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=min(HISTORY_MAX_WORKERS, len(chunks)))
+    pending = deque()
+    try:
+        for chunk_start, chunk_end in chunks:
+            pending.append(executor.submit(fetch_rates, chunk_start, chunk_end, base, symbol, store))
+            if len(pending) >= HISTORY_MAX_WORKERS:
+                yield from pending.popleft().result().items()
+        while pending:
+            yield from pending.popleft().result().items()
+    finally:
+        # Stop pending chunks if the iterator is not consumed until the end
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_history(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None
+) -> t.Iterator[t.Dict]:
+    """
+    Lazily retrieves historic exchange rates for a given currency
+    to a set of currencies on a given period
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: Iterator of dicts with date, base, symbol and rate keys
+    """
+    metrics = get_metrics()
+    for date, rates in iter_rates(start, end, base, symbol, store):
+        # Rows of each day are built at once, so timing does not include consumers
+        with metrics.timer('transform'):
+            rows = [
+                {
+                    'date': date,
+                    'base': base,
+                    'symbol': rate_symbol,
+                    'rate': rate
+                }
+                for rate_symbol, rate in rates.items()
+            ]
+        yield from rows
+
+
+def iter_cross_history(
+        start: str,
+        end: str,
+        bases: t.List[str],
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None
+) -> t.Iterator[t.Dict]:
+    """
+    Lazily retrieves historic exchange rates of several base currencies on a period
+    Only EUR based rates of every currency involved are retrieved, in a single request per chunk,
+    and the rates of each base are derived from them as the API does
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param bases: List of original currencies
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: Iterator of dicts with date, base, symbol and rate keys, by date and then by base
+    """
+    metrics = get_metrics()
+    needed = anchor_symbols(ANCHOR_CURRENCY, [*bases, *symbol])
+    for date, anchor_rates in iter_rates(start, end, ANCHOR_CURRENCY, needed, store):
+        with metrics.timer('transform'):
+            rows = [
+                {
+                    'date': date,
+                    'base': base,
+                    'symbol': rate_symbol,
+                    'rate': rate
+                }
+                for base in bases
+                for rate_symbol, rate in derive_rates(anchor_rates, base, symbol).items()
+            ]
+        yield from rows
+
+
+def iter_new_history(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        known_dates: t.Dict[str, str],
+        store: t.Optional[RateStore] = None
+) -> t.Iterator[t.Dict]:
+    """
+    Lazily retrieves historic exchange rates newer than the ones already known
+    Only the period after the earliest known last date is requested
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param known_dates: Dict of symbols and their last known date (YYYY-MM-DD format)
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: Iterator of dicts with date, base, symbol and rate keys
+    """
+    first_dates = [
+        max(start, (datetime.strptime(known_dates[item], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+        if item in known_dates else start
+        for item in symbol
+    ]
+    fetch_start = min(first_dates)
+    if fetch_start > end:
+        logger.debug(f"Every symbol is known up to {end}")
+        return
+    logger.debug(f"Retrieving new rates from {fetch_start}")
+    for line in iter_history(fetch_start, end, base, symbol, store):
+        if line['date'] > known_dates.get(line['symbol'], ''):
+            yield line
+
+
+def write_stdout(data: bytes) -> None:
+    """
+    Writes encoded output to the standard output
+    :param data: UTF-8 bytes
+    """
+    # Text printed before must come first
+    sys.stdout.flush()
+    buffer = getattr(sys.stdout, 'buffer', None)
+    if buffer is None:
+        sys.stdout.write(data.decode('utf-8'))
+    else:
+        buffer.write(data)
+
+
+@contextmanager
+def history_output(
+        output: t.Optional[str] = None,
+        printable: bool = True,
+        output_format: str = 'jsonl',
+        append: bool = False,
+        in_place: bool = False
+) -> t.Iterator[t.Callable[[t.Dict], None]]:
+    """
+    Opens the destinations of history rows
+    Rows are printed and written to the output file in batches of WRITE_BATCH_SIZE rows,
+    each one encoded to a single buffer.
+    The output file is written to a temporary file, which replaces the given one on success.
+    When appending, rows written to the output file are removed if there is a failure
+    :param output: Name of file to print result to, without extension.
+                If None, no file is created/written to.
+    :param printable: If true, prints result to console.
+    :param output_format: Format of the output file, one of WRITERS keys. jsonl by default
+    :param append: If true, rows are appended to the output file if it exists
+    :param in_place: If true, rows are appended to the output file itself instead of a copy of it,
+                which is truncated back to its previous size if there is a failure
+    :return: Context manager of a function writing a row to every destination
+    """
+    writer = None
+    if output is not None:
+        try:
+            from exrates.writers import get_writer
+            writer = get_writer(output, output_format, append, in_place)
+        except OSError as ex:
+            logger.error(str(ex))
+            raise
+    batch = []
+    metrics = get_metrics()
+
+    def flush() -> None:
+        metrics.count('rows', len(batch))
+        if printable:
+            with metrics.timer('print'):
+                write_stdout(jsonlib.dump_lines(batch))
+        if writer is not None:
+            with metrics.timer('write'):
+                writer.write_batch(batch)
+        batch.clear()
+
+    def write(line: t.Dict) -> None:
+        batch.append(line)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            flush()
+
+    try:
+        yield write
+        if batch:
+            flush()
+    except BaseException:
+        # Rows are printed even if the run fails, as they are received
+        if printable and batch:
+            write_stdout(jsonlib.dump_lines(batch))
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+
+
+def history_source(
+        start: str,
+        end: str,
+        base: t.Union[str, t.List[str]],
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None,
         output: t.Optional[str] = None,
-        printable: bool = True
+        output_format: str = 'jsonl',
+        incremental: bool = False
+) -> t.Iterator[t.Dict]:
+    """
+    Chooses the rows of a history query
+    In incremental mode, the last date of each symbol is read from the output file.
+    Several bases are derived from EUR based rates, requested once for all of them
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency, or list of original currencies
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to consult before the API. Shared store by default
+    :param output: Name of output file, without extension
+    :param output_format: Format of the output file, one of WRITERS keys. jsonl by default
+    :param incremental: If true, only rows newer than the ones of the output file are retrieved
+    :return: Iterator of dicts with date, base, symbol and rate keys
+    """
+    bases = [base] if isinstance(base, str) else list(dict.fromkeys(base))
+    if len(bases) > 1:
+        if incremental:
+            raise ValueError("Incremental output requires a single base")
+        return iter_cross_history(start, end, bases, symbol, store)
+    base = bases[0]
+    if incremental and output is not None:
+        from exrates.writers import last_dates
+        known_dates = last_dates(output, output_format, base, symbol)
+        return iter_new_history(start, end, base, symbol, known_dates, store)
+    return iter_history(start, end, base, symbol, store)
+
+
+def exrates_history(
+        start: str,
+        end: str,
+        base: t.Union[str, t.List[str]],
+        symbol: t.List[str],
+        output: t.Optional[str] = None,
+        printable: bool = True,
+        store: t.Optional[RateStore] = None,
+        output_format: str = 'jsonl',
+        incremental: bool = False
 ) -> t.List[t.Dict]:
     """
     Retrieves a list of historic exchange rates for a given currency
@@ -86,89 +850,177 @@ def exrates_history(
     Uses Frankfurter API
     :param start: Date of first day to get data (YYYY-MM-DD format)
     :param end: Date of last day to get data (YYYY-MM-DD format)
-    :param base: Original currency
+    :param base: Original currency, or list of original currencies
     :param symbol: List of currencies to convert to
     :param output: Name of file to print result to.
                 If None, no file is created/written to.
                 None by default
     :param printable: If true, prints result to console. True by default.
+    :param store: RateStore to consult before the API. Shared store by default
+    :param output_format: Format of the output file, one of WRITERS keys. jsonl by default
+    :param incremental: If true and the output file exists, only rows newer than the last ones
+                of the file are retrieved and appended to it
     :return: List of dicts containing the retrieved info
     """
-    # Build URL
-    if (end == DEFAULT_DATE and end == start) or end == start:
-        # When end date and start date is equal to today's date
-        # We build without .. param which causes ChunkEncodingError in API request
-        # Also for simplicity of response, when both end and start are the same date
-        data_url = f"{start}" \
-                   f"?from={base}" \
-                   f"&to={','.join(symbol)}"
-    else:
-        data_url = f"{start}" \
-                   f".." \
-                   f"{end}" \
-                   f"?from={base}" \
-                   f"&to={','.join(symbol)}"
-    logger.debug(f"Formed URL is: {data_url}")
-    # Get request
-    raw_data = frankfurter_get_call(data_url)
-
-    # Parse data to desired format
-    # The format received varies if an end date is given
+    output_data = []
+    rows = history_source(start, end, base, symbol, store, output, output_format, incremental)
+    with history_output(output, printable, output_format, incremental) as write:
+        for line in rows:
+            write(line)
+            output_data.append(line)
+    return output_data
+
+
+def stream_history(
+        start: str,
+        end: str,
+        base: t.Union[str, t.List[str]],
+        symbol: t.List[str],
+        output: t.Optional[str] = None,
+        printable: bool = True,
+        store: t.Optional[RateStore] = None,
+        output_format: str = 'jsonl',
+        incremental: bool = False
+) -> int:
+    """
+    Prints and writes historic exchange rates for a given currency
+    to a set of currencies on a given period, without keeping them in memory
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency, or list of original currencies
+    :param symbol: List of currencies to convert to
+    :param output: Name of file to print result to.
+                If None, no file is created/written to.
+                None by default
+    :param printable: If true, prints result to console. True by default.
+    :param store: RateStore to consult before the API. Shared store by default
+    :param output_format: Format of the output file, one of WRITERS keys. jsonl by default
+    :param incremental: If true and the output file exists, only rows newer than the last ones
+                of the file are retrieved and appended to it
+    :return: Number of rows retrieved
+    """
+    count = 0
+    rows = history_source(start, end, base, symbol, store, output, output_format, incremental)
+    with history_output(output, printable, output_format, incremental) as write:
+        for line in rows:
+            write(line)
+            count += 1
+    return count
+
+
+def exrates_history_table(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None
+) -> HistoryTable:
+    """
+    Retrieves historic exchange rates for a given currency
+    to a set of currencies on a given period, as a compact columnar table
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: HistoryTable with the retrieved info
+    """
+    from exrates.columnar import HistoryTable
+    return HistoryTable.from_rates(iter_rates(start, end, base, symbol, store), base)
+
+
+def lookback_start(date: str) -> str:
+    """
+    Computes the first day of the period searched for the rate in effect on a given day
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :return: Date CONVERT_LOOKBACK_DAYS before, not earlier than MIN_DATE (YYYY-MM-DD format)
+    """
+    lookback = datetime.strptime(date, '%Y-%m-%d') - timedelta(days=CONVERT_LOOKBACK_DAYS)
+    return max(lookback, MIN_DATETIME).strftime('%Y-%m-%d')
+
+
+def latest_rate(rates: t.Dict[str, t.Dict[str, float]], symbol: str) -> t.Optional[float]:
+    """
+    Picks the last published rate of a symbol
+    :param rates: Dict of dates to a dict of symbols and rates
+    :param symbol: Currency to convert to
+    :return: Exchange rate of the latest date, None if the symbol has no rates
+    """
+    published = [day for day in rates if symbol in rates[day]]
+    if not published:
+        return None
+    return rates[max(published)][symbol]
+
+
+def latest_factor(rates: t.Dict[str, t.Dict[str, float]], base: str, symbol: str) -> t.Optional[float]:
+    """
+    Picks the unrounded factor converting amounts on the last day both currencies were published
+    Amounts are multiplied by it and rounded once, as the API does for conversions
+    :param rates: Dict of dates to a dict of symbols and EUR based rates
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :return: rate[symbol] / rate[base] of the latest date, None if there is none
+    """
+    if base == symbol:
+        return 1.0
+    for day in sorted(rates, reverse=True):
+        day_rates = {**rates[day], ANCHOR_CURRENCY: 1.0}
+        if base in day_rates and symbol in day_rates:
+            return day_rates[symbol] / day_rates[base]
+    return None
+
+
+def convert_url(date: str, base: str, symbol: str, amount: float) -> str:
+    """
+    Builds the Frankfurter API path to convert an amount on a given day
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :param amount: Amount to be converted
+    :return: API path
+    """
+    return f"{date}" \
+           f"?from={base}" \
+           f"&to={symbol}" \
+           f"&amount={amount}"
 
-    # Check that dates within response are between our params
-    # For example, if start = today and API data is not yet live
-    # we are sent yesterday's data
-    # In this case, sent empty response
-    if len(raw_data) == 0:
-        output_data = []
-    elif 'end_date' in raw_data:
-        output_data = [
-            {
-                'date': date,
-                'base': raw_data['base'],
-                'symbol': symbol,
-                'rate': raw_data['rates'][date][symbol]
-            }
-            for date in raw_data['rates']
-            for symbol in raw_data['rates'][date]
-            if start <= date <= end
-        ]
-    else:
-        if raw_data['date'] >= start:
-            output_data = [
-                {
-                    'date': raw_data['date'],
-                    'base': raw_data['base'],
-                    'symbol': symbol,
-                    'rate': raw_data['rates'][symbol]
-                }
-                for symbol in raw_data['rates']
-            ]
-        else:
-            output_data = []
 
-    if printable:
-        for line in output_data:
-            print(json.dumps(line))
+def stored_factor(
+        date: str,
+        base: str,
+        symbol: str,
+        store: RateStore
+) -> t.Optional[float]:
+    """
+    Retrieves the unrounded factor converting amounts on a given day through a rate store
+    EUR based rates are stored as published, so conversions are only rounded once.
+    As the Frankfurter API does, days without publication use the previous published rates
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :param store: RateStore to consult before the API
+    :return: Factor, as latest_factor returns it. None if there is no publication on the lookback period
+    """
+    return sources.run(sources.factor_plan(date, base, symbol, store))
 
-    # Write to output file if param is received
-    if output is not None:
-        # Get path of given output file
-        file_name = os.path.abspath(f"{output}.jsonl")
-        base_dir = os.path.dirname(file_name)
-        try:
-            if not os.path.isdir(base_dir):
-                raise OSError(f"Cannot write to file, path does not exist: {base_dir}")
-            logger.debug(f"Writing to file: {file_name}")
-            with open(file_name, 'w', encoding='utf-8') as outfile:
-                for line in output_data:
-                    outfile.write(json.dumps(line))
-                    outfile.write('\n')
-        except OSError as ex:
-            logger.error(str(ex))
-            raise
 
-    return output_data
+def cross_convert(
+        date: str,
+        base: str,
+        symbol: str,
+        amount: float,
+        store: t.Optional[RateStore] = None
+) -> float:
+    """
+    Converts an amount of one currency to another on a given day, from EUR based rates
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :param amount: Amount to be converted
+    :param store: RateStore to consult before the API. None to request rates to the API
+    :return: Converted currency value as float
+    """
+    return sources.run(sources.cross_convert_plan(date, base, symbol, amount, store))
 
 
 def exrates_convert(
@@ -176,46 +1028,33 @@ def exrates_convert(
         base: str,
         symbol: str,
         amount: float,
-        printable: bool = True
+        printable: bool = True,
+        store: t.Optional[RateStore] = None
 ) -> float:
     """
     Converts an amount of one currency to another on a given day.
-    Uses Frankfurter API
+    Uses Frankfurter API, or the configured snapshot
     :param date: Date of conversion (YYYY-MM-DD format)
     :param base: Original currency
     :param symbol: Currency to convert to
     :param amount: Amount to be converted
     :param printable: If true, prints result to console. True by default.
+    :param store: RateStore to consult before the API. Shared store by default
     :return: Converted currency value as float
     """
-    # Build URL
-    data_url = f"{date}" \
-               f"?from={base}" \
-               f"&to={symbol}" \
-               f"&amount={amount}"
-    logger.debug(f"Formed URL is: {data_url}")
-    # Get request
-    raw_data = frankfurter_get_call(data_url)
-    conversion_value = raw_data['rates'][symbol]
+    conversion_value = sources.run(sources.convert_plan(date, base, symbol, amount, store))
     if printable:
         print(conversion_value)
     return conversion_value
 
 
-def parse_args(args: t.List[str]) -> argparse.Namespace:
+def cli_description(currencies: t.Dict[str, str]) -> str:
     """
-    Parser for Exrates CLI
-    :param args: Args of the execution
-    :return: Namespace of the parsed args
+    Builds the description of the CLI help
+    :param currencies: Supported currencies
+    :return: Description text
     """
-    # Get supported currencies from API
-    currencies = supported_currencies()
-    currency_symbols = list(currencies.keys())
-
-    # Base Parser for CLI
-    parser = argparse.ArgumentParser(
-        prog='exrates',
-        description=f"""
+    return f"""
         Exrates provides historical information
         for a given currency exchange rates to a set of other
         currencies in an interval of dates. Also it can provide a
@@ -230,13 +1069,43 @@ def parse_args(args: t.List[str]) -> argparse.Namespace:
         Minimum date available is: {MIN_DATE}
 
         Dates are always inclusive. 
-        """,
-        formatter_class=argparse.RawTextHelpFormatter
-    )
-    # Subcommands supported by CLI
-    subparsers = parser.add_subparsers(help='Available subcommands: history/convert', dest='command')
+        """
+
+
+# Value of --base selecting every supported currency
+ALL_CURRENCIES = 'all'
+# Global options whose value is given as a separate argument
+GLOBAL_OPTIONS_WITH_VALUE = ('--store', '--snapshot', '--http-cache')
+# Subcommands whose arguments are checked against supported currencies
+CURRENCY_COMMANDS = ('history', 'convert', 'analytics', 'watch')
+
+
+def selected_command(args: t.List[str]) -> t.Optional[str]:
+    """
+    Finds the subcommand of an execution before parsing its arguments
+    :param args: Args of the execution
+    :return: First positional argument, None if there is none
+    """
+    values = iter(args)
+    for arg in values:
+        if arg in GLOBAL_OPTIONS_WITH_VALUE:
+            next(values, None)
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
 
-    # History subcommand arguments
+def add_history_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the history subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
+    from exrates.writers import WRITERS
     parser_history = subparsers.add_parser(
         'history',
         help="Retrieves historical exchange conversions"
@@ -261,9 +1130,11 @@ def parse_args(args: t.List[str]) -> argparse.Namespace:
     parser_history.add_argument(
         '--base',
         '-b',
-        default=DEFAULT_SYMBOL,
-        choices=currency_symbols,
-        help="Base currency symbol. Defaults to USD"
+        default=[DEFAULT_SYMBOL],
+        choices=[*currency_symbols, ALL_CURRENCIES],
+        nargs='+',
+        help="Base currency symbols. Accepts a space separated list of symbols,"
+             f" or {ALL_CURRENCIES} for every supported currency. Defaults to USD"
     )
     parser_history.add_argument(
         '--symbol',
@@ -277,10 +1148,34 @@ def parse_args(args: t.List[str]) -> argparse.Namespace:
         '--output',
         '-o',
         type=str,
-        help="Path of file to write output to. JSONL format"
+        help="Path of file to write output to, without extension."
+             " The extension of the format is appended"
+    )
+    parser_history.add_argument(
+        '--incremental',
+        action='store_true',
+        help="Append to the output file only the rows newer than its last ones."
+             " Requires --output with jsonl, jsonl.gz or csv format"
     )
+    parser_history.add_argument(
+        '--format',
+        default='jsonl',
+        choices=list(WRITERS),
+        help="Format of output file. parquet and arrow (IPC file) require pyarrow. Defaults to jsonl"
+    )
+    return parser_history
 
-    # Convert subcommand arguments
+
+def add_convert_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the convert subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
     parser_convert = subparsers.add_parser(
         'convert',
         help="Does currency conversion from one currency"
@@ -314,6 +1209,369 @@ def parse_args(args: t.List[str]) -> argparse.Namespace:
         type=float,
         help="Amount to convert. Required"
     )
+    return parser_convert
+
+
+def add_convert_batch_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the convert-batch subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
+    parser_convert_batch = subparsers.add_parser(
+        'convert-batch',
+        help="Converts every (date, base, symbol, amount) row"
+             " of a CSV or JSONL file"
+    )
+    parser_convert_batch.add_argument(
+        '--input',
+        '-i',
+        required=True,
+        type=str,
+        help="Path of CSV (with header) or JSONL file with date, base, symbol"
+             " and amount fields. Use - for standard input. Required"
+    )
+    parser_convert_batch.add_argument(
+        '--output',
+        '-o',
+        type=str,
+        help="Path of file to write converted rows to. Standard output by default"
+    )
+    parser_convert_batch.add_argument(
+        '--input-format',
+        choices=['csv', 'jsonl'],
+        help="Format of input file. Guessed from its extension by default"
+    )
+    parser_convert_batch.add_argument(
+        '--output-format',
+        choices=['csv', 'jsonl'],
+        help="Format of output file. Same as input by default"
+    )
+    parser_convert_batch.add_argument(
+        '--skip-invalid',
+        action='store_true',
+        help="Log and skip rows that cannot be converted, instead of failing on the first one"
+    )
+    return parser_convert_batch
+
+
+def add_serve_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the serve subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
+    parser_serve = subparsers.add_parser(
+        'serve',
+        help="Serves history and convert queries over HTTP"
+             " from an in-memory cache of rates"
+    )
+    parser_serve.add_argument(
+        '--host',
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on. 127.0.0.1 by default"
+    )
+    parser_serve.add_argument(
+        '--port',
+        type=int,
+        default=8080,
+        help="Port to listen on. 8080 by default"
+    )
+    parser_serve.add_argument(
+        '--cache-size',
+        type=int,
+        default=1024,
+        help="Rate tables kept in memory. 1024 by default"
+    )
+    return parser_serve
+
+
+def add_snapshot_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the snapshot subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
+    parser_snapshot = subparsers.add_parser(
+        'snapshot',
+        help="Manages offline snapshots of the rate history"
+    )
+    snapshot_subparsers = parser_snapshot.add_subparsers(
+        help='Available actions: export',
+        dest='snapshot_command',
+        required=True
+    )
+    parser_snapshot_export = snapshot_subparsers.add_parser(
+        'export',
+        help="Writes EUR based rates of every currency to a snapshot file"
+    )
+    parser_snapshot_export.add_argument(
+        '--output',
+        '-o',
+        required=True,
+        type=str,
+        help="Path of snapshot file to write. Required"
+    )
+    parser_snapshot_export.add_argument(
+        '--start',
+        '-f',
+        type=valid_date,
+        help=f"Start date (YYYY-MM-DD). Inclusive. By default {MIN_DATE}"
+    )
+    parser_snapshot_export.add_argument(
+        '--end',
+        '-t',
+        default=DEFAULT_DATE,
+        type=valid_date,
+        help="End date (YYYY-MM-DD). Inclusive. By default today"
+    )
+    return parser_snapshot
+
+
+def add_analytics_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the analytics subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
+    parser_analytics = subparsers.add_parser(
+        'analytics',
+        help="Computes log returns, rolling mean and volatility, drawdown"
+             " or correlations of exchange rates in a date range"
+    )
+    parser_analytics.add_argument(
+        '--start',
+        '-f',
+        default=DEFAULT_DATE,
+        type=valid_date,
+        help="Start date (YYYY-MM-DD). Inclusive. By default today"
+    )
+    parser_analytics.add_argument(
+        '--end',
+        '-t',
+        default=DEFAULT_DATE,
+        type=valid_date,
+        help="End date (YYYY-MM-DD). Inclusive. By default today"
+    )
+    parser_analytics.add_argument(
+        '--base',
+        '-b',
+        default=DEFAULT_SYMBOL,
+        choices=currency_symbols,
+        help="Base currency symbol. Defaults to USD"
+    )
+    parser_analytics.add_argument(
+        '--symbol',
+        '-s',
+        required=True,
+        choices=currency_symbols,
+        nargs='+',
+        help="Currencies to convert to. Accepts a space separated list of symbols. Required"
+    )
+    parser_analytics.add_argument(
+        '--window',
+        '-w',
+        type=int,
+        default=20,
+        help="Publication days of rolling windows. Defaults to 20"
+    )
+    parser_analytics.add_argument(
+        '--correlation',
+        action='store_true',
+        help="Print correlations of log returns of every pair of symbols instead of daily statistics"
+    )
+    return parser_analytics
+
+
+def add_batch_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the batch subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
+    parser_batch = subparsers.add_parser(
+        'batch',
+        help="Runs every history and convert job of a JSONL file,"
+             " retrieving overlapping date ranges once"
+    )
+    parser_batch.add_argument(
+        '--jobs',
+        '-j',
+        required=True,
+        type=str,
+        help="Path of JSONL file with a job per line. Use - for standard input. Required"
+    )
+    parser_batch.add_argument(
+        '--output-dir',
+        '-o',
+        type=str,
+        default='.',
+        help="Directory where history jobs write <id>.<format> files. Current directory by default"
+    )
+    parser_batch.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        help="Processes building and writing job outputs. Number of CPUs by default,"
+             " 0 to run them in the main process"
+    )
+    return parser_batch
+
+
+def add_watch_parser(
+        subparsers: argparse._SubParsersAction,
+        currency_symbols: t.List[str]
+) -> argparse.ArgumentParser:
+    """
+    Adds the watch subcommand arguments
+    :param subparsers: Subparsers of the CLI parser
+    :param currency_symbols: Supported currency symbols
+    :return: Parser of the subcommand
+    """
+    from exrates.writers import WRITERS
+    parser_watch = subparsers.add_parser(
+        'watch',
+        help="Polls around the daily publication and prints or appends"
+             " newly published exchange rates as they appear"
+    )
+    parser_watch.add_argument(
+        '--base',
+        '-b',
+        default=DEFAULT_SYMBOL,
+        choices=currency_symbols,
+        help="Base currency symbol. Defaults to USD"
+    )
+    parser_watch.add_argument(
+        '--symbol',
+        '-s',
+        required=True,
+        choices=currency_symbols,
+        nargs='+',
+        help="Currencies to convert to. Accepts a space separated list of symbols. Required"
+    )
+    parser_watch.add_argument(
+        '--output',
+        '-o',
+        type=str,
+        help="Path of file to append new rows to, without extension."
+             " Rows missing since its last ones are appended first"
+    )
+    parser_watch.add_argument(
+        '--format',
+        choices=[name for name, writer in WRITERS.items() if writer.appendable],
+        default='jsonl',
+        help="Format of output file. Defaults to jsonl"
+    )
+    parser_watch.add_argument(
+        '--interval',
+        type=float,
+        default=60.0,
+        help="Seconds between polls around the publication time. Defaults to 60"
+    )
+    return parser_watch
+
+
+# Builders of each subcommand parser
+SUBCOMMANDS: t.Dict[str, t.Callable[[argparse._SubParsersAction, t.List[str]], argparse.ArgumentParser]] = {
+    'history': add_history_parser,
+    'convert': add_convert_parser,
+    'convert-batch': add_convert_batch_parser,
+    'serve': add_serve_parser,
+    'snapshot': add_snapshot_parser,
+    'analytics': add_analytics_parser,
+    'batch': add_batch_parser,
+    'watch': add_watch_parser,
+}
+
+
+def parse_args(args: t.List[str]) -> argparse.Namespace:
+    """
+    Parser for Exrates CLI
+    Only the parser of the selected subcommand is built. Every one is built
+    when there is none or it is unknown, to print help or list the valid ones
+    :param args: Args of the execution
+    :return: Namespace of the parsed args
+    """
+    command = selected_command(args)
+    commands = [command] if command in SUBCOMMANDS else list(SUBCOMMANDS)
+
+    currencies = {}
+    if any(name in CURRENCY_COMMANDS for name in commands):
+        # Get supported currencies, only calling the API if the cache is stale
+        currencies = cached_currencies()
+        # A symbol missing in the cache might be a newly supported currency
+        if any(re.fullmatch('[A-Z]{3}', arg) and arg not in currencies for arg in args):
+            currencies = cached_currencies(refresh=True)
+    currency_symbols = list(currencies.keys())
+
+    # Base Parser for CLI
+    # The description is only shown in the help of the whole CLI
+    parser = argparse.ArgumentParser(
+        prog='exrates',
+        description=cli_description(currencies) if len(commands) > 1 else None,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        '--cross-rates',
+        action='store_true',
+        help="Retrieve only EUR based rates and derive other currency pairs locally."
+             " Defaults to EXRATES_CROSS_RATES environment variable"
+    )
+    parser.add_argument(
+        '--store',
+        type=str,
+        help="Path of SQLite file used to store retrieved rates."
+             " Only missing rates are requested to the API."
+             " Defaults to EXRATES_RATE_STORE environment variable"
+    )
+    parser.add_argument(
+        '--snapshot',
+        type=str,
+        help="Path of snapshot file to read rates from, without calling the API."
+             " Defaults to EXRATES_SNAPSHOT environment variable"
+    )
+    parser.add_argument(
+        '--http-cache',
+        type=str,
+        help="Path of SQLite file used to keep API responses and revalidate them"
+             " with conditional requests across runs."
+             " Defaults to EXRATES_HTTP_CACHE environment variable, in memory if not set"
+    )
+    parser.add_argument(
+        '--compact-json',
+        action='store_true',
+        help="Print rows and write JSON lines as compact UTF-8 JSON, without spaces."
+             " Defaults to EXRATES_JSON_COMPACT environment variable"
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help="Print timers of each stage and counters of API calls to standard error when done"
+    )
+    # Subcommands supported by CLI
+    subparsers = parser.add_subparsers(help=f"Available subcommands: {'/'.join(SUBCOMMANDS)}", dest='command')
+    parsers = {name: SUBCOMMANDS[name](subparsers, currency_symbols) for name in commands}
 
     # Parse args
     args = parser.parse_args(args)
@@ -322,10 +1580,30 @@ def parse_args(args: t.List[str]) -> argparse.Namespace:
     # Verify that end is higher than start
     if args.command == "history":
         if args.start > args.end:
-            parser_history.error(
+            parsers['history'].error(
                 f"Given start ({args.start}) date"
                 f" is higher than end date ({args.end})"
             )
+        if args.incremental and args.output is None:
+            parsers['history'].error("--incremental requires --output")
+        args.base = currency_symbols if ALL_CURRENCIES in args.base else list(dict.fromkeys(args.base))
+        if args.incremental and len(args.base) > 1:
+            parsers['history'].error("--incremental requires a single --base")
+        from exrates.writers import WRITERS
+        if args.incremental and not WRITERS[args.format].appendable:
+            parsers['history'].error(f"--incremental cannot append to {args.format} files")
+    if args.command == "analytics":
+        if args.start > args.end:
+            parsers['analytics'].error(
+                f"Given start ({args.start}) date"
+                f" is higher than end date ({args.end})"
+            )
+        if args.window < 1:
+            parsers['analytics'].error("--window must be a positive number of days")
+    if args.command == "batch" and args.workers is not None and args.workers < 0:
+        parsers['batch'].error("--workers must not be negative")
+    if args.command == "watch" and args.interval <= 0:
+        parsers['watch'].error("--interval must be a positive number of seconds")
     if args.command is None:
         parser.print_help()
 
@@ -337,17 +1615,51 @@ def main_impl() -> t.Any:
     Entry point to Exrates CLI
     :return: None
     """
+    global CROSS_RATES, HTTP_CACHE_PATH
     args = parse_args(sys.argv[1:])
 
+    if args.http_cache:
+        HTTP_CACHE_PATH = args.http_cache
+        # The client of the currencies check, if any, has an in-memory cache
+        set_client(None)
+
+    if args.store:
+        from exrates.store import RateStore
+        set_rate_store(RateStore(args.store, RATE_STORE_TODAY_TTL))
+    if args.cross_rates:
+        CROSS_RATES = True
+    if args.compact_json:
+        jsonlib.COMPACT = True
+    if args.snapshot:
+        from exrates.snapshot import Snapshot
+        set_snapshot(Snapshot(args.snapshot))
+
+    try:
+        return run_command(args)
+    finally:
+        if args.stats:
+            # Timers and counters go after the output, to the standard error
+            sys.stdout.flush()
+            sys.stderr.write(get_metrics().report())
+
+
+def run_command(args: argparse.Namespace) -> t.Any:
+    """
+    Runs a CLI subcommand
+    :param args: Namespace of the parsed args
+    :return: Result of the subcommand
+    """
     if args.command == "history":
         # Get history of exchange rates
         logger.debug(f"Calling history subcommand")
-        return exrates_history(
+        return stream_history(
             args.start,
             args.end,
             args.base,
             args.symbol,
-            args.output
+            args.output,
+            output_format=args.format,
+            incremental=args.incremental
         )
     elif args.command == "convert":
         logger.debug(f"Calling convert subcommand")
@@ -358,6 +1670,61 @@ def main_impl() -> t.Any:
             args.symbol,
             args.amount
         )
+    elif args.command == "convert-batch":
+        logger.debug(f"Calling convert-batch subcommand")
+        from exrates.bulk import convert_batch
+        return convert_batch(
+            args.input,
+            args.output,
+            args.input_format,
+            args.output_format,
+            args.skip_invalid
+        )
+    elif args.command == "serve":
+        logger.debug(f"Calling serve subcommand")
+        from exrates.server import serve
+        return serve(
+            args.host,
+            args.port,
+            args.cache_size
+        )
+    elif args.command == "snapshot":
+        logger.debug(f"Calling snapshot {args.snapshot_command} subcommand")
+        from exrates.snapshot import export_snapshot
+        return export_snapshot(
+            args.output,
+            args.start,
+            args.end
+        )
+    elif args.command == "analytics":
+        logger.debug(f"Calling analytics subcommand")
+        from exrates.analytics import exrates_analytics
+        return exrates_analytics(
+            args.start,
+            args.end,
+            args.base,
+            args.symbol,
+            window=args.window,
+            correlation=args.correlation
+        )
+    elif args.command == "batch":
+        logger.debug(f"Calling batch subcommand")
+        from exrates.batch import run_batch
+        return run_batch(
+            args.jobs,
+            args.output_dir,
+            args.workers
+        )
+    elif args.command == "watch":
+        logger.debug(f"Calling watch subcommand")
+        from exrates.watch import watch
+        return watch(
+            args.base,
+            args.symbol,
+            args.output,
+            output_format=args.format,
+            interval=args.interval
+        )
 
 
 def main():
@@ -0,0 +1,406 @@
+"""
+Asyncio equivalents of the Exrates API
+
+Requires aiohttp, installed with the async extra: pip install "exrates[async]"
+Source selection, retries and rate store handling are the plans of exrates.sources, shared
+with the blocking API. Only the transport differs: requests are awaited, and blocking calls
+(rate store, snapshot and HTTP cache) run in a thread so the event loop is never blocked
+"""
+import typing as t
+import asyncio
+import logging
+import time
+import weakref
+import exrates
+from exrates.client import (
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_BACKOFF_MAX,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_POOL_MAXSIZE,
+    RETRY_STATUSES,
+    backoff_delay
+)
+from exrates import jsonlib, sources
+from exrates.httpcache import CachedResponse, HttpCache
+from exrates.singleflight import AsyncSingleFlight, normalize_url
+from exrates.store import RateStore
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a whole request
+DEFAULT_TIMEOUT = 30.0
+# Maximum number of requests in flight per client
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class AsyncFrankfurterClient:
+    """
+    Asyncio HTTP client for the Frankfurter API
+
+    Keeps a pool of keep-alive connections, caps requests in flight with a semaphore
+    and retries connection errors, timeouts and RETRY_STATUSES responses
+    with jittered exponential backoff.
+    With an HttpCache, fresh responses are reused and stale ones revalidated.
+    The cache is not closed with the client, as it may be shared.
+    A client must be used from a single event loop
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            timeout: float = DEFAULT_TIMEOUT,
+            max_retries: int = DEFAULT_MAX_RETRIES,
+            backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+            backoff_max: float = DEFAULT_BACKOFF_MAX,
+            max_connections: int = DEFAULT_POOL_MAXSIZE,
+            max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+            cache: t.Optional[HttpCache] = None
+    ):
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for the asyncio API: pip install "exrates[async]"')
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._semaphore = None
+        self._counters = {
+            'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'in_flight': 0,
+            'cache_hits': 0, 'revalidated': 0
+        }
+        # Coalesces concurrent calls of the same path
+        self.flight = AsyncSingleFlight()
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        # Created on first use, as it must be bound to the running loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def get_json(self, path: str) -> t.Dict:
+        """
+        Calls the API via GET on given path, retrying transient failures
+        A fresh cached response is used without calling the API. A stale one is
+        revalidated with a conditional request, and kept if the API answers 304
+        :param path: Path to call to, relative to base_url
+        :return: API response as a Dict
+        """
+        url = f"{self.base_url}/{path}"
+        metrics = exrates.get_metrics()
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache is not None else None
+        if cached is not None and cached.is_fresh():
+            self._counters['cache_hits'] += 1
+            metrics.count('http_cache_hits')
+            with metrics.timer('decode'):
+                return jsonlib.loads(cached.content)
+
+        session = self._get_session()
+        headers = cached.validators() if cached is not None else None
+        self._counters['requests'] += 1
+        metrics.count('requests')
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            self._counters['attempts'] += 1
+            try:
+                async with self._semaphore:
+                    self._counters['in_flight'] += 1
+                    try:
+                        async with session.get(url, headers=headers) as response:
+                            if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                                content = await self._content(url, response, cached)
+                                metrics.observe('fetch', time.perf_counter() - started)
+                                with metrics.timer('decode'):
+                                    return jsonlib.loads(content)
+                            delay = backoff_delay(
+                                attempt,
+                                self.backoff_factor,
+                                self.backoff_max,
+                                response.headers.get('Retry-After')
+                            )
+                            logger.info(f"Retrying {url} in {delay:.2f}s after status {response.status}")
+                    finally:
+                        self._counters['in_flight'] -= 1
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as ex:
+                if attempt >= self.max_retries:
+                    self._counters['failures'] += 1
+                    raise
+                delay = backoff_delay(attempt, self.backoff_factor, self.backoff_max)
+                logger.info(f"Retrying {url} in {delay:.2f}s after error: {ex!r}")
+            self._counters['retries'] += 1
+            metrics.count('retries')
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _content(
+            self,
+            url: str,
+            response: 'aiohttp.ClientResponse',
+            cached: t.Optional[CachedResponse]
+    ) -> bytes:
+        """
+        Retrieves the body of a final response, and keeps it in the cache if any
+        :param url: Requested URL
+        :param response: Response not to be retried
+        :param cached: Cached response the request was conditional on, if any
+        :return: Response body, the cached one if the API answered 304
+        :raises aiohttp.ClientResponseError: If the response status is an error
+        """
+        metrics = exrates.get_metrics()
+        now = time.time()
+        if response.status == 304 and cached is not None:
+            self._counters['revalidated'] += 1
+            metrics.count('http_revalidations')
+            await asyncio.to_thread(self.cache.put, url, cached.revalidated(response.headers, now), now)
+            return cached.content
+        response.raise_for_status()
+        content = await response.read()
+        metrics.count('bytes_received', len(content))
+        if self.cache is not None:
+            await asyncio.to_thread(
+                self.cache.put, url, CachedResponse.from_response(response.headers, content, now), now
+            )
+        return content
+
+    def stats(self) -> t.Dict[str, int]:
+        """
+        Retrieves request, retry and coalescing statistics
+        :return: Dict of counters
+        """
+        return {**self._counters, 'deduplicated': self.flight.deduplicated}
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self) -> 'AsyncFrankfurterClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncFrankfurterClient]' = \
+    weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> AsyncFrankfurterClient:
+    """
+    Retrieves the client shared by every asyncio API call of the running event loop
+    It is created on first use for FRANKFURTER_API_BASE_URL,
+    sharing the response cache of the blocking client
+    :return: Shared AsyncFrankfurterClient
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncFrankfurterClient(
+            exrates.FRANKFURTER_API_BASE_URL,
+            cache=exrates.get_client().cache
+        )
+    return client
+
+
+def set_async_client(client: AsyncFrankfurterClient) -> None:
+    """
+    Replaces the client shared by every asyncio API call of the running event loop
+    :param client: AsyncFrankfurterClient to use
+    """
+    _clients[asyncio.get_running_loop()] = client
+
+
+async def frankfurter_get_call(url: str, client: t.Optional[AsyncFrankfurterClient] = None) -> t.Dict:
+    """
+    Calls Frankfurter API via GET on given path
+    Concurrent calls of the same path share a single request and its response
+    :param url: path to call to
+    :param client: AsyncFrankfurterClient to use. Shared client by default
+    :return: API response as a Dict. Shared, it must not be mutated
+    """
+    client = get_async_client() if client is None else client
+    return await client.flight.do(normalize_url(url), request_json, client, url)
+
+
+async def request_json(client: AsyncFrankfurterClient, url: str) -> t.Dict:
+    """
+    Requests a path of Frankfurter API and decodes its response
+    :param client: AsyncFrankfurterClient to use
+    :param url: path to call to
+    :return: API response as a Dict
+    """
+    try:
+        return await client.get_json(url)
+    except aiohttp.ClientResponseError as ex:
+        logger.error(f"Cannot get currency list, API unavailable: {ex}")
+        raise
+    # This error might occur instead of a 404 in the Frankfurter API
+    # Assume this means empty data. It is neither cached, nor stored for publication days
+    except aiohttp.ClientPayloadError as ex:
+        logger.info(f"Invalid payload when calling API: {ex}")
+        return {}
+    except Exception as ex:
+        logger.error(f"Found unhandled exception when calling API: {ex!r}")
+        raise
+
+
+async def run(plan: sources.Plan, client: t.Optional[AsyncFrankfurterClient] = None) -> t.Any:
+    """
+    Runs a plan of exrates.sources in the running event loop
+    Requests are awaited, and blocking calls run in a thread
+    :param plan: Plan generator
+    :param client: AsyncFrankfurterClient to use. Shared client by default
+    :return: Result of the plan
+    """
+    result, error = None, None
+    while True:
+        try:
+            operation = plan.send(result) if error is None else plan.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            if isinstance(operation, sources.Call):
+                result = await asyncio.to_thread(operation.function, *operation.args)
+            elif isinstance(operation, sources.Request):
+                result = await request_rates(*operation, client=client)
+            else:
+                result = await frankfurter_get_call(operation.url, client)
+        except Exception as ex:
+            error = ex
+
+
+async def request_chunk(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        client: t.Optional[AsyncFrankfurterClient] = None
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Requests exchange rates on a period in a single call, as exrates.request_chunk does
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param client: AsyncFrankfurterClient to use. Shared client by default
+    :return: Dict of dates to a dict of symbols and rates
+    """
+    return await run(sources.chunk_plan(start, end, base, symbol), client)
+
+
+async def request_rates(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        client: t.Optional[AsyncFrankfurterClient] = None,
+        chunk_days: t.Optional[int] = None
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Requests exchange rates on a period
+    Long periods are split in chunks which are requested concurrently,
+    up to the concurrency limit of the client.
+    If a chunk fails, pending chunks are cancelled
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param client: AsyncFrankfurterClient to use. Shared client by default
+    :param chunk_days: Maximum number of days of each request. HISTORY_CHUNK_DAYS by default
+    :return: Dict of dates to a dict of symbols and rates
+    """
+    client = get_async_client() if client is None else client
+    chunks = exrates.split_range(start, end, chunk_days or exrates.HISTORY_CHUNK_DAYS)
+    tasks = [
+        asyncio.ensure_future(request_chunk(chunk_start, chunk_end, base, symbol, client))
+        for chunk_start, chunk_end in chunks
+    ]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    rates = {}
+    for chunk_rates in results:
+        rates.update(chunk_rates)
+    return rates
+
+
+async def fetch_rates(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None,
+        client: t.Optional[AsyncFrankfurterClient] = None
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Retrieves exchange rates on a period, from the same sources as exrates.fetch_rates
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to use. Shared store by default
+    :param client: AsyncFrankfurterClient to use. Shared client by default
+    :return: Dict of dates to a dict of symbols and rates
+    """
+    return await run(sources.rates_plan(start, end, base, symbol, store), client)
+
+
+async def exrates_history(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None,
+        client: t.Optional[AsyncFrankfurterClient] = None
+) -> t.List[t.Dict]:
+    """
+    Retrieves a list of historic exchange rates for a given currency
+    to a set of currencies on a given period
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to consult before the API. Shared store by default
+    :param client: AsyncFrankfurterClient to use. Shared client by default
+    :return: List of dicts containing the retrieved info
+    """
+    rates = await fetch_rates(start, end, base, symbol, store, client)
+    return exrates.history_rows(rates, base)
+
+
+async def exrates_convert(
+        date: str,
+        base: str,
+        symbol: str,
+        amount: float,
+        store: t.Optional[RateStore] = None,
+        client: t.Optional[AsyncFrankfurterClient] = None
+) -> float:
+    """
+    Converts an amount of one currency to another on a given day, from the same sources
+    as exrates.exrates_convert
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :param amount: Amount to be converted
+    :param store: RateStore to consult before the API. Shared store by default
+    :param client: AsyncFrankfurterClient to use. Shared client by default
+    :return: Converted currency value as float
+    """
+    return await run(sources.convert_plan(date, base, symbol, amount, store), client)
@@ -0,0 +1,255 @@
+"""
+Vectorized statistics of rate time series
+
+Rates of a base currency are loaded in a float64 matrix, one row per publication day
+and one column per symbol, with NaN where a symbol has no rate. Statistics operate on
+whole columns at once and propagate NaN instead of skipping days.
+Requires numpy: pip install "exrates[numpy]"
+"""
+import typing as t
+import math
+import exrates
+from exrates import jsonlib
+from exrates.columnar import from_day_number, to_day_number
+from exrates.store import RateStore
+
+# Days of rolling windows, about a month of publications
+DEFAULT_WINDOW = 20
+
+
+def import_numpy() -> t.Any:
+    try:
+        import numpy
+    except ImportError as ex:
+        raise ImportError('numpy is required for analytics: pip install "exrates[numpy]"') from ex
+    return numpy
+
+
+class RateSeries:
+    """
+    Rates of a base currency to several symbols, by publication day
+    """
+
+    def __init__(self, base: str, symbols: t.List[str], days: t.Any, rates: t.Any):
+        self.base = base
+        self.symbols = symbols
+        # int32 days since 1970-01-01, as in HistoryTable
+        self.days = days
+        # float64 matrix of shape (days, symbols)
+        self.rates = rates
+
+    @classmethod
+    def from_rates(cls, rates: t.Dict[str, t.Dict[str, float]], base: str, symbols: t.List[str]) -> 'RateSeries':
+        """
+        Builds a series from rates by date
+        :param rates: Dict of dates to a dict of symbols and rates
+        :param base: Original currency
+        :param symbols: Currencies of the columns
+        :return: RateSeries with a row per date, in date order
+        """
+        np = import_numpy()
+        dates = sorted(rates)
+        matrix = np.array(
+            [[rates[date].get(symbol, math.nan) for symbol in symbols] for date in dates],
+            dtype=np.float64
+        ).reshape(len(dates), len(symbols))
+        days = np.array([to_day_number(date) for date in dates], dtype=np.int32)
+        return cls(base, list(symbols), days, matrix)
+
+    @property
+    def dates(self) -> t.List[str]:
+        return [from_day_number(day) for day in self.days.tolist()]
+
+    def log_returns(self) -> t.Any:
+        """
+        Computes daily log returns, ln(rate / previous rate)
+        :return: float64 matrix of the same shape as rates. The first row is NaN
+        """
+        np = import_numpy()
+        returns = np.full_like(self.rates, np.nan)
+        returns[1:] = np.diff(np.log(self.rates), axis=0)
+        return returns
+
+    def rolling_mean(self, window: int = DEFAULT_WINDOW) -> t.Any:
+        """
+        Computes the moving average of rates
+        :param window: Days of each window
+        :return: float64 matrix of the same shape as rates. Rows without a full window are NaN
+        """
+        return rolling(self.rates, window, 'mean')
+
+    def rolling_std(self, window: int = DEFAULT_WINDOW) -> t.Any:
+        """
+        Computes the volatility of rates, the sample standard deviation of log returns over a window
+        :param window: Days of each window
+        :return: float64 matrix of the same shape as rates. Rows without a full window of returns are NaN
+        """
+        return rolling(self.log_returns(), window, 'std')
+
+    def drawdown(self) -> t.Any:
+        """
+        Computes the relative fall of rates from their running maximum
+        :return: float64 matrix of the same shape as rates, 0 at new maximums and negative below them
+        """
+        np = import_numpy()
+        return self.rates / np.fmax.accumulate(self.rates, axis=0) - 1
+
+    def correlation(self) -> t.Any:
+        """
+        Computes pairwise correlations of log returns of symbols
+        Each pair uses the days both symbols have returns
+        :return: float64 matrix of shape (symbols, symbols). NaN for pairs with less than 2 common days
+        """
+        return pairwise_correlation(self.log_returns())
+
+
+def rolling(values: t.Any, window: int, statistic: str) -> t.Any:
+    """
+    Computes a statistic over a sliding window of rows
+    :param values: float64 matrix of shape (days, columns)
+    :param window: Days of each window
+    :param statistic: mean or std (sample standard deviation)
+    :return: float64 matrix of the same shape. Rows without a full window are NaN
+    """
+    np = import_numpy()
+    if window < 1:
+        raise ValueError(f"Window must be a positive number of days: {window}")
+    result = np.full_like(values, np.nan)
+    if len(values) < window:
+        return result
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+    if statistic == 'mean':
+        result[window - 1:] = windows.mean(axis=-1)
+    elif statistic == 'std':
+        if window > 1:
+            result[window - 1:] = windows.std(axis=-1, ddof=1)
+    else:
+        raise ValueError(f"Unknown rolling statistic: {statistic}")
+    return result
+
+
+def pairwise_correlation(values: t.Any) -> t.Any:
+    """
+    Computes Pearson correlations of every pair of columns, over the rows both have values
+    :param values: float64 matrix of shape (days, columns), NaN where there is no value
+    :return: float64 matrix of shape (columns, columns)
+    """
+    np = import_numpy()
+    present = np.isfinite(values).astype(np.float64)
+    filled = np.where(present > 0, values, 0.0)
+    # Element (i, j) of each product only sums rows where both i and j have values
+    count = present.T @ present
+    sum_i = filled.T @ present
+    sum_j = sum_i.T
+    squares_i = (filled ** 2).T @ present
+    squares_j = squares_i.T
+    products = filled.T @ filled
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = products - sum_i * sum_j / count
+        variance_i = squares_i - sum_i ** 2 / count
+        variance_j = squares_j - sum_j ** 2 / count
+        result = covariance / np.sqrt(variance_i * variance_j)
+    result[count < 2] = np.nan
+    return np.clip(result, -1.0, 1.0)
+
+
+def load_series(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional[RateStore] = None
+) -> RateSeries:
+    """
+    Loads rates of a period in a series
+    Rates come from the snapshot or the rate store when one is configured, as in history queries
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: RateSeries of the period
+    """
+    rates = exrates.fetch_rates(start, end, base, symbol, store)
+    return RateSeries.from_rates(rates, base, [item for item in symbol if item != base])
+
+
+def analytics_rows(series: RateSeries, window: int = DEFAULT_WINDOW) -> t.Iterator[t.Dict]:
+    """
+    Builds a row of statistics per day and symbol
+    :param series: RateSeries to describe
+    :param window: Days of rolling windows
+    :return: Iterator of dicts with date, base, symbol, rate, log_return, rolling_mean,
+            rolling_std and drawdown keys. Missing values are None
+    """
+    np = import_numpy()
+    columns = {
+        'rate': series.rates,
+        'log_return': series.log_returns(),
+        'rolling_mean': series.rolling_mean(window),
+        'rolling_std': series.rolling_std(window),
+        'drawdown': series.drawdown()
+    }
+    # Python floats with None instead of NaN, converted at once
+    values = {
+        name: np.where(np.isnan(column), None, column).tolist()
+        for name, column in columns.items()
+    }
+    for row, date in enumerate(series.dates):
+        for column, symbol in enumerate(series.symbols):
+            if values['rate'][row][column] is None:
+                continue
+            yield {
+                'date': date,
+                'base': series.base,
+                'symbol': symbol,
+                **{name: value[row][column] for name, value in values.items()}
+            }
+
+
+def correlation_rows(series: RateSeries) -> t.Iterator[t.Dict]:
+    """
+    Builds a row per pair of symbols with the correlation of their log returns
+    :param series: RateSeries to describe
+    :return: Iterator of dicts with base, symbol, other and correlation keys. Missing values are None
+    """
+    matrix = series.correlation().tolist()
+    for i, symbol in enumerate(series.symbols):
+        for j in range(i + 1, len(series.symbols)):
+            value = matrix[i][j]
+            yield {
+                'base': series.base,
+                'symbol': symbol,
+                'other': series.symbols[j],
+                'correlation': None if math.isnan(value) else value
+            }
+
+
+def exrates_analytics(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        window: int = DEFAULT_WINDOW,
+        correlation: bool = False,
+        printable: bool = True,
+        store: t.Optional[RateStore] = None
+) -> t.List[t.Dict]:
+    """
+    Computes statistics of exchange rates on a period
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param window: Days of rolling windows. DEFAULT_WINDOW by default
+    :param correlation: If true, correlations of every pair of symbols are computed
+                instead of daily statistics
+    :param printable: If true, prints result to console as JSON lines. True by default
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: List of dicts of analytics_rows or correlation_rows
+    """
+    series = load_series(start, end, base, symbol, store)
+    rows = list(correlation_rows(series) if correlation else analytics_rows(series, window))
+    if printable:
+        exrates.write_stdout(jsonlib.dump_lines(rows))
+    return rows
@@ -0,0 +1,116 @@
+"""
+As-of index of EUR based rates
+
+Publication days are kept sorted, so the rates in effect on any day, including days
+without publication, are found with a binary search, as the API does for conversions.
+Rates of other bases are derived from EUR based rates, as in cross rates
+"""
+import typing as t
+import bisect
+import logging
+import exrates
+from exrates.columnar import from_day_number, to_day_number
+from exrates.cross import ANCHOR_CURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+class AsOfIndex:
+    """
+    EUR based rates of a growing period, by publication day
+    """
+
+    def __init__(self, symbols: t.Optional[t.List[str]] = None, lookback_days: t.Optional[int] = None):
+        """
+        :param symbols: Currencies to load. Every supported currency by default
+        :param lookback_days: Days to look back for the last publication. CONVERT_LOOKBACK_DAYS by default
+        """
+        self.symbols = symbols
+        self.lookback_days = exrates.CONVERT_LOOKBACK_DAYS if lookback_days is None else lookback_days
+        # Loaded period, as day numbers
+        self.first_day: t.Optional[int] = None
+        self.last_day: t.Optional[int] = None
+        # Sorted publication days and their rates
+        self.days: t.List[int] = []
+        self._rates: t.Dict[int, t.Dict[str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def load(self, start: str, end: str) -> None:
+        """
+        Makes sure the rates of a period are loaded, with its lookback days
+        Only days out of the loaded period are retrieved
+        :param start: Date of first day (YYYY-MM-DD format)
+        :param end: Date of last day (YYYY-MM-DD format)
+        """
+        first = max(to_day_number(start) - self.lookback_days, to_day_number(exrates.MIN_DATE))
+        last = min(to_day_number(end), to_day_number(exrates.current_date()))
+        if first > last:
+            return
+        if self.first_day is None:
+            periods = [(first, last)]
+        else:
+            periods = []
+            if first < self.first_day:
+                periods.append((first, self.first_day - 1))
+            if last > self.last_day:
+                periods.append((self.last_day + 1, last))
+        if not periods:
+            return
+        if self.symbols is None:
+            self.symbols = sorted(set(exrates.cached_currencies()) - {ANCHOR_CURRENCY})
+        for period_first, period_last in periods:
+            start, end = from_day_number(period_first), from_day_number(period_last)
+            logger.debug(f"Loading rates from {start} to {end} in as-of index")
+            for date, rates in exrates.fetch_rates(start, end, ANCHOR_CURRENCY, self.symbols).items():
+                self._rates[to_day_number(date)] = rates
+        self.first_day = first if self.first_day is None else min(first, self.first_day)
+        self.last_day = last if self.last_day is None else max(last, self.last_day)
+        self.days = sorted(self._rates)
+
+    def as_of(self, date: str) -> t.Optional[str]:
+        """
+        Finds the last publication day on or before a given day, within the lookback days
+        :param date: Date (YYYY-MM-DD format)
+        :return: Date of the publication (YYYY-MM-DD format), None if there is none
+        """
+        day = to_day_number(date)
+        position = bisect.bisect_right(self.days, day) - 1
+        if position < 0 or day - self.days[position] > self.lookback_days:
+            return None
+        return from_day_number(self.days[position])
+
+    def factor(self, date: str, base: str, symbol: str) -> t.Tuple[str, float]:
+        """
+        Retrieves the unrounded factor converting amounts on a given day
+        Amounts are multiplied by it and rounded once, as the API does for conversions
+        :param date: Date (YYYY-MM-DD format). Its period must be loaded
+        :param base: Original currency
+        :param symbol: Currency to convert to
+        :return: Tuple of the publication date used (YYYY-MM-DD format) and
+                rate[symbol] / rate[base] of the EUR based rates
+        """
+        published = self.as_of(date)
+        if published is None:
+            raise ValueError(f"No exchange rate from {base} to {symbol} on {date}")
+        if base == symbol:
+            return published, 1.0
+        rates = {**self._rates[to_day_number(published)], ANCHOR_CURRENCY: 1.0}
+        if base not in rates or symbol not in rates:
+            raise ValueError(f"No exchange rate from {base} to {symbol} on {date}")
+        return published, rates[symbol] / rates[base]
+
+    def rate(self, date: str, base: str, symbol: str) -> t.Tuple[str, float]:
+        """
+        Retrieves the exchange rate in effect on a given day
+        :param date: Date (YYYY-MM-DD format). Its period must be loaded
+        :param base: Original currency
+        :param symbol: Currency to convert to
+        :return: Tuple of the publication date used (YYYY-MM-DD format) and the rate,
+                rounded as the API does. Rates of EUR are returned as published
+        """
+        published, factor = self.factor(date, base, symbol)
+        if base in (ANCHOR_CURRENCY, symbol):
+            return published, factor
+        return published, exrates.round_significant(factor)
@@ -0,0 +1,277 @@
+"""
+Batch runner of history and convert jobs
+
+Jobs are read from a JSONL file, one spec per line:
+    {"id": "q1", "command": "history", "start": "2021-01-01", "end": "2021-03-31",
+     "base": "USD", "symbol": ["EUR", "CAD"], "format": "csv"}
+    {"id": "c1", "command": "convert", "date": "2021-02-06", "base": "USD", "symbol": "EUR", "amount": 50}
+
+Overlapping date ranges of jobs with the same base are merged, and the rates of each merged
+range are retrieved once for the union of their symbols, through the rate store or snapshot
+when configured. Convert jobs use EUR based rates, so their values are only rounded once. Building and writing the output of each job runs in a process pool.
+Only a bounded number of jobs are in flight, and the rates of a range are released once
+its jobs are submitted, so memory does not grow with the number of jobs
+"""
+import typing as t
+import argparse
+import logging
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+import requests
+import exrates
+from exrates import jsonlib
+from exrates.cross import ANCHOR_CURRENCY, anchor_symbols
+from exrates.writers import output_file_name, writer_class
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ('history', 'convert')
+# Jobs submitted ahead of the one being collected, per worker
+PENDING_PER_WORKER = 2
+
+Rates = t.Dict[str, t.Dict[str, float]]
+
+
+class InlineExecutor(Executor):
+    """
+    Executor running every call in the calling process, when no pool is wanted
+    """
+
+    def submit(self, fn: t.Callable, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as ex:
+            future.set_exception(ex)
+        return future
+
+
+def valid_job(spec: t.Dict, line: int) -> t.Dict:
+    """
+    Checks and normalizes a job spec
+    :param spec: Job spec as read from the jobs file
+    :param line: Line number of the spec, its id by default
+    :return: Job dict with id, command, start, end, base and symbol keys, plus
+            format for history jobs and date and amount for convert jobs
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Job on line {line} is not an object")
+    job = dict(spec)
+    job['id'] = str(job.get('id', line))
+    if not re.fullmatch(r'[\w.-]+', job['id']):
+        raise ValueError(f"Invalid job id on line {line}: {job['id']}")
+    command = job.get('command')
+    if command not in COMMANDS:
+        raise ValueError(f"Unknown command of job {job['id']}: {command}")
+    job.setdefault('base', exrates.DEFAULT_SYMBOL)
+    if not isinstance(job['base'], str):
+        raise ValueError(f"Job {job['id']} must have a single base")
+    try:
+        if command == 'history':
+            for name in ('start', 'end'):
+                job[name] = exrates.valid_date(job.get(name, exrates.current_date()))
+            if job['start'] > job['end']:
+                raise ValueError(f"Given start ({job['start']}) date is higher than end date ({job['end']})")
+            symbols = job.get('symbol')
+            job['symbol'] = [symbols] if isinstance(symbols, str) else list(symbols or [])
+            if not job['symbol']:
+                raise ValueError("Missing symbol")
+            writer_class(job.setdefault('format', 'jsonl'))
+        else:
+            job['date'] = exrates.valid_date(job.get('date', exrates.current_date()))
+            job['amount'] = float(job['amount'])
+            if not isinstance(job.get('symbol'), str):
+                raise ValueError("Missing symbol")
+            # Days without publication use the previous published rate, as the API does
+            job['start'], job['end'] = exrates.lookback_start(job['date']), job['date']
+    except (KeyError, TypeError, ValueError, argparse.ArgumentTypeError) as ex:
+        raise ValueError(f"Invalid job {job['id']}: {ex}")
+    return job
+
+
+def read_jobs(path: str) -> t.List[t.Dict]:
+    """
+    Reads and checks the jobs of a JSONL file
+    Job ids name output files, so they must be unique
+    :param path: Path of the file. '-' for standard input
+    :return: List of jobs, as valid_job returns them
+    """
+    infile = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        jobs = []
+        lines: t.Dict[str, int] = {}
+        for number, line in enumerate(infile, 1):
+            if not line.strip():
+                continue
+            job = valid_job(jsonlib.loads(line), number)
+            if job['id'] in lines:
+                raise ValueError(f"Duplicate job id {job['id']} on lines {lines[job['id']]} and {number}")
+            lines[job['id']] = number
+            jobs.append(job)
+        return jobs
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+
+def job_base(job: t.Dict) -> str:
+    return job['base'] if job['command'] == 'history' else ANCHOR_CURRENCY
+
+
+def job_symbols(job: t.Dict) -> t.List[str]:
+    return job['symbol'] if job['command'] == 'history' else anchor_symbols(job['base'], [job['symbol']])
+
+
+def plan_ranges(jobs: t.List[t.Dict]) -> t.List[t.Tuple[str, str, str, t.List[str], t.List[t.Dict]]]:
+    """
+    Merges overlapping date ranges of jobs with the same base
+    Convert jobs are merged with the EUR based ones
+    :param jobs: Jobs, as valid_job returns them
+    :return: List of (start, end, base, symbols, jobs) tuples, one per merged range,
+            with the union of symbols of its jobs. Ranges of a base do not overlap
+    """
+    by_base: t.Dict[str, t.List[t.Dict]] = {}
+    for job in jobs:
+        by_base.setdefault(job_base(job), []).append(job)
+    ranges = []
+    for base, base_jobs in by_base.items():
+        current = None
+        for job in sorted(base_jobs, key=lambda item: item['start']):
+            if current is not None and job['start'] <= current[1]:
+                current[1] = max(current[1], job['end'])
+                current[4].append(job)
+            else:
+                current = [job['start'], job['end'], base, None, [job]]
+                ranges.append(current)
+    return [
+        (start, end, base, list(dict.fromkeys(
+            symbol for job in range_jobs for symbol in job_symbols(job) if symbol != base
+        )), range_jobs)
+        for start, end, base, _, range_jobs in ranges
+    ]
+
+
+def job_rates(job: t.Dict, rates: Rates) -> Rates:
+    """
+    Picks the rates of a job from the rates of its merged range
+    :param job: Job, as valid_job returns it
+    :param rates: Dict of dates to a dict of symbols and rates, covering the job
+    :return: Dict of dates to a dict of symbols and rates, restricted to the job days and symbols
+    """
+    symbols = set(job_symbols(job))
+    selected = {}
+    for date, day_rates in rates.items():
+        if job['start'] <= date <= job['end']:
+            day_rates = {symbol: rate for symbol, rate in day_rates.items() if symbol in symbols}
+            if day_rates:
+                selected[date] = day_rates
+    return selected
+
+
+def run_job(job: t.Dict, rates: Rates, output_dir: str) -> t.Dict:
+    """
+    Builds and writes the output of a job. Runs in a worker process
+    :param job: Job, as valid_job returns it
+    :param rates: Rates of the job, as job_rates returns them
+    :param output_dir: Directory of output files
+    :return: Summary dict with id and command keys, plus output and rows for history jobs,
+            or date, base, symbol, amount and value for convert jobs
+    """
+    summary = {'id': job['id'], 'command': job['command']}
+    if job['command'] == 'history':
+        output = os.path.join(output_dir, job['id'])
+        rows = exrates.history_rows(rates, job['base'])
+        with exrates.history_output(output, printable=False, output_format=job['format']) as write:
+            for row in rows:
+                write(row)
+        summary['output'] = output_file_name(output, writer_class(job['format']).extension)
+        summary['rows'] = len(rows)
+        return summary
+
+    factor = exrates.latest_factor(rates, job['base'], job['symbol'])
+    if factor is None:
+        raise LookupError(f"No exchange rate from {job['base']} to {job['symbol']} on {job['date']}")
+    return {
+        **summary,
+        'date': job['date'],
+        'base': job['base'],
+        'symbol': job['symbol'],
+        'amount': job['amount'],
+        'value': exrates.round_significant(job['amount'] * factor)
+    }
+
+
+def failed(job: t.Dict, ex: Exception) -> t.Dict:
+    logger.error(f"Job {job['id']} failed: {ex}")
+    return {'id': job['id'], 'command': job['command'], 'error': str(ex)}
+
+
+def run_batch(
+        jobs_path: str,
+        output_dir: str = '.',
+        workers: t.Optional[int] = None,
+        summary: t.Optional[t.TextIO] = None
+) -> t.Dict[str, int]:
+    """
+    Runs every job of a jobs file
+    A summary line per job is written as it finishes, in order of merged ranges.
+    Failed jobs get an error line, and do not stop the others
+    :param jobs_path: Path of the JSONL jobs file. '-' for standard input
+    :param output_dir: Directory where history jobs write <id>.<format> files. Current directory by default
+    :param workers: Processes building outputs. Number of CPUs by default, 0 to run them in this process
+    :param summary: File to write summary lines to. Standard output by default
+    :return: Dict with the number of jobs and of failed jobs
+    """
+    jobs = read_jobs(jobs_path)
+    ranges = plan_ranges(jobs)
+    logger.debug(f"Running {len(jobs)} jobs in {len(ranges)} merged ranges")
+    os.makedirs(output_dir, exist_ok=True)
+    summary = sys.stdout if summary is None else summary
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    executor = InlineExecutor() if workers == 0 else ProcessPoolExecutor(max_workers=workers)
+    max_pending = max(workers, 1) * PENDING_PER_WORKER
+    metrics = exrates.get_metrics()
+    pending: 't.Deque[t.Tuple[t.Dict, Future]]' = deque()
+    counts = {'jobs': len(jobs), 'failed': 0}
+
+    def collect() -> None:
+        job, future = pending.popleft()
+        try:
+            result = future.result()
+            if workers and 'rows' in result:
+                # Rows written by worker processes are not counted in this one
+                metrics.count('rows', result['rows'])
+        except Exception as ex:
+            result = failed(job, ex)
+            counts['failed'] += 1
+        summary.write(jsonlib.dumps(result).decode('utf-8'))
+        summary.write('\n')
+
+    try:
+        for start, end, base, symbols, range_jobs in ranges:
+            try:
+                rates = exrates.fetch_rates(start, end, base, symbols) if symbols else {}
+            except (requests.exceptions.RequestException, ValueError) as ex:
+                # Jobs of the range fail, others still run
+                for job in range_jobs:
+                    future = Future()
+                    future.set_exception(ex)
+                    pending.append((job, future))
+                continue
+            for job in range_jobs:
+                pending.append((job, executor.submit(run_job, job, job_rates(job, rates), output_dir)))
+                while len(pending) > max_pending:
+                    collect()
+            # Rates of the range are only kept by jobs in flight
+            del rates
+        while pending:
+            collect()
+    finally:
+        executor.shutdown(cancel_futures=True)
+    summary.flush()
+    if counts['failed']:
+        logger.error(f"{counts['failed']} of {counts['jobs']} jobs failed")
+    return counts
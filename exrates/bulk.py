@@ -0,0 +1,233 @@
+"""
+Bulk conversion of (date, base, symbol, amount) rows
+
+Rows are read as a stream and processed in blocks. EUR based rates of the days a block
+spans are loaded once in an as-of index, which resolves the publication in effect on each
+date or timestamp, and each (date, base, symbol) key of a block is looked up once.
+Invalid rows are reported with their line number, or skipped and logged if requested
+"""
+import typing as t
+import csv
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+import exrates
+from exrates import jsonlib
+from exrates.asof import AsOfIndex
+
+logger = logging.getLogger(__name__)
+
+# Rows converted at once
+BLOCK_SIZE = 10000
+FORMATS = ('csv', 'jsonl')
+# Columns added to each row with the converted amount and the publication date of its rate
+VALUE_FIELD = 'value'
+RATE_DATE_FIELD = 'rate_date'
+
+
+def detect_format(path: str, default: str = 'jsonl') -> str:
+    """
+    Guesses the format of a rows file from its extension
+    :param path: Path of the file. '-' for standard input/output
+    :param default: Format if the extension is unknown
+    :return: csv or jsonl
+    """
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return extension if extension in FORMATS else default
+
+
+def invalid_row(line: int, error: Exception, skip_invalid: bool) -> None:
+    """
+    Reports an invalid row
+    :param line: Line number of the row
+    :param error: Error raised by the row
+    :param skip_invalid: If true, the row is logged and skipped instead of failing the conversion
+    """
+    if not skip_invalid:
+        raise ValueError(f"Invalid row on line {line}: {error}")
+    exrates.get_metrics().count('invalid_rows')
+    logger.warning(f"Skipping invalid row on line {line}: {error}")
+
+
+def read_rows(infile: t.TextIO, input_format: str, skip_invalid: bool = False) -> t.Iterator[t.Tuple[int, t.Dict]]:
+    """
+    Reads rows to convert
+    :param infile: File to read from
+    :param input_format: csv (with a header line) or jsonl
+    :param skip_invalid: If true, lines that cannot be decoded are skipped instead of failing the conversion
+    :return: Iterator of line numbers and dicts with at least date, base, symbol and amount keys
+    """
+    if input_format == 'csv':
+        reader = csv.DictReader(infile)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for number, line in enumerate(infile, 1):
+            if not line.strip():
+                continue
+            try:
+                row = jsonlib.loads(line)
+            except ValueError as ex:
+                invalid_row(number, ex, skip_invalid)
+                continue
+            yield number, row
+
+
+def row_date(value: str) -> str:
+    """
+    Takes the day of a row date or timestamp
+    Timestamps with a UTC offset are converted to UTC first, timestamps without one are taken as UTC
+    :param value: Date (YYYY-MM-DD format) or ISO 8601 timestamp
+    :return: Date (YYYY-MM-DD format)
+    """
+    text = str(value)
+    # datetime.fromisoformat only accepts the Z suffix since Python 3.11
+    if text[-1:] in ('Z', 'z'):
+        text = f"{text[:-1]}+00:00"
+    try:
+        timestamp = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date().isoformat()
+
+
+def convert_rows(
+        rows: t.Iterable[t.Dict],
+        block_size: int = BLOCK_SIZE,
+        index: t.Optional[AsOfIndex] = None,
+        skip_invalid: bool = False
+) -> t.Iterator[t.Dict]:
+    """
+    Converts amounts of a stream of rows, keeping their order
+    Days without publication use the previous published rates, as the API does.
+    Each converted value is rounded as the API does for conversions
+    :param rows: Iterable of dicts with date (or timestamp), base, symbol and amount keys
+    :param block_size: Rows converted at once
+    :param index: AsOfIndex to use. A new one by default
+    :param skip_invalid: If true, invalid rows are skipped instead of failing the conversion
+    :return: Iterator of the given rows with added value and rate_date keys
+    """
+    return convert_numbered_rows(enumerate(rows, 1), block_size, index, skip_invalid)
+
+
+def convert_numbered_rows(
+        rows: t.Iterable[t.Tuple[int, t.Dict]],
+        block_size: int = BLOCK_SIZE,
+        index: t.Optional[AsOfIndex] = None,
+        skip_invalid: bool = False
+) -> t.Iterator[t.Dict]:
+    """
+    Converts amounts of a stream of rows, keeping their order
+    :param rows: Iterable of line numbers and dicts, as read_rows returns them
+    :param block_size: Rows converted at once
+    :param index: AsOfIndex to use. A new one by default
+    :param skip_invalid: If true, invalid rows are skipped instead of failing the conversion
+    :return: Iterator of the given rows with added value and rate_date keys
+    """
+    index = AsOfIndex() if index is None else index
+    block = []
+    for numbered_row in rows:
+        block.append(numbered_row)
+        if len(block) >= block_size:
+            yield from convert_block(block, index, skip_invalid)
+            block = []
+    if block:
+        yield from convert_block(block, index, skip_invalid)
+
+
+def convert_block(block: t.List[t.Tuple[int, t.Dict]], index: AsOfIndex, skip_invalid: bool = False) -> t.List[t.Dict]:
+    """
+    Converts amounts of a block of rows
+    :param block: List of line numbers and dicts with date (or timestamp), base, symbol and amount keys
+    :param index: AsOfIndex to use
+    :param skip_invalid: If true, invalid rows are skipped instead of failing the conversion
+    :return: The given rows with added value and rate_date keys, without skipped rows
+    """
+    parsed = []
+    for line, row in block:
+        try:
+            parsed.append((line, row, row_date(row['date']), row['base'], row['symbol'], float(row['amount'])))
+        except (KeyError, TypeError, ValueError) as ex:
+            invalid_row(line, ex, skip_invalid)
+    if not parsed:
+        return []
+    dates = [date for _, _, date, _, _, _ in parsed]
+    index.load(min(dates), max(dates))
+    # Rows of a block share few (date, base, symbol) keys, each is looked up once.
+    # Factors are not rounded, so each value is only rounded once, as the API does
+    lookups: t.Dict[t.Tuple[str, str, str], t.Tuple[str, float]] = {}
+    converted = []
+    for line, row, date, base, symbol, amount in parsed:
+        key = (date, base, symbol)
+        try:
+            if key not in lookups:
+                lookups[key] = index.factor(*key)
+        except ValueError as ex:
+            invalid_row(line, ex, skip_invalid)
+            continue
+        published, factor = lookups[key]
+        row[VALUE_FIELD] = exrates.round_significant(amount * factor)
+        row[RATE_DATE_FIELD] = published
+        converted.append(row)
+    return converted
+
+
+def convert_batch(
+        input_path: str,
+        output_path: t.Optional[str] = None,
+        input_format: t.Optional[str] = None,
+        output_format: t.Optional[str] = None,
+        skip_invalid: bool = False
+) -> int:
+    """
+    Converts every row of a file of (date, base, symbol, amount) rows
+    Output rows keep the input columns and order, and add the converted value
+    and the publication date of its rate.
+    Output files are written to a temporary file which replaces them once complete,
+    so an invalid row or a failed request never leaves a partial file
+    :param input_path: Path of the CSV or JSONL file to read. '-' for standard input
+    :param output_path: Path of the file to write to. Standard output by default
+    :param input_format: csv or jsonl. Guessed from the input extension by default
+    :param output_format: csv or jsonl. Same as input by default
+    :param skip_invalid: If true, invalid rows are logged and skipped instead of failing the conversion
+    :return: Number of converted rows
+    """
+    input_format = input_format or detect_format(input_path)
+    output_format = output_format or input_format
+    infile = sys.stdin if input_path == '-' else open(input_path, 'r', encoding='utf-8', newline='')
+    temp_name = None
+    if output_path in (None, '-'):
+        outfile = sys.stdout
+    else:
+        temp_name = f"{os.path.abspath(output_path)}.{os.getpid()}.tmp"
+        outfile = open(temp_name, 'w', encoding='utf-8', newline='')
+    count = 0
+    completed = False
+    try:
+        writer = None
+        converted = convert_numbered_rows(read_rows(infile, input_format, skip_invalid), skip_invalid=skip_invalid)
+        for row in converted:
+            if output_format == 'csv':
+                if writer is None:
+                    writer = csv.DictWriter(outfile, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+            else:
+                outfile.write(jsonlib.dumps(row).decode('utf-8'))
+                outfile.write('\n')
+            count += 1
+        completed = True
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if temp_name is not None:
+            outfile.close()
+            if completed:
+                os.replace(temp_name, output_path)
+            else:
+                os.remove(temp_name)
+    logger.debug(f"Converted {count} rows")
+    return count
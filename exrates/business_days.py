@@ -0,0 +1,126 @@
+"""
+Calendar of the days the ECB publishes reference rates
+
+Rates are published on every TARGET business day. Weekends are never published,
+nor TARGET closing days since TARGET_CLOSINGS_YEAR: New Year's Day, Good Friday, Easter Monday,
+Labour Day, Christmas Day and 26 December. Closing days of earlier years changed, so only
+New Year's Day and Christmas Day are assumed closed before then.
+Every other day is assumed published, and days found published in API responses
+are trusted over the rules, so a wrong rule never hides rates
+"""
+import typing as t
+import threading
+from datetime import date as Date, timedelta
+from functools import lru_cache
+
+TARGET_CLOSINGS_YEAR = 2002
+
+
+def easter_sunday(year: int) -> Date:
+    """
+    Computes Easter Sunday of a year of the Gregorian calendar
+    :param year: Year
+    :return: Date of Easter Sunday
+    """
+    # Anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return Date(year, month, day + 1)
+
+
+@lru_cache(maxsize=64)
+def closing_days(year: int) -> t.FrozenSet[Date]:
+    """
+    Lists the weekdays without publication of a year
+    :param year: Year
+    :return: Set of dates
+    """
+    days = {Date(year, 1, 1), Date(year, 12, 25)}
+    if year >= TARGET_CLOSINGS_YEAR:
+        easter = easter_sunday(year)
+        days |= {easter - timedelta(days=2), easter + timedelta(days=1), Date(year, 5, 1), Date(year, 12, 26)}
+    return frozenset(day for day in days if day.weekday() < 5)
+
+
+class PublicationCalendar:
+    """
+    Publication days by the ECB calendar, corrected with observed publications
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Days published although the rules say otherwise
+        self._observed: t.Set[Date] = set()
+
+    def _is_published(self, day: Date) -> bool:
+        if day in self._observed:
+            return True
+        return day.weekday() < 5 and day not in closing_days(day.year)
+
+    def is_publication_day(self, date: str) -> bool:
+        """
+        Checks if rates are published on a given day
+        :param date: Date (YYYY-MM-DD format)
+        :return: True if rates are, or might be, published
+        """
+        return self._is_published(Date.fromisoformat(date))
+
+    def publication_days(self, start: str, end: str) -> t.List[str]:
+        """
+        Lists the publication days of a period
+        :param start: Date of first day (YYYY-MM-DD format)
+        :param end: Date of last day (YYYY-MM-DD format)
+        :return: List of dates (YYYY-MM-DD format)
+        """
+        first, last = Date.fromisoformat(start), Date.fromisoformat(end)
+        return [
+            (first + timedelta(days=offset)).isoformat()
+            for offset in range((last - first).days + 1)
+            if self._is_published(first + timedelta(days=offset))
+        ]
+
+    def trim(self, start: str, end: str) -> t.Optional[t.Tuple[str, str]]:
+        """
+        Narrows a period to its first and last publication days
+        :param start: Date of first day (YYYY-MM-DD format)
+        :param end: Date of last day (YYYY-MM-DD format)
+        :return: (start, end) tuple, None if no day of the period is published
+        """
+        first, last = Date.fromisoformat(start), Date.fromisoformat(end)
+        while first <= last and not self._is_published(first):
+            first += timedelta(days=1)
+        while last >= first and not self._is_published(last):
+            last -= timedelta(days=1)
+        if first > last:
+            return None
+        return first.isoformat(), last.isoformat()
+
+    def previous_publication_day(self, date: str, lookback_days: int) -> t.Optional[str]:
+        """
+        Finds the last publication day on or before a given day
+        :param date: Date (YYYY-MM-DD format)
+        :param lookback_days: Maximum number of days to look back
+        :return: Date (YYYY-MM-DD format), None if no day of the lookback period is published
+        """
+        day = Date.fromisoformat(date)
+        for offset in range(lookback_days + 1):
+            if self._is_published(day - timedelta(days=offset)):
+                return (day - timedelta(days=offset)).isoformat()
+        return None
+
+    def observe(self, dates: t.Iterable[str]) -> None:
+        """
+        Records days found published in API responses
+        :param dates: Dates with rates (YYYY-MM-DD format)
+        """
+        days = {Date.fromisoformat(date) for date in dates}
+        with self._lock:
+            self._observed |= {day for day in days if not self._is_published(day)}
@@ -0,0 +1,194 @@
+import typing as t
+import logging
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import exrates
+from exrates.httpcache import CachedResponse, HttpCache
+from exrates.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait to connect to and to read from the API
+DEFAULT_TIMEOUT = (3.05, 30.0)
+# Retries after the first attempt of a request
+DEFAULT_MAX_RETRIES = 3
+# Base and maximum seconds of the exponential backoff between retries
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+# Number of hosts and connections per host kept alive
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+# Response statuses worth retrying
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def backoff_delay(
+        attempt: int,
+        backoff_factor: float,
+        backoff_max: float,
+        retry_after: t.Optional[str] = None
+) -> float:
+    """
+    Computes seconds to wait before retrying a request
+    Uses full jitter over an exponential backoff, or the Retry-After header if given
+    :param attempt: Number of the failed attempt, starting at 0
+    :param backoff_factor: Base seconds of the exponential backoff
+    :param backoff_max: Maximum seconds to wait
+    :param retry_after: Value of the Retry-After header of the failed response, if any
+    :return: Seconds to wait
+    """
+    try:
+        return min(float(retry_after), backoff_max)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(backoff_max, backoff_factor * 2 ** attempt))
+
+
+class FrankfurterClient:
+    """
+    HTTP client shared by every Frankfurter API call
+
+    Keeps a pool of keep-alive connections, applies per-request timeouts
+    and retries connection errors, timeouts and RETRY_STATUSES responses
+    with jittered exponential backoff.
+    With an HttpCache, fresh responses are reused and stale ones revalidated
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            timeout: t.Union[float, t.Tuple[float, float]] = DEFAULT_TIMEOUT,
+            max_retries: int = DEFAULT_MAX_RETRIES,
+            backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+            backoff_max: float = DEFAULT_BACKOFF_MAX,
+            pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+            cache: t.Optional[HttpCache] = None
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'cache_hits': 0, 'revalidated': 0
+        }
+        # Coalesces concurrent calls of the same path
+        self.flight = SingleFlight()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def backoff(self, attempt: int, response: t.Optional[requests.Response] = None) -> float:
+        """
+        Computes seconds to wait before retrying
+        :param attempt: Number of the failed attempt, starting at 0
+        :param response: Failed response, if any
+        :return: Seconds to wait
+        """
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        return backoff_delay(attempt, self.backoff_factor, self.backoff_max, retry_after)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        """
+        Calls the API via GET on given path, retrying transient failures
+        The last response is returned even if its status is an error
+        :param path: Path to call to, relative to base_url
+        :param kwargs: Extra arguments for requests.Session.get
+        :return: API response
+        """
+        url = f"{self.base_url}/{path}"
+        kwargs.setdefault('timeout', self.timeout)
+        self._count('requests')
+        attempt = 0
+        while True:
+            self._count('attempts')
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as ex:
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    raise
+                delay = self.backoff(attempt)
+                logger.info(f"Retrying {url} in {delay:.2f}s after error: {ex}")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self.backoff(attempt, response)
+                logger.info(f"Retrying {url} in {delay:.2f}s after status {response.status_code}")
+                response.close()
+            self._count('retries')
+            exrates.get_metrics().count('retries')
+            attempt += 1
+            time.sleep(delay)
+
+    def get_content(self, path: str) -> bytes:
+        """
+        Retrieves the body of a successful response on given path, through the cache if any
+        A fresh cached response is used without calling the API. A stale one is
+        revalidated with a conditional request, and kept if the API answers 304
+        :param path: Path to call to, relative to base_url
+        :return: Response body
+        :raises requests.exceptions.HTTPError: If the response status is an error
+        """
+        metrics = exrates.get_metrics()
+        url = f"{self.base_url}/{path}"
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and cached.is_fresh():
+            self._count('cache_hits')
+            metrics.count('http_cache_hits')
+            return cached.content
+
+        metrics.count('requests')
+        response = self.get(path, headers=cached.validators() if cached is not None else None)
+        now = time.time()
+        if response.status_code == 304 and cached is not None:
+            self._count('revalidated')
+            metrics.count('http_revalidations')
+            self.cache.put(url, cached.revalidated(response.headers, now), now)
+            return cached.content
+        response.raise_for_status()
+        content = response.content
+        metrics.count('bytes_received', len(content))
+        if self.cache is not None:
+            self.cache.put(url, CachedResponse.from_response(response.headers, content, now), now)
+        return content
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        """
+        Retrieves request, retry, coalescing and connection pool statistics
+        :return: Dict of counters and pool statistics
+        """
+        pools = self._adapter.poolmanager.pools
+        pool_stats = {'pools': 0, 'connections_opened': 0, 'requests_sent': 0, 'idle_connections': 0}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            pool_stats['pools'] += 1
+            pool_stats['connections_opened'] += pool.num_connections
+            pool_stats['requests_sent'] += pool.num_requests
+            if pool.pool is not None:
+                # Free slots of the pool are filled with None
+                pool_stats['idle_connections'] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, 'deduplicated': self.flight.deduplicated, 'pool': pool_stats}
+
+    def close(self) -> None:
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
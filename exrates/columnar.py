@@ -0,0 +1,146 @@
+"""
+Compact columnar container of history rows
+
+Dates are stored as int32 days since 1970-01-01, the representation of numpy datetime64[D],
+currencies as int16 codes and rates as float64, each column in a contiguous array
+"""
+import typing as t
+from array import array
+from datetime import date as Date
+
+EPOCH_ORDINAL = Date(1970, 1, 1).toordinal()
+
+
+def to_day_number(date: str) -> int:
+    """
+    Converts a YYYY-MM-DD date to days since 1970-01-01
+    :param date: Date (YYYY-MM-DD format)
+    :return: Day number
+    """
+    return Date.fromisoformat(date).toordinal() - EPOCH_ORDINAL
+
+
+def from_day_number(day: int) -> str:
+    """
+    Converts days since 1970-01-01 to a YYYY-MM-DD date
+    :param day: Day number
+    :return: Date (YYYY-MM-DD format)
+    """
+    return Date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+class HistoryTable:
+    """
+    Columnar history rows
+
+    Rows are appended in order. Iterating a table yields the same dicts as exrates_history.
+    Columns can be shared without copy as numpy arrays with to_numpy
+    """
+
+    def __init__(self):
+        # Currency of each code
+        self.currencies: t.List[str] = []
+        self._codes: t.Dict[str, int] = {}
+        self.dates = array('i')
+        self.bases = array('h')
+        self.symbols = array('h')
+        self.rates = array('d')
+
+    def code(self, currency: str) -> int:
+        """
+        Retrieves the code of a currency, assigning a new one if needed
+        :param currency: Currency symbol
+        :return: Currency code
+        """
+        code = self._codes.get(currency)
+        if code is None:
+            code = self._codes[currency] = len(self.currencies)
+            self.currencies.append(currency)
+        return code
+
+    def append(self, date: str, base: str, symbol: str, rate: float) -> None:
+        self.dates.append(to_day_number(date))
+        self.bases.append(self.code(base))
+        self.symbols.append(self.code(symbol))
+        self.rates.append(rate)
+
+    def extend_rates(self, date: str, base: str, rates: t.Dict[str, float]) -> None:
+        """
+        Appends the rates of a day
+        :param date: Date of the rates (YYYY-MM-DD format)
+        :param base: Original currency
+        :param rates: Dict of symbols and rates
+        """
+        count = len(rates)
+        self.dates.extend([to_day_number(date)] * count)
+        self.bases.extend([self.code(base)] * count)
+        self.symbols.extend([self.code(symbol) for symbol in rates])
+        self.rates.extend(rates.values())
+
+    @classmethod
+    def from_rows(cls, rows: t.Iterable[t.Dict]) -> 'HistoryTable':
+        """
+        Builds a table from history rows
+        :param rows: Iterable of dicts with date, base, symbol and rate keys
+        :return: HistoryTable
+        """
+        table = cls()
+        for row in rows:
+            table.append(row['date'], row['base'], row['symbol'], row['rate'])
+        return table
+
+    @classmethod
+    def from_rates(cls, rates: t.Iterable[t.Tuple[str, t.Dict[str, float]]], base: str) -> 'HistoryTable':
+        """
+        Builds a table from the rates of each day
+        :param rates: Iterable of (date, dict of symbols and rates) tuples
+        :param base: Original currency
+        :return: HistoryTable
+        """
+        table = cls()
+        for date, day_rates in rates:
+            table.extend_rates(date, base, day_rates)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+    def __iter__(self) -> t.Iterator[t.Dict]:
+        currencies = self.currencies
+        last_day, last_date = None, None
+        for day, base, symbol, rate in zip(self.dates, self.bases, self.symbols, self.rates):
+            # Consecutive rows share their date
+            if day != last_day:
+                last_day, last_date = day, from_day_number(day)
+            yield {
+                'date': last_date,
+                'base': currencies[base],
+                'symbol': currencies[symbol],
+                'rate': rate
+            }
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the columns in bytes
+        """
+        return sum(column.itemsize * len(column) for column in (self.dates, self.bases, self.symbols, self.rates))
+
+    def to_numpy(self) -> t.Dict[str, t.Any]:
+        """
+        Views the columns as numpy arrays, without copying them
+        The table cannot grow while the arrays are alive.
+        Dates can be converted with dates.astype('datetime64[D]'),
+        and currency codes with the currencies attribute
+        :return: Dict of date (int32), base (int16), symbol (int16) and rate (float64) arrays
+        """
+        try:
+            import numpy as np
+        except ImportError as ex:
+            raise ImportError('numpy is required to export history tables: pip install "exrates[numpy]"') from ex
+        return {
+            'date': np.frombuffer(self.dates, dtype=np.int32),
+            'base': np.frombuffer(self.bases, dtype=np.int16),
+            'symbol': np.frombuffer(self.symbols, dtype=np.int16),
+            'rate': np.frombuffer(self.rates, dtype=np.float64)
+        }
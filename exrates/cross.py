@@ -0,0 +1,54 @@
+"""
+Cross rates derived from EUR based rates
+
+The ECB publishes every rate against EUR, and Frankfurter computes any other pair
+as amount * rate[symbol] / rate[base], rounded to SIGNIFICANT_DIGITS significant digits.
+Applying the same operations to the EUR table gives the same values the API returns.
+Values may only differ when the EUR table they come from differs, in which case
+they are within CROSS_RATE_TOLERANCE (relative) of each other
+"""
+import typing as t
+import exrates
+
+ANCHOR_CURRENCY = 'EUR'
+# Relative difference allowed between derived rates and rates returned by the API
+# One unit of the 5th significant digit
+CROSS_RATE_TOLERANCE = 1e-4
+
+
+def anchor_symbols(base: str, symbols: t.Iterable[str]) -> t.List[str]:
+    """
+    Lists the EUR based rates needed to derive rates of a base currency
+    :param base: Original currency
+    :param symbols: Currencies to convert to
+    :return: Sorted list of currencies
+    """
+    return sorted({base, *symbols} - {ANCHOR_CURRENCY})
+
+
+def derive_rates(
+        anchor_rates: t.Dict[str, float],
+        base: str,
+        symbols: t.Iterable[str],
+        amount: float = 1.0
+) -> t.Dict[str, float]:
+    """
+    Derives rates of a base currency from EUR based rates, as Frankfurter API does
+    :param anchor_rates: Dict of symbols and EUR based rates
+    :param base: Original currency
+    :param symbols: Currencies to convert to
+    :param amount: Amount to convert. 1 by default
+    :return: Dict of symbols and rates (or converted amounts) sorted by symbol.
+            Symbols without a EUR based rate, and the base itself, are omitted
+    """
+    rates = {**anchor_rates, ANCHOR_CURRENCY: 1.0}
+    if base not in rates:
+        return {}
+    divisor = rates[base]
+    # Rates of EUR are returned as published
+    rebase = base != ANCHOR_CURRENCY or amount != 1
+    return {
+        symbol: exrates.round_significant(amount * rates[symbol] / divisor) if rebase else rates[symbol]
+        for symbol in sorted(set(symbols))
+        if symbol != base and symbol in rates
+    }
@@ -0,0 +1,221 @@
+"""
+Cache of API responses with HTTP validators
+
+Responses are kept with their ETag and Last-Modified validators and a freshness deadline
+from their Cache-Control (or Expires) headers. Fresh responses are used without calling
+the API. Stale ones are revalidated with a conditional request, and a 304 response
+refreshes them without downloading the body again.
+Responses with no-store, or without validators nor freshness, are not kept
+"""
+import typing as t
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Responses kept, the least recently used are evicted first
+DEFAULT_MAX_ENTRIES = 1024
+# Bytes of response bodies kept, the least recently used are evicted first
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    expires_at REAL NOT NULL,
+    used_at REAL NOT NULL
+)
+"""
+
+
+def parse_cache_control(value: str) -> t.Dict[str, t.Optional[str]]:
+    """
+    Parses a Cache-Control header
+    :param value: Header value, such as 'public, max-age=300'
+    :return: Dict of lowercase directive names and their value, None if they have none
+    """
+    directives = {}
+    for item in value.split(','):
+        name, _, argument = item.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def http_date(value: t.Optional[str]) -> t.Optional[float]:
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def expiration(headers: t.Mapping[str, str], now: float) -> t.Optional[float]:
+    """
+    Computes until when a response is fresh
+    max-age takes precedence over Expires, and the Age of the response is discounted
+    :param headers: Response headers
+    :param now: Epoch timestamp of the response
+    :return: Epoch timestamp until which the response is fresh, now if it must be revalidated
+            before any use, None if it must not be stored
+    """
+    directives = parse_cache_control(headers.get('Cache-Control', ''))
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return now
+    try:
+        lifetime = float(directives['max-age'])
+    except (KeyError, TypeError, ValueError):
+        expires, date = http_date(headers.get('Expires')), http_date(headers.get('Date'))
+        lifetime = expires - (date or now) if expires is not None else 0.0
+    try:
+        age = float(headers.get('Age', 0))
+    except ValueError:
+        age = 0.0
+    return now + max(lifetime - age, 0.0)
+
+
+class CachedResponse:
+    """
+    Body of a response with its validators and freshness
+    """
+
+    def __init__(
+            self,
+            content: bytes,
+            etag: t.Optional[str] = None,
+            last_modified: t.Optional[str] = None,
+            expires_at: float = 0.0
+    ):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def is_fresh(self, now: t.Optional[float] = None) -> bool:
+        return (time.time() if now is None else now) < self.expires_at
+
+    def validators(self) -> t.Dict[str, str]:
+        """
+        :return: Headers making a request conditional on the response having changed
+        """
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def revalidated(self, headers: t.Mapping[str, str], now: float) -> t.Optional['CachedResponse']:
+        """
+        Refreshes the response from the headers of a 304 response
+        :param headers: Headers of the 304 response
+        :param now: Epoch timestamp of the 304 response
+        :return: Refreshed CachedResponse with the same body, None if it must not be stored anymore
+        """
+        expires_at = expiration(headers, now)
+        if expires_at is None:
+            return None
+        return CachedResponse(
+            self.content,
+            headers.get('ETag', self.etag),
+            headers.get('Last-Modified', self.last_modified),
+            expires_at
+        )
+
+    @classmethod
+    def from_response(cls, headers: t.Mapping[str, str], content: bytes, now: float) -> t.Optional['CachedResponse']:
+        """
+        Builds the cached copy of a successful response
+        :param headers: Response headers
+        :param content: Response body
+        :param now: Epoch timestamp of the response
+        :return: CachedResponse, None if the response is not worth storing
+        """
+        expires_at = expiration(headers, now)
+        etag, last_modified = headers.get('ETag'), headers.get('Last-Modified')
+        if expires_at is None or (expires_at <= now and etag is None and last_modified is None):
+            return None
+        return cls(content, etag, last_modified, expires_at)
+
+
+class HttpCache:
+    """
+    SQLite backed store of CachedResponse by URL, in memory unless a path is given
+    """
+
+    def __init__(self, path: str = ':memory:', max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param path: Path of the SQLite file. In memory by default
+        :param max_entries: Responses kept
+        :param max_bytes: Bytes of response bodies kept. Larger responses are not kept
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Imported on first use, as the CLI does not always need a cache
+        import sqlite3
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, url: str, now: t.Optional[float] = None) -> t.Optional[CachedResponse]:
+        """
+        Retrieves the cached response of a URL, fresh or not
+        :param url: Requested URL
+        :param now: Epoch timestamp of the use. Current time by default
+        :return: CachedResponse, None if there is none
+        """
+        now = time.time() if now is None else now
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT content, etag, last_modified, expires_at FROM responses WHERE url = ?",
+                [url]
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE responses SET used_at = ? WHERE url = ?", [now, url])
+        return CachedResponse(bytes(row[0]), row[1], row[2], row[3])
+
+    def put(self, url: str, response: t.Optional[CachedResponse], now: t.Optional[float] = None) -> None:
+        """
+        Stores the cached response of a URL, evicting the least recently used ones
+        beyond max_entries or max_bytes
+        :param url: Requested URL
+        :param response: CachedResponse to store. None removes the URL
+        :param now: Epoch timestamp of the use. Current time by default
+        """
+        now = time.time() if now is None else now
+        with self._lock, self._connection:
+            if response is None or len(response.content) > self.max_bytes:
+                self._connection.execute("DELETE FROM responses WHERE url = ?", [url])
+                return
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (url, content, etag, last_modified, expires_at, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [url, response.content, response.etag, response.last_modified, response.expires_at, now]
+            )
+            self._connection.execute(
+                "DELETE FROM responses WHERE url NOT IN"
+                " (SELECT url FROM responses ORDER BY used_at DESC LIMIT ?)",
+                [self.max_entries]
+            )
+            self._connection.execute(
+                "DELETE FROM responses WHERE url IN (SELECT url FROM"
+                " (SELECT url, SUM(LENGTH(content)) OVER (ORDER BY used_at DESC, url) AS kept FROM responses)"
+                " WHERE kept > ?)",
+                [self.max_bytes]
+            )
@@ -0,0 +1,67 @@
+"""
+JSON backend of API responses and output rows
+
+orjson is used when it is installed (pip install "exrates[orjson]"), the standard library otherwise.
+EXRATES_JSON_BACKEND=json forces the standard library.
+Output keeps the layout of json.dumps, with ', ' and ': ' separators and non ASCII characters escaped,
+whichever backend is installed. orjson cannot produce it, so it only encodes compact output,
+an opt-in with EXRATES_JSON_COMPACT=1 (or the --compact-json option), without spaces and in UTF-8
+"""
+import typing as t
+import json
+import os
+
+BACKEND = os.environ.get("EXRATES_JSON_BACKEND", "orjson").lower()
+if BACKEND == "orjson":
+    try:
+        import orjson
+    except ImportError:
+        BACKEND = "json"
+# If true, output is compact JSON instead of the json.dumps layout
+COMPACT = os.environ.get("EXRATES_JSON_COMPACT", "").lower() in ("1", "true", "yes")
+
+_encoder = json.JSONEncoder()
+_compact_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(data: t.Union[bytes, str]) -> t.Any:
+    """
+    Decodes a JSON document
+    :param data: UTF-8 bytes or str
+    :return: Decoded object
+    """
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: t.Any, compact: t.Optional[bool] = None) -> bytes:
+    """
+    Encodes an object as JSON
+    :param obj: Object of JSON types
+    :param compact: If true, encodes compact JSON. COMPACT by default
+    :return: UTF-8 bytes
+    """
+    if not (COMPACT if compact is None else compact):
+        return _encoder.encode(obj).encode('utf-8')
+    if BACKEND == "orjson":
+        return orjson.dumps(obj)
+    return _compact_encoder.encode(obj).encode('utf-8')
+
+
+def dump_lines(rows: t.Iterable[t.Any], compact: t.Optional[bool] = None) -> bytes:
+    """
+    Encodes objects as JSON lines in a single buffer
+    :param rows: Objects of JSON types
+    :param compact: If true, encodes compact JSON. COMPACT by default
+    :return: UTF-8 bytes, one line per object, each ending with a newline
+    """
+    if not (COMPACT if compact is None else compact):
+        return ''.join([f"{_encoder.encode(row)}\n" for row in rows]).encode('utf-8')
+    if BACKEND == "orjson":
+        # orjson over-allocates its results, so they are copied to the buffer instead of kept in a list
+        buffer = bytearray()
+        for row in rows:
+            buffer += orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+        return bytes(buffer)
+    return ''.join([f"{_compact_encoder.encode(row)}\n" for row in rows]).encode('utf-8')
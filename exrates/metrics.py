@@ -0,0 +1,131 @@
+"""
+Timers and counters of API calls and history stages
+
+Stages are timed where they run:
+    fetch       HTTP requests to the API, including retries
+    decode      JSON decoding of API responses
+    transform   normalization of responses and building of output rows
+    print       encoding and printing rows to the standard output
+    write       encoding and writing rows to the output file
+
+Counters record requests, bytes received, retries, cache hits, misses and revalidations,
+rows output and invalid rows skipped.
+Every value accumulates for the life of the process, until reset
+"""
+import typing as t
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ('fetch', 'decode', 'transform', 'print', 'write')
+COUNTERS = {
+    'requests': "API requests",
+    'bytes_received': "Bytes of API responses",
+    'retries': "Retried API requests",
+    'chunk_retries': "Retried history chunks",
+    'store_hits': "Queries answered by the rate store alone",
+    'store_misses': "Runs of days missing in the rate store, requested to the API",
+    'http_cache_hits': "API responses reused while fresh, without a request",
+    'http_revalidations': "Stale API responses confirmed unchanged by a 304 response",
+    'currencies_cache_hits': "Supported currencies read from the cache",
+    'currencies_cache_misses': "Supported currencies requested to the API",
+    'rows': "History rows output",
+    'invalid_rows': "Rows skipped by batch conversion as invalid",
+}
+
+
+class Metrics:
+    """
+    Thread safe stage timers and counters
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls = dict.fromkeys(STAGES, 0)
+            self._seconds = dict.fromkeys(STAGES, 0.0)
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Records a run of a stage
+        :param stage: One of STAGES
+        :param seconds: Duration of the run
+        """
+        with self._lock:
+            self._calls[stage] += 1
+            self._seconds[stage] += seconds
+
+    @contextmanager
+    def timer(self, stage: str) -> t.Iterator[None]:
+        """
+        Times the block as a run of a stage, even if it fails
+        :param stage: One of STAGES
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Increases a counter
+        :param name: One of COUNTERS keys
+        :param value: Amount to add
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def stats(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        """
+        Retrieves every timer and counter
+        :return: Dict with stages (calls and seconds of each stage) and counters
+        """
+        with self._lock:
+            return {
+                'stages': {
+                    stage: {'calls': self._calls[stage], 'seconds': self._seconds[stage]}
+                    for stage in STAGES
+                },
+                'counters': dict(self._counters)
+            }
+
+    def report(self) -> str:
+        """
+        Renders timers and counters as a table for people
+        :return: Report text
+        """
+        stats = self.stats()
+        lines = [f"{'stage':<24}{'calls':>10}{'seconds':>12}"]
+        for stage, values in stats['stages'].items():
+            lines.append(f"{stage:<24}{values['calls']:>10}{values['seconds']:>12.4f}")
+        lines.append('')
+        for name, value in stats['counters'].items():
+            lines.append(f"{name:<24}{value:>10}")
+        return '\n'.join(lines) + '\n'
+
+    def prometheus(self) -> str:
+        """
+        Renders timers and counters in Prometheus text format
+        :return: Metrics text
+        """
+        stats = self.stats()
+        lines = [
+            "# HELP exrates_stage_seconds_total Seconds spent in each stage",
+            "# TYPE exrates_stage_seconds_total counter",
+        ]
+        for stage, values in stats['stages'].items():
+            lines.append(f'exrates_stage_seconds_total{{stage="{stage}"}} {values["seconds"]}')
+        lines.append("# HELP exrates_stage_calls_total Runs of each stage")
+        lines.append("# TYPE exrates_stage_calls_total counter")
+        for stage, values in stats['stages'].items():
+            lines.append(f'exrates_stage_calls_total{{stage="{stage}"}} {values["calls"]}')
+        for name, value in stats['counters'].items():
+            lines.append(f"# HELP exrates_{name}_total {COUNTERS[name]}")
+            lines.append(f"# TYPE exrates_{name}_total counter")
+            lines.append(f"exrates_{name}_total {value}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,302 @@
+"""
+Long-running HTTP server for history and convert queries
+
+Endpoints:
+    GET /history?start=YYYY-MM-DD&end=YYYY-MM-DD&base=USD&symbol=EUR,CAD
+    GET /convert?date=YYYY-MM-DD&base=USD&symbol=EUR&amount=50
+    GET /metrics
+
+Rate tables are kept in an in-memory LRU shared by every client,
+and concurrent identical misses are requested upstream only once
+"""
+import typing as t
+import argparse
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import requests
+import exrates
+from exrates import jsonlib
+from exrates.cross import ANCHOR_CURRENCY, anchor_symbols
+from exrates.singleflight import SingleFlight
+from exrates.store import DEFAULT_TODAY_TTL, is_final
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Rate tables kept in memory
+DEFAULT_CACHE_SIZE = 1024
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RatesKey = t.Tuple[str, str, str, t.Tuple[str, ...]]
+
+
+class RateCache:
+    """
+    LRU of rate tables by (start, end, base, symbols)
+
+    Tables whose last day was retrieved after its publication cutoff never expire,
+    others expire after `ttl` seconds.
+    Concurrent misses of the same table are coalesced in a single load
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_TODAY_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tables: 'OrderedDict[RatesKey, t.Tuple[t.Dict[str, t.Dict[str, float]], float]]' = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: RatesKey, now: t.Optional[float] = None) -> t.Optional[t.Dict[str, t.Dict[str, float]]]:
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is None:
+                return None
+            rates, fetched_at = entry
+            if not is_final(key[1], fetched_at) and now - fetched_at >= self.ttl:
+                del self._tables[key]
+                return None
+            self._tables.move_to_end(key)
+            return rates
+
+    def put(self, key: RatesKey, rates: t.Dict[str, t.Dict[str, float]], fetched_at: float) -> None:
+        with self._lock:
+            self._tables[key] = (rates, fetched_at)
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_size:
+                self._tables.popitem(last=False)
+
+    def _load(self, key: RatesKey) -> t.Dict[str, t.Dict[str, float]]:
+        fetched_at = time.time()
+        start, end, base, symbols = key
+        rates = exrates.fetch_rates(start, end, base, list(symbols))
+        self.put(key, rates, fetched_at)
+        return rates
+
+    def rates(self, start: str, end: str, base: str, symbols: t.Iterable[str]) -> t.Dict[str, t.Dict[str, float]]:
+        """
+        Retrieves exchange rates on a period, from memory if possible
+        :param start: Date of first day to get data (YYYY-MM-DD format)
+        :param end: Date of last day to get data (YYYY-MM-DD format)
+        :param base: Original currency
+        :param symbols: Currencies to convert to
+        :return: Dict of dates to a dict of symbols and rates. Shared, it must not be mutated
+        """
+        key = (start, end, base, tuple(sorted(set(symbols))))
+        rates = self.get(key)
+        with self._lock:
+            if rates is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if rates is not None:
+            return rates
+        return self._flight.do(key, self._load, key)
+
+    def stats(self) -> t.Dict[str, int]:
+        with self._lock:
+            return {
+                'size': len(self._tables),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self._flight.deduplicated
+            }
+
+
+class LatencyHistogram:
+    """
+    Cumulative histogram of request durations
+    """
+
+    def __init__(self, buckets: t.Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self) -> t.List[t.Tuple[str, int]]:
+        """
+        :return: List of (upper bound, number of durations lower or equal) tuples, ending with +Inf
+        """
+        total = 0
+        result = []
+        for bound, count in zip([*map(str, self.buckets), '+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def query_list(params: t.Dict[str, t.List[str]], name: str) -> t.List[str]:
+    # Accepts repeated and comma separated values
+    return [value for item in params.get(name, []) for value in item.split(',') if value]
+
+
+def query_value(params: t.Dict[str, t.List[str]], name: str, default: t.Optional[str] = None) -> str:
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise ValueError(f"Missing parameter: {name}")
+        return default
+    return values[-1]
+
+
+def query_date(params: t.Dict[str, t.List[str]], name: str) -> str:
+    try:
+        return exrates.valid_date(query_value(params, name, exrates.current_date()))
+    except argparse.ArgumentTypeError as ex:
+        raise ValueError(f"Invalid {name}: {ex}")
+
+
+def history_endpoint(server: 'RateServer', params: t.Dict[str, t.List[str]]) -> t.Any:
+    start = query_date(params, 'start')
+    end = query_date(params, 'end')
+    if start > end:
+        raise ValueError(f"Given start ({start}) date is higher than end date ({end})")
+    base = query_value(params, 'base', exrates.DEFAULT_SYMBOL)
+    symbols = query_list(params, 'symbol')
+    if not symbols:
+        raise ValueError("Missing parameter: symbol")
+    rates = server.cache.rates(start, end, base, symbols)
+    return exrates.history_rows(rates, base)
+
+
+def convert_endpoint(server: 'RateServer', params: t.Dict[str, t.List[str]]) -> t.Any:
+    date = query_date(params, 'date')
+    base = query_value(params, 'base', exrates.DEFAULT_SYMBOL)
+    symbol = query_value(params, 'symbol')
+    amount = float(query_value(params, 'amount'))
+    # Days without publication use the previous published rate, as the API does.
+    # EUR based rates are kept as published, so the value is only rounded once
+    rates = {} if base == symbol else server.cache.rates(
+        exrates.lookback_start(date), date, ANCHOR_CURRENCY, anchor_symbols(base, [symbol])
+    )
+    factor = exrates.latest_factor(rates, base, symbol)
+    if factor is None:
+        raise LookupError(f"No exchange rate from {base} to {symbol} on {date}")
+    return {'date': date, 'base': base, 'symbol': symbol, 'amount': amount,
+            'value': exrates.round_significant(amount * factor)}
+
+
+ROUTES: t.Dict[str, t.Callable[['RateServer', t.Dict[str, t.List[str]]], t.Any]] = {
+    '/history': history_endpoint,
+    '/convert': convert_endpoint,
+}
+
+
+class RateRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections
+    protocol_version = "HTTP/1.1"
+    # Headers and body are sent separately, do not wait for the ACK of the headers
+    disable_nagle_algorithm = True
+    server: 'RateServer'
+
+    def send_body(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == '/metrics':
+            self.send_body(200, self.server.metrics().encode('utf-8'), "text/plain; version=0.0.4")
+            return
+        endpoint = ROUTES.get(url.path)
+        if endpoint is None:
+            self.send_body(404, jsonlib.dumps({'error': f"Unknown endpoint: {url.path}"}))
+            return
+
+        started = time.perf_counter()
+        try:
+            status, result = 200, endpoint(self.server, parse_qs(url.query))
+        except ValueError as ex:
+            status, result = 400, {'error': str(ex)}
+        except LookupError as ex:
+            status, result = 404, {'error': str(ex)}
+        except requests.exceptions.RequestException as ex:
+            logger.error(f"Upstream error for {self.path}: {ex}")
+            status, result = 502, {'error': f"Upstream error: {ex}"}
+        except Exception as ex:
+            # Any other error still gets a JSON answer, and the connection is kept usable
+            logger.exception(f"Unexpected error for {self.path}: {ex}")
+            status, result = 500, {'error': "Internal server error"}
+        self.send_body(status, jsonlib.dumps(result))
+        self.server.observe(url.path, time.perf_counter() - started)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class RateServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering history and convert queries from a shared RateCache
+    """
+    daemon_threads = True
+
+    def __init__(
+            self,
+            address: t.Tuple[str, int] = (DEFAULT_HOST, DEFAULT_PORT),
+            cache_size: int = DEFAULT_CACHE_SIZE
+    ):
+        super().__init__(address, RateRequestHandler)
+        self.cache = RateCache(cache_size)
+        self._lock = threading.Lock()
+        self.histograms: t.Dict[str, LatencyHistogram] = {path: LatencyHistogram() for path in ROUTES}
+
+    def observe(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms[endpoint].observe(seconds)
+
+    def metrics(self) -> str:
+        """
+        Renders latency histograms, cache statistics and stage timers in Prometheus text format
+        :return: Metrics text
+        """
+        lines = [
+            "# HELP exrates_request_duration_seconds Duration of requests by endpoint",
+            "# TYPE exrates_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for endpoint, histogram in self.histograms.items():
+                for bound, count in histogram.cumulative():
+                    lines.append(f'exrates_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'exrates_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                lines.append(f'exrates_request_duration_seconds_count{{endpoint="{endpoint}"}} {histogram.count}')
+        for name, value in self.cache.stats().items():
+            lines.append(f"# TYPE exrates_rate_cache_{name} {'gauge' if name == 'size' else 'counter'}")
+            lines.append(f"exrates_rate_cache_{name} {value}")
+        return '\n'.join(lines) + '\n' + exrates.get_metrics().prometheus()
+
+
+def serve(
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        cache_size: int = DEFAULT_CACHE_SIZE
+) -> None:
+    """
+    Runs the rate server until interrupted
+    :param host: Address to listen on
+    :param port: Port to listen on
+    :param cache_size: Rate tables kept in memory
+    """
+    with RateServer((host, port), cache_size) as server:
+        logger.info(f"Serving exchange rates on http://{host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Stopping server")
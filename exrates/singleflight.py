@@ -0,0 +1,134 @@
+"""
+Coalescing of concurrent identical calls
+
+Callers with the same key while a call is in flight wait for it and share its result,
+so a burst of identical API calls results in a single request
+"""
+import typing as t
+import threading
+from urllib.parse import parse_qsl, urlencode
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes an API path, so equivalent requests get the same key
+    Query parameters are sorted, as are comma separated values
+    :param url: Path relative to the API base URL, with query string
+    :return: Normalized path
+    """
+    path, _, query = url.lstrip('/').partition('?')
+    params = sorted(
+        (name, ','.join(sorted(value.split(','))))
+        for name, value in parse_qsl(query, keep_blank_values=True)
+    )
+    return f"{path}?{urlencode(params, safe=',')}" if params else path
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: t.Any = None
+        self.error: t.Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key
+
+    While a call for a key is in flight, other callers with the same key wait for it
+    and receive its result (the same object, which must not be mutated) or its exception
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: t.Dict[t.Hashable, _Call] = {}
+        # Number of calls answered by another in-flight call
+        self.deduplicated = 0
+
+    def do(self, key: t.Hashable, fn: t.Callable[..., t.Any], *args, **kwargs) -> t.Any:
+        """
+        Calls a function, unless a call with the same key is already in flight
+        :param key: Key identifying equivalent calls
+        :param fn: Function to call
+        :param args: Positional arguments of the function
+        :param kwargs: Keyword arguments of the function
+        :return: Result of the function
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class _AsyncCall:
+    def __init__(self, task: 'asyncio.Future'):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls with the same key, within a single event loop
+
+    The call runs as a task shared by its callers. It is cancelled
+    only when every caller waiting for it has been cancelled
+    """
+
+    def __init__(self):
+        self._calls: t.Dict[t.Hashable, _AsyncCall] = {}
+        # Number of calls answered by another in-flight call
+        self.deduplicated = 0
+
+    async def do(self, key: t.Hashable, fn: t.Callable[..., t.Awaitable], *args, **kwargs) -> t.Any:
+        """
+        Awaits a coroutine function, unless a call with the same key is already in flight
+        :param key: Key identifying equivalent calls
+        :param fn: Coroutine function to call
+        :param args: Positional arguments of the function
+        :param kwargs: Keyword arguments of the function
+        :return: Result of the function
+        """
+        # Imported on first use, asyncio is slow to import and only needed by the asyncio API
+        import asyncio
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn(*args, **kwargs)))
+            call.task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.deduplicated += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,245 @@
+"""
+Offline snapshot of the whole rate history, read through a memory map
+
+File layout, little endian:
+    header      magic, version, first day (days since 1970-01-01), number of days, number of currencies
+    currencies  3 ASCII bytes per currency, padded with zeros to a multiple of 8 bytes
+    matrix      float64 EUR based rates, one row per calendar day from the first day,
+                one column per currency. NaN where a currency has no rate on a day
+
+Every calendar day has a row, so the rate of a day and currency is found by offset,
+without parsing. The file is opened read-only, so its pages are shared by every process using it
+"""
+import typing as t
+import logging
+import math
+import mmap
+import os
+import struct
+from array import array
+import exrates
+from exrates.columnar import from_day_number, to_day_number
+from exrates.cross import ANCHOR_CURRENCY, anchor_symbols, derive_rates
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'EXRSNAP\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sIiII')
+CURRENCY_WIDTH = 3
+ALIGNMENT = 8
+
+
+def header_size(currencies: int) -> int:
+    """
+    Computes the offset of the rate matrix
+    :param currencies: Number of currencies
+    :return: Size in bytes of header and currencies, padded to ALIGNMENT
+    """
+    size = HEADER.size + currencies * CURRENCY_WIDTH
+    return size + (-size % ALIGNMENT)
+
+
+def write_snapshot(path: str, rates: t.Dict[str, t.Dict[str, float]]) -> int:
+    """
+    Writes EUR based rates to a snapshot file
+    The file is written to a temporary file first, then moved to its path
+    :param path: Path of the snapshot file
+    :param rates: Dict of dates to a dict of symbols and EUR based rates
+    :return: Number of days with rates
+    """
+    if not rates:
+        raise ValueError("No rates to write to snapshot")
+    currencies = sorted({symbol for day_rates in rates.values() for symbol in day_rates} - {ANCHOR_CURRENCY})
+    columns = {symbol: column for column, symbol in enumerate(currencies)}
+    first_day = to_day_number(min(rates))
+    days = to_day_number(max(rates)) - first_day + 1
+    matrix = array('d', [math.nan]) * (days * len(currencies))
+    for date, day_rates in rates.items():
+        row = (to_day_number(date) - first_day) * len(currencies)
+        for symbol, rate in day_rates.items():
+            if symbol in columns and rate is not None:
+                matrix[row + columns[symbol]] = rate
+    if matrix.itemsize != 8:
+        raise OSError("float64 arrays are not supported on this platform")
+    if struct.pack('=H', 1) != struct.pack('<H', 1):
+        matrix.byteswap()
+
+    header = HEADER.pack(MAGIC, VERSION, first_day, days, len(currencies)) + \
+        ''.join(currencies).encode('ascii')
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as outfile:
+            outfile.write(header.ljust(header_size(len(currencies)), b'\x00'))
+            matrix.tofile(outfile)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    logger.debug(f"Wrote {len(rates)} days of {len(currencies)} currencies to {path}")
+    return len(rates)
+
+
+def export_snapshot(
+        path: str,
+        start: t.Optional[str] = None,
+        end: t.Optional[str] = None,
+        symbols: t.Optional[t.List[str]] = None
+) -> int:
+    """
+    Requests EUR based rates of a period to the API and writes them to a snapshot file
+    :param path: Path of the snapshot file
+    :param start: Date of first day to get data (YYYY-MM-DD format). MIN_DATE by default
+    :param end: Date of last day to get data (YYYY-MM-DD format). Today by default
+    :param symbols: Currencies to include. Every supported currency by default
+    :return: Number of days with rates
+    """
+    start = exrates.MIN_DATE if start is None else start
+    end = exrates.current_date() if end is None else end
+    if symbols is None:
+        symbols = sorted(set(exrates.cached_currencies()) - {ANCHOR_CURRENCY})
+    rates = exrates.request_rates(start, end, ANCHOR_CURRENCY, symbols)
+    return write_snapshot(path, rates)
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as infile:
+            self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.first_day, self.days, count = HEADER.unpack_from(self._mmap)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not an exrates snapshot (version {VERSION}): {path}")
+            names = self._mmap[HEADER.size:HEADER.size + count * CURRENCY_WIDTH].decode('ascii')
+            self.currencies = tuple(names[i:i + CURRENCY_WIDTH] for i in range(0, len(names), CURRENCY_WIDTH))
+            self._columns = {symbol: column for column, symbol in enumerate(self.currencies)}
+            offset = header_size(count)
+            if len(self._mmap) != offset + self.days * count * 8:
+                raise ValueError(f"Truncated snapshot: {path}")
+            if struct.pack('=H', 1) != struct.pack('<H', 1):
+                raise OSError("Snapshots can only be read on little endian platforms")
+            self._matrix = memoryview(self._mmap)[offset:].cast('d')
+        except BaseException:
+            self._mmap.close()
+            raise
+
+    @property
+    def first_date(self) -> str:
+        return from_day_number(self.first_day)
+
+    @property
+    def last_date(self) -> str:
+        return from_day_number(self.first_day + self.days - 1)
+
+    def _row(self, date: str) -> t.Optional[int]:
+        # Offset of the first rate of a day in the matrix
+        row = to_day_number(date) - self.first_day
+        if not 0 <= row < self.days:
+            return None
+        return row * len(self.currencies)
+
+    def published(self, date: str) -> bool:
+        """
+        Checks if there are rates on a day
+        :param date: Date (YYYY-MM-DD format)
+        :return: True if any currency has a rate on that day
+        """
+        row = self._row(date)
+        if row is None:
+            return False
+        return any(not math.isnan(value) for value in self._matrix[row:row + len(self.currencies)])
+
+    def anchor_rates(self, date: str, symbols: t.Optional[t.Iterable[str]] = None) -> t.Dict[str, float]:
+        """
+        Reads the EUR based rates of a day
+        :param date: Date (YYYY-MM-DD format)
+        :param symbols: Currencies to read. Every currency by default
+        :return: Dict of symbols and rates. Currencies without rate on that day are omitted
+        """
+        row = self._row(date)
+        if row is None:
+            return {}
+        symbols = self.currencies if symbols is None else [symbol for symbol in symbols if symbol in self._columns]
+        rates = {symbol: self._matrix[row + self._columns[symbol]] for symbol in symbols}
+        return {symbol: rate for symbol, rate in rates.items() if not math.isnan(rate)}
+
+    def as_of(self, date: str, lookback_days: t.Optional[int] = None) -> t.Optional[str]:
+        """
+        Finds the last publication day on or before a given day, as the API does for conversions
+        :param date: Date (YYYY-MM-DD format)
+        :param lookback_days: Days to look back. CONVERT_LOOKBACK_DAYS by default
+        :return: Date of the last publication (YYYY-MM-DD format), None if there is none in the lookback period
+        """
+        lookback_days = exrates.CONVERT_LOOKBACK_DAYS if lookback_days is None else lookback_days
+        day = to_day_number(date)
+        for previous in range(day, max(day - lookback_days, self.first_day) - 1, -1):
+            if self.published(from_day_number(previous)):
+                return from_day_number(previous)
+        return None
+
+    def rates(self, start: str, end: str, base: str, symbols: t.Iterable[str]) -> t.Dict[str, t.Dict[str, float]]:
+        """
+        Reads exchange rates on a period, derived from EUR based rates as the API does
+        :param start: Date of first day to get data (YYYY-MM-DD format)
+        :param end: Date of last day to get data (YYYY-MM-DD format)
+        :param base: Original currency
+        :param symbols: Currencies to convert to
+        :return: Dict of dates to a dict of symbols and rates. Days without publication are omitted
+        """
+        symbols = list(symbols)
+        needed = anchor_symbols(base, symbols)
+        first = max(to_day_number(start), self.first_day)
+        last = min(to_day_number(end), self.first_day + self.days - 1)
+        result = {}
+        for day in range(first, last + 1):
+            date = from_day_number(day)
+            if not self.published(date):
+                continue
+            anchor_rates = self.anchor_rates(date, needed)
+            if base == ANCHOR_CURRENCY or base in anchor_rates:
+                result[date] = derive_rates(anchor_rates, base, symbols)
+        return result
+
+    def convert(self, date: str, base: str, symbol: str, amount: float) -> t.Optional[float]:
+        """
+        Converts an amount with the rates in effect on a given day
+        :param date: Date of conversion (YYYY-MM-DD format)
+        :param base: Original currency
+        :param symbol: Currency to convert to
+        :param amount: Amount to be converted
+        :return: Converted value, rounded as the API does. None if there is no rate
+        """
+        published = self.as_of(date)
+        if published is None:
+            return None
+        if base == symbol:
+            return float(amount)
+        return derive_rates(self.anchor_rates(published, [base, symbol]), base, [symbol], amount).get(symbol)
+
+    def to_numpy(self) -> t.Any:
+        """
+        Shares the rate matrix without copy as a read-only numpy array
+        Requires numpy: pip install "exrates[numpy]"
+        :return: float64 array of shape (days, currencies)
+        """
+        try:
+            import numpy as np
+        except ImportError as ex:
+            raise ImportError('numpy is required for to_numpy: pip install "exrates[numpy]"') from ex
+        return np.frombuffer(self._matrix, dtype=np.float64).reshape(self.days, len(self.currencies))
+
+    def close(self) -> None:
+        self._matrix.release()
+        self._mmap.close()
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,273 @@
+"""
+Source selection of rates, shared by the blocking and asyncio APIs
+
+How rates are retrieved (snapshot, rate store, cross rates or API, chunk retries and
+conversion fallbacks) is written once, as plans: generators yielding the operations they need
+and receiving their results, or their exceptions. Operations are:
+    Call: a blocking local call, such as a rate store or snapshot lookup
+    Request: rates of a period, requested to the API in chunks
+    Get: an API path
+The blocking API runs plans with run. exrates.aio runs the same plans, awaiting requests
+and running calls in a thread so the event loop is never blocked
+"""
+import typing as t
+import logging
+import sys
+import exrates
+from exrates.cross import ANCHOR_CURRENCY, anchor_symbols, derive_rates
+
+logger = logging.getLogger(__name__)
+
+Rates = t.Dict[str, t.Dict[str, float]]
+
+
+class Call(t.NamedTuple):
+    function: t.Callable
+    args: tuple = ()
+
+
+class Request(t.NamedTuple):
+    start: str
+    end: str
+    base: str
+    symbol: t.List[str]
+
+
+class Get(t.NamedTuple):
+    url: str
+
+
+Operation = t.Union[Call, Request, Get]
+Plan = t.Generator[Operation, t.Any, t.Any]
+
+
+def run(plan: Plan) -> t.Any:
+    """
+    Runs a plan in the calling thread
+    :param plan: Plan generator
+    :return: Result of the plan
+    """
+    result, error = None, None
+    while True:
+        try:
+            operation = plan.send(result) if error is None else plan.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            if isinstance(operation, Call):
+                result = operation.function(*operation.args)
+            elif isinstance(operation, Request):
+                result = exrates.request_rates(*operation)
+            else:
+                result = exrates.frankfurter_get_call(operation.url)
+        except Exception as ex:
+            error = ex
+
+
+def is_transient(ex: BaseException) -> bool:
+    """
+    Tells if a failed request may succeed if retried
+    aiohttp errors are only recognized once aiohttp is imported, as they can only be raised then
+    :param ex: Exception raised by the request
+    :return: True for connection errors, timeouts, responses cut short and 5xx or 429 responses
+    """
+    import requests
+    from exrates.client import RETRY_STATUSES
+    aiohttp = sys.modules.get('aiohttp')
+    if isinstance(ex, requests.exceptions.HTTPError):
+        status = ex.response.status_code if ex.response is not None else None
+    elif aiohttp is not None and isinstance(ex, aiohttp.ClientResponseError):
+        status = ex.status
+    else:
+        transient = (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError
+        )
+        if aiohttp is not None:
+            import asyncio
+            transient += (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+        return isinstance(ex, transient)
+    return status is not None and (status in RETRY_STATUSES or status >= 500)
+
+
+def chunk_plan(start: str, end: str, base: str, symbol: t.List[str]) -> Plan:
+    """
+    Plans the request of exchange rates on a period in a single call
+    Days without publication at the ends of the period are not requested
+    The call is retried up to HISTORY_CHUNK_RETRIES times if it fails with a transient error
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :return: Plan of a dict of dates to a dict of symbols and rates
+    """
+    calendar = exrates.get_calendar()
+    published = calendar.trim(start, end)
+    if published is None:
+        logger.debug(f"No publication from {start} to {end}")
+        return {}
+    start, end = published
+    data_url = exrates.history_url(start, end, base, symbol)
+    logger.debug(f"Formed URL is: {data_url}")
+    attempt = 0
+    while True:
+        try:
+            raw_data = yield Get(data_url)
+            with exrates.get_metrics().timer('transform'):
+                rates = exrates.parse_rates(raw_data, start, end)
+            calendar.observe(rates)
+            return rates
+        except Exception as ex:
+            if not is_transient(ex) or attempt >= exrates.HISTORY_CHUNK_RETRIES:
+                raise
+            attempt += 1
+            exrates.get_metrics().count('chunk_retries')
+            logger.warning(f"Retrying chunk {start} to {end} after error: {ex!r}")
+
+
+def rates_plan(
+        start: str,
+        end: str,
+        base: str,
+        symbol: t.List[str],
+        store: t.Optional['exrates.RateStore'] = None
+) -> Plan:
+    """
+    Plans the retrieval of exchange rates on a period
+    If a snapshot is configured, rates are only read from it.
+    If a rate store is available it is consulted first,
+    and only missing or stale days and symbols are requested to the API.
+    If CROSS_RATES is set, rates are derived from EUR based rates
+    :param start: Date of first day to get data (YYYY-MM-DD format)
+    :param end: Date of last day to get data (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param store: RateStore to use. Shared store by default
+    :return: Plan of a dict of dates to a dict of symbols and rates
+    """
+    snapshot = yield Call(exrates.get_snapshot)
+    if snapshot is not None:
+        return (yield Call(snapshot.rates, (start, end, base, symbol)))
+
+    if exrates.CROSS_RATES and base != ANCHOR_CURRENCY:
+        anchor_rates = yield from rates_plan(start, end, ANCHOR_CURRENCY, anchor_symbols(base, symbol), store)
+        with exrates.get_metrics().timer('transform'):
+            return {
+                date: derive_rates(rates, base, symbol)
+                for date, rates in anchor_rates.items()
+                if base in rates
+            }
+
+    store = (yield Call(exrates.get_rate_store)) if store is None else store
+    if store is None:
+        return (yield Request(start, end, base, symbol))
+
+    missing = yield Call(store.missing, (base, symbol, start, end))
+    if missing:
+        exrates.get_metrics().count('store_misses', len(missing))
+    else:
+        exrates.get_metrics().count('store_hits')
+    for run_start, run_end, run_symbols in missing:
+        logger.debug(f"Missing in store: {run_start} to {run_end} for {run_symbols}")
+        rates = yield Request(run_start, run_end, base, run_symbols)
+        if rates or exrates.get_calendar().trim(run_start, run_end) is None:
+            yield Call(store.put, (base, run_symbols, run_start, run_end, rates))
+        else:
+            # No rates on publication days is not trusted as days without publication
+            logger.info(f"No rates from {run_start} to {run_end}, not stored")
+    return (yield Call(store.get, (base, symbol, start, end)))
+
+
+def factor_plan(date: str, base: str, symbol: str, store: 'exrates.RateStore') -> Plan:
+    """
+    Plans the retrieval of the unrounded factor converting amounts on a given day through a rate store
+    EUR based rates are stored as published, so conversions are only rounded once.
+    As the Frankfurter API does, days without publication use the previous published rates
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :param store: RateStore to consult before the API
+    :return: Plan of the factor, as latest_factor returns it.
+            None if there is no publication on the lookback period
+    """
+    if base == symbol:
+        return 1.0
+    symbols = anchor_symbols(base, [symbol])
+    rates = yield from rates_plan(date, date, ANCHOR_CURRENCY, symbols, store)
+    if date not in rates:
+        rates = yield from rates_plan(exrates.lookback_start(date), date, ANCHOR_CURRENCY, symbols, store)
+    return exrates.latest_factor(rates, base, symbol)
+
+
+def cross_convert_plan(
+        date: str,
+        base: str,
+        symbol: str,
+        amount: float,
+        store: t.Optional['exrates.RateStore'] = None
+) -> Plan:
+    """
+    Plans the conversion of an amount of one currency to another on a given day, from EUR based rates
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :param amount: Amount to be converted
+    :param store: RateStore to consult before the API. None to request rates to the API
+    :return: Plan of the converted currency value
+    """
+    if store is not None:
+        factor = yield from factor_plan(date, base, symbol, store)
+        if factor is None:
+            raise ValueError(f"No exchange rate from {base} to {symbol} on {date}")
+        return exrates.round_significant(amount * factor)
+    symbols = anchor_symbols(base, [symbol])
+    date = exrates.get_calendar().previous_publication_day(date, exrates.CONVERT_LOOKBACK_DAYS) or date
+    data_url = exrates.history_url(date, date, ANCHOR_CURRENCY, symbols)
+    logger.debug(f"Formed URL is: {data_url}")
+    # As for conversions, the API sends the previous published rates for days without publication
+    anchor_rates = (yield Get(data_url)).get('rates', {})
+    anchor_rates = {anchor_symbol: rate for anchor_symbol, rate in anchor_rates.items() if rate is not None}
+    return derive_rates(anchor_rates, base, [symbol], amount)[symbol]
+
+
+def convert_plan(
+        date: str,
+        base: str,
+        symbol: str,
+        amount: float,
+        store: t.Optional['exrates.RateStore'] = None
+) -> Plan:
+    """
+    Plans the conversion of an amount of one currency to another on a given day
+    The snapshot is used if configured, then the rate store, then cross rates if CROSS_RATES is set,
+    and the conversion of the API otherwise
+    :param date: Date of conversion (YYYY-MM-DD format)
+    :param base: Original currency
+    :param symbol: Currency to convert to
+    :param amount: Amount to be converted
+    :param store: RateStore to consult before the API. Shared store by default
+    :return: Plan of the converted currency value
+    """
+    store = (yield Call(exrates.get_rate_store)) if store is None else store
+    snapshot = yield Call(exrates.get_snapshot)
+    if snapshot is not None:
+        conversion_value = yield Call(snapshot.convert, (date, base, symbol, amount))
+        if conversion_value is None:
+            raise ValueError(f"No exchange rate from {base} to {symbol} on {date} in snapshot {snapshot.path}")
+        return conversion_value
+    if exrates.CROSS_RATES and base != symbol:
+        return (yield from cross_convert_plan(date, base, symbol, amount, store))
+    if store is not None:
+        factor = yield from factor_plan(date, base, symbol, store)
+        if factor is not None:
+            # Rounded once, as the API does for conversions
+            return exrates.round_significant(amount * factor)
+
+    # The API sends the previous published rates for days without publication
+    date = exrates.get_calendar().previous_publication_day(date, exrates.CONVERT_LOOKBACK_DAYS) or date
+    data_url = exrates.convert_url(date, base, symbol, amount)
+    logger.debug(f"Formed URL is: {data_url}")
+    raw_data = yield Get(data_url)
+    return raw_data['rates'][symbol]
@@ -0,0 +1,180 @@
+import typing as t
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Rates for a day are published around 16 CET. Past that cutoff (with some margin)
+# an entry for the day can never change again
+PUBLICATION_CUTOFF_UTC = timedelta(hours=16)
+# Seconds an entry fetched before its publication cutoff is considered fresh
+DEFAULT_TODAY_TTL = 900.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rates (
+    date TEXT NOT NULL,
+    base TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    rate REAL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (date, base, symbol)
+) WITHOUT ROWID
+"""
+
+
+def date_range(start: str, end: str) -> t.Iterator[str]:
+    """
+    Iterates over every calendar day between two dates
+    :param start: First day (YYYY-MM-DD format). Inclusive
+    :param end: Last day (YYYY-MM-DD format). Inclusive
+    :return: Iterator of dates in YYYY-MM-DD format
+    """
+    day = datetime.strptime(start, '%Y-%m-%d')
+    last = datetime.strptime(end, '%Y-%m-%d')
+    while day <= last:
+        yield day.strftime('%Y-%m-%d')
+        day += timedelta(days=1)
+
+
+def is_final(date: str, fetched_at: float) -> bool:
+    """
+    Checks if an entry fetched at a given time can still change
+    :param date: Date of the entry (YYYY-MM-DD format)
+    :param fetched_at: Epoch timestamp of when the entry was retrieved
+    :return: True if the entry was retrieved after the publication cutoff of its date
+    """
+    cutoff = datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc) + PUBLICATION_CUTOFF_UTC
+    return fetched_at >= cutoff.timestamp()
+
+
+class RateStore:
+    """
+    SQLite backed store of exchange rates keyed by (date, base, symbol)
+
+    Every calendar day of a fetched range is recorded for each requested symbol.
+    Days without publication (weekends, holidays) are kept with a NULL rate
+    so that they are not requested again.
+    Entries retrieved after the publication cutoff of their day are immutable,
+    entries retrieved before it expire after `today_ttl` seconds
+    """
+
+    def __init__(self, path: str, today_ttl: float = DEFAULT_TODAY_TTL):
+        self.path = path
+        self.today_ttl = today_ttl
+        self._lock = threading.Lock()
+        # Imported on first use, as the CLI does not always need a store
+        import sqlite3
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _select(
+            self,
+            base: str,
+            symbols: t.List[str],
+            start: str,
+            end: str
+    ) -> t.List[t.Tuple[str, str, t.Optional[float], float]]:
+        placeholders = ','.join('?' * len(symbols))
+        with self._lock:
+            return self._connection.execute(
+                f"SELECT date, symbol, rate, fetched_at FROM rates"
+                f" WHERE base = ? AND date BETWEEN ? AND ? AND symbol IN ({placeholders})"
+                f" ORDER BY date, symbol",
+                [base, start, end, *symbols]
+            ).fetchall()
+
+    def missing(
+            self,
+            base: str,
+            symbols: t.List[str],
+            start: str,
+            end: str,
+            now: t.Optional[float] = None
+    ) -> t.List[t.Tuple[str, str, t.List[str]]]:
+        """
+        Plans the requests needed to complete a range in the store
+        :param base: Original currency
+        :param symbols: List of currencies to convert to
+        :param start: First day of the range (YYYY-MM-DD format)
+        :param end: Last day of the range (YYYY-MM-DD format)
+        :param now: Epoch timestamp used to check freshness. Current time by default
+        :return: List of (start, end, symbols) runs of consecutive days with missing or stale entries
+        """
+        now = time.time() if now is None else now
+        fresh = {
+            (date, symbol)
+            for date, symbol, _, fetched_at in self._select(base, symbols, start, end)
+            if is_final(date, fetched_at) or now - fetched_at < self.today_ttl
+        }
+        runs = []
+        previous_date = None
+        for date in date_range(start, end):
+            stale = [symbol for symbol in symbols if (date, symbol) not in fresh]
+            if stale and runs and runs[-1][1] == previous_date:
+                # Extend the current run of consecutive days
+                run_start, _, run_symbols = runs[-1]
+                runs[-1] = (run_start, date, sorted(set(run_symbols) | set(stale)))
+            elif stale:
+                runs.append((date, date, sorted(stale)))
+            previous_date = date
+        return runs
+
+    def get(
+            self,
+            base: str,
+            symbols: t.List[str],
+            start: str,
+            end: str
+    ) -> t.Dict[str, t.Dict[str, float]]:
+        """
+        Retrieves stored rates of a range
+        :param base: Original currency
+        :param symbols: List of currencies to convert to
+        :param start: First day of the range (YYYY-MM-DD format)
+        :param end: Last day of the range (YYYY-MM-DD format)
+        :return: Dict of dates to a dict of symbols and rates. Days without publication are omitted
+        """
+        rates = {}
+        for date, symbol, rate, _ in self._select(base, symbols, start, end):
+            if rate is not None:
+                rates.setdefault(date, {})[symbol] = rate
+        return rates
+
+    def put(
+            self,
+            base: str,
+            symbols: t.List[str],
+            start: str,
+            end: str,
+            rates: t.Dict[str, t.Dict[str, float]],
+            fetched_at: t.Optional[float] = None
+    ) -> None:
+        """
+        Records the result of a request for a range
+        Days and symbols of the range that are absent from rates are stored as not published
+        :param base: Original currency
+        :param symbols: List of requested currencies
+        :param start: First day of the range (YYYY-MM-DD format)
+        :param end: Last day of the range (YYYY-MM-DD format)
+        :param rates: Dict of dates to a dict of symbols and rates
+        :param fetched_at: Epoch timestamp of the request. Current time by default
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        entries = [
+            (date, base, symbol, rates.get(date, {}).get(symbol), fetched_at)
+            for date in date_range(start, end)
+            for symbol in symbols
+        ]
+        logger.debug(f"Storing {len(entries)} entries for {base} from {start} to {end}")
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO rates (date, base, symbol, rate, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                entries
+            )
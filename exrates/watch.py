@@ -0,0 +1,230 @@
+"""
+Watch mode, streaming rates as soon as they are published
+
+Rates are published on publication days around 16 CET, 14:00 or 15:00 UTC depending on
+daylight saving time. Polls are spread accordingly:
+    before the publication window of a day not yet published, wait for the window
+    within the window, poll every interval seconds
+    past the window, poll every slow_interval seconds until the day ends
+    once a day is published, or on days without publication, wait for the next window
+Every poll goes through the shared client, so its connection is kept alive and cached
+responses are revalidated. Only rows newer than the last known date of each symbol are output.
+Rows missing in the output file are appended to a copy of it at startup, which replaces it.
+The file is then owned by the watcher, and later polls append to it in place
+"""
+import typing as t
+import logging
+import sys
+import time
+from datetime import date as Date, datetime, time as Time, timedelta, timezone
+import requests
+import exrates
+from exrates.store import PUBLICATION_CUTOFF_UTC
+
+logger = logging.getLogger(__name__)
+
+# Publication window of each day, in UTC. It ends at the publication cutoff of the rate store
+PUBLICATION_WINDOW_START_UTC = Time(13, 55)
+PUBLICATION_WINDOW_END_UTC = (datetime.min + PUBLICATION_CUTOFF_UTC).time()
+# Seconds between polls within the publication window, and past it
+DEFAULT_INTERVAL = 60.0
+DEFAULT_SLOW_INTERVAL = 900.0
+# Longest single wait, so clock changes are noticed
+MAX_SLEEP = 3600.0
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def window(day: Date) -> t.Tuple[datetime, datetime]:
+    """
+    :param day: Publication day
+    :return: Start and end of its publication window, in UTC
+    """
+    return (
+        datetime.combine(day, PUBLICATION_WINDOW_START_UTC, tzinfo=timezone.utc),
+        datetime.combine(day, PUBLICATION_WINDOW_END_UTC, tzinfo=timezone.utc)
+    )
+
+
+def poll_delay(
+        now: datetime,
+        published: bool,
+        interval: float = DEFAULT_INTERVAL,
+        slow_interval: float = DEFAULT_SLOW_INTERVAL
+) -> float:
+    """
+    Computes seconds to wait before the next poll
+    :param now: Current time, timezone aware
+    :param published: If true, rates of the current day were already received
+    :param interval: Seconds between polls within the publication window
+    :param slow_interval: Seconds between polls past the publication window
+    :return: Seconds to wait, at most MAX_SLEEP
+    """
+    now = now.astimezone(timezone.utc)
+    calendar = exrates.get_calendar()
+    today = now.date()
+    if not published and calendar.is_publication_day(today.isoformat()):
+        start, end = window(today)
+        if now < start:
+            delay = (start - now).total_seconds()
+        elif now < end:
+            delay = interval
+        else:
+            delay = slow_interval
+    else:
+        day = today + timedelta(days=1)
+        while not calendar.is_publication_day(day.isoformat()):
+            day += timedelta(days=1)
+        delay = (window(day)[0] - now).total_seconds()
+    return max(0.0, min(delay, MAX_SLEEP))
+
+
+class Watcher:
+    """
+    Polls rates of a base currency and outputs newly published rows
+    """
+
+    def __init__(
+            self,
+            base: str,
+            symbol: t.List[str],
+            output: t.Optional[str] = None,
+            printable: bool = True,
+            output_format: str = 'jsonl',
+            interval: float = DEFAULT_INTERVAL,
+            slow_interval: float = DEFAULT_SLOW_INTERVAL,
+            clock: t.Callable[[], datetime] = utc_now,
+            sleep: t.Callable[[float], None] = time.sleep
+    ):
+        """
+        :param base: Original currency
+        :param symbol: List of currencies to convert to
+        :param output: Name of file to append new rows to, without extension. None by default
+        :param printable: If true, prints new rows to console. True by default
+        :param output_format: Format of the output file, one of the appendable WRITERS keys. jsonl by default
+        :param interval: Seconds between polls within the publication window
+        :param slow_interval: Seconds between polls past the publication window
+        :param clock: Function returning the current time, timezone aware
+        :param sleep: Function waiting a number of seconds
+        """
+        self.base = base
+        self.symbol = symbol
+        self.output = output
+        self.printable = printable
+        self.output_format = output_format
+        self.interval = interval
+        self.slow_interval = slow_interval
+        self.clock = clock
+        self.sleep = sleep
+        # Last date output, or known to be published, of each symbol
+        self.known_dates: t.Dict[str, str] = {}
+        self.rows = 0
+        # If true, new rows are appended to the output file in place, instead of a copy of it
+        self.in_place = False
+
+    def today(self) -> str:
+        return self.clock().astimezone(timezone.utc).date().isoformat()
+
+    def request(self, start: str, end: str, symbols: t.List[str]) -> t.Dict[str, t.Dict[str, float]]:
+        # The rate store is not consulted, it would keep answering that today is not published yet
+        return exrates.request_rates(start, end, self.base, symbols)
+
+    def prime(self) -> None:
+        """
+        Finds the last known date of each symbol, from the output file or the last publication
+        Rates already published are not output, except the ones missing in the output file
+        """
+        if self.output is not None:
+            from exrates.writers import last_dates
+            self.known_dates = last_dates(self.output, self.output_format, self.base, self.symbol)
+        unknown = [item for item in self.symbol if item not in self.known_dates]
+        if not unknown:
+            return
+        today = self.today()
+        start = exrates.lookback_start(today)
+        for item in unknown:
+            self.known_dates[item] = start
+        for date, rates in self.request(start, today, unknown).items():
+            for item in rates:
+                self.known_dates[item] = max(self.known_dates[item], date)
+        logger.debug(f"Watching rates newer than {self.known_dates}")
+
+    def published(self) -> bool:
+        return min(self.known_dates.values()) >= self.today()
+
+    def poll(self) -> int:
+        """
+        Requests the rates after the last known dates and outputs the new rows
+        :return: Number of new rows
+        """
+        today = self.today()
+        first_known = min(self.known_dates.values())
+        start = (Date.fromisoformat(first_known) + timedelta(days=1)).isoformat()
+        if start > today:
+            return 0
+        rows = [
+            row
+            for row in exrates.history_rows(self.request(start, today, self.symbol), self.base)
+            if row['date'] > self.known_dates[row['symbol']]
+        ]
+        if not rows:
+            return 0
+        with exrates.history_output(
+                self.output, self.printable, self.output_format, append=True, in_place=self.in_place
+        ) as write:
+            for row in rows:
+                write(row)
+                self.known_dates[row['symbol']] = max(self.known_dates[row['symbol']], row['date'])
+        if self.printable:
+            sys.stdout.flush()
+        logger.info(f"{len(rows)} new rows up to {max(row['date'] for row in rows)}")
+        self.rows += len(rows)
+        return len(rows)
+
+    def run(self, max_polls: t.Optional[int] = None) -> int:
+        """
+        Polls until interrupted, or a number of polls after the first one
+        :param max_polls: Number of polls. Unlimited by default
+        :return: Number of rows output
+        """
+        self.prime()
+        self.poll()
+        self.in_place = True
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            delay = poll_delay(self.clock(), self.published(), self.interval, self.slow_interval)
+            logger.debug(f"Next poll in {delay:.0f}s")
+            self.sleep(delay)
+            try:
+                self.poll()
+            except requests.exceptions.RequestException as ex:
+                # A failed poll is retried at the next one
+                logger.warning(f"Poll failed, retrying later: {ex}")
+            polls += 1
+        return self.rows
+
+
+def watch(
+        base: str,
+        symbol: t.List[str],
+        output: t.Optional[str] = None,
+        output_format: str = 'jsonl',
+        interval: float = DEFAULT_INTERVAL
+) -> int:
+    """
+    Outputs newly published rates until interrupted
+    :param base: Original currency
+    :param symbol: List of currencies to convert to
+    :param output: Name of file to append new rows to, without extension. None by default
+    :param output_format: Format of the output file, one of the appendable WRITERS keys. jsonl by default
+    :param interval: Seconds between polls within the publication window
+    :return: Number of rows output
+    """
+    watcher = Watcher(base, symbol, output, output_format=output_format, interval=interval)
+    try:
+        return watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopping watch")
+        return watcher.rows
@@ -0,0 +1,310 @@
+"""
+Output writers of history rows
+
+Every writer receives batches of rows, writes to a temporary file
+and replaces the target file when closed, so a failed run never leaves a partial file.
+Appendable formats can instead add rows to a copy of an existing file, which replaces it
+the same way, so the existing file is left unchanged if the run fails or is interrupted.
+Long running processes owning their file can append in place instead, without copying it:
+a failed append truncates the file back to its previous size.
+pyarrow is only imported when the parquet or arrow format is selected
+"""
+import typing as t
+import csv
+import gzip
+import logging
+import os
+import shutil
+from exrates import jsonlib
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('date', 'base', 'symbol', 'rate')
+# Rows buffered before each write
+BATCH_SIZE = 8192
+# Bytes read at once when reading a file backwards
+TAIL_BLOCK_SIZE = 65536
+
+
+def output_file_name(output: str, extension: str) -> str:
+    """
+    Builds the path of an output file
+    :param output: Name of file, without extension
+    :param extension: Extension of the file format
+    :return: Absolute path of the file
+    """
+    return os.path.abspath(f"{output}{extension}")
+
+
+class Writer:
+    """
+    Base writer of history rows to a file
+    """
+    # Extension appended to the output name
+    extension = ''
+    # If true, rows can be appended to an existing file
+    appendable = False
+    # If true, read_lines yields the last lines first
+    reads_backwards = True
+
+    def __init__(self, output: str, append: bool = False, in_place: bool = False):
+        if append and not self.appendable:
+            raise ValueError(f"Cannot append to {self.extension} files")
+        # Get path of given output file
+        self.file_name = output_file_name(output, self.extension)
+        base_dir = os.path.dirname(self.file_name)
+        if not os.path.isdir(base_dir):
+            raise OSError(f"Cannot write to file, path does not exist: {base_dir}")
+        self.append = append and os.path.isfile(self.file_name)
+        self.in_place = in_place and self.append
+        if self.in_place:
+            logger.debug(f"Appending in place to file: {self.file_name}")
+            self.temp_name = self.file_name
+            self.original_size = os.path.getsize(self.file_name)
+            self.open()
+            return
+        self.temp_name = f"{self.file_name}.{os.getpid()}.tmp"
+        if self.append:
+            logger.debug(f"Appending to file: {self.file_name}")
+            shutil.copy2(self.file_name, self.temp_name)
+        else:
+            logger.debug(f"Writing to file: {self.file_name}")
+        self.open()
+
+    def open(self) -> None:
+        raise NotImplementedError
+
+    def write_batch(self, rows: t.List[t.Dict]) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Flushes the file and moves it to its final path
+        """
+        self.finish()
+        if not self.in_place:
+            os.replace(self.temp_name, self.file_name)
+
+    def abort(self) -> None:
+        """
+        Discards the file, or the appended rows
+        """
+        try:
+            self.finish()
+        finally:
+            if self.in_place:
+                os.truncate(self.file_name, self.original_size)
+            else:
+                os.remove(self.temp_name)
+
+    @classmethod
+    def read_lines(cls, file_name: str) -> t.Iterator[str]:
+        """
+        Reads the lines of a file, from the last one to the first one
+        :param file_name: Path of the file
+        :return: Iterator of lines, without line ending
+        """
+        with open(file_name, 'rb') as infile:
+            position = infile.seek(0, os.SEEK_END)
+            remainder = b''
+            while position > 0:
+                size = min(TAIL_BLOCK_SIZE, position)
+                position -= size
+                infile.seek(position)
+                lines = (infile.read(size) + remainder).split(b'\n')
+                # First line might be incomplete
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    if line.strip():
+                        yield line.decode('utf-8')
+            if remainder.strip():
+                yield remainder.decode('utf-8')
+
+    @classmethod
+    def parse_line(cls, line: str) -> t.Optional[t.Dict]:
+        raise NotImplementedError
+
+
+class JsonlWriter(Writer):
+    extension = '.jsonl'
+    appendable = True
+
+    def open(self) -> None:
+        self.outfile = open(self.temp_name, 'ab' if self.append else 'wb')
+
+    @classmethod
+    def parse_line(cls, line: str) -> t.Optional[t.Dict]:
+        return jsonlib.loads(line)
+
+    def write_batch(self, rows: t.List[t.Dict]) -> None:
+        # A batch is encoded to a single buffer and written at once
+        self.outfile.write(jsonlib.dump_lines(rows))
+
+    def finish(self) -> None:
+        self.outfile.close()
+
+
+class GzipJsonlWriter(JsonlWriter):
+    extension = '.jsonl.gz'
+
+    def open(self) -> None:
+        # Appended rows are written as a new gzip member
+        self.outfile = gzip.open(self.temp_name, 'ab' if self.append else 'wb')
+
+    # Compressed files cannot be read backwards
+    reads_backwards = False
+
+    @classmethod
+    def read_lines(cls, file_name: str) -> t.Iterator[str]:
+        """
+        Reads the lines of a file in order, one at a time
+        :param file_name: Path of the file
+        :return: Iterator of lines, without line ending
+        """
+        with gzip.open(file_name, 'rt', encoding='utf-8') as infile:
+            for line in infile:
+                if line.strip():
+                    yield line.rstrip('\n')
+
+
+class CsvWriter(Writer):
+    extension = '.csv'
+    appendable = True
+
+    def open(self) -> None:
+        self.outfile = open(self.temp_name, 'a' if self.append else 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.outfile)
+        if not self.append:
+            self.writer.writerow(FIELDS)
+
+    @classmethod
+    def parse_line(cls, line: str) -> t.Optional[t.Dict]:
+        values = next(csv.reader([line]))
+        if values == list(FIELDS):
+            return None
+        return dict(zip(FIELDS, values))
+
+    def write_batch(self, rows: t.List[t.Dict]) -> None:
+        self.writer.writerows([[row[field] for field in FIELDS] for row in rows])
+
+    def finish(self) -> None:
+        self.outfile.close()
+
+
+def import_pyarrow() -> t.Any:
+    try:
+        import pyarrow
+    except ImportError as ex:
+        raise ImportError('pyarrow is required for parquet and arrow formats: pip install "exrates[arrow]"') from ex
+    return pyarrow
+
+
+class ArrowWriter(Writer):
+    """
+    Arrow IPC file writer. Each batch is a record batch
+    """
+    extension = '.arrow'
+
+    def open(self) -> None:
+        self.pa = import_pyarrow()
+        self.schema = self.pa.schema([
+            ('date', self.pa.string()),
+            ('base', self.pa.string()),
+            ('symbol', self.pa.string()),
+            ('rate', self.pa.float64())
+        ])
+        self.writer = self.new_writer()
+
+    def new_writer(self) -> t.Any:
+        import pyarrow.ipc
+        return pyarrow.ipc.new_file(self.temp_name, self.schema)
+
+    def record_batch(self, rows: t.List[t.Dict]) -> t.Any:
+        return self.pa.RecordBatch.from_arrays(
+            [self.pa.array([row[field] for row in rows], type=column.type) for field, column in zip(FIELDS, self.schema)],
+            schema=self.schema
+        )
+
+    def write_batch(self, rows: t.List[t.Dict]) -> None:
+        self.writer.write_batch(self.record_batch(rows))
+
+    def finish(self) -> None:
+        self.writer.close()
+
+
+class ParquetWriter(ArrowWriter):
+    """
+    Parquet file writer. Each batch is a row group
+    """
+    extension = '.parquet'
+
+    def new_writer(self) -> t.Any:
+        import pyarrow.parquet
+        return pyarrow.parquet.ParquetWriter(self.temp_name, self.schema)
+
+    def write_batch(self, rows: t.List[t.Dict]) -> None:
+        self.writer.write_table(self.pa.Table.from_batches([self.record_batch(rows)]))
+
+
+WRITERS: t.Dict[str, t.Type[Writer]] = {
+    'jsonl': JsonlWriter,
+    'jsonl.gz': GzipJsonlWriter,
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowWriter
+}
+
+
+def writer_class(output_format: str) -> t.Type[Writer]:
+    try:
+        return WRITERS[output_format]
+    except KeyError:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+
+def get_writer(output: str, output_format: str = 'jsonl', append: bool = False, in_place: bool = False) -> Writer:
+    """
+    Opens a writer of history rows
+    :param output: Name of file to write to, without extension
+    :param output_format: One of WRITERS keys. jsonl by default
+    :param append: If true, rows are appended to the file if it exists
+    :param in_place: If true, rows are appended to the file itself instead of a copy of it
+    :return: Writer
+    """
+    return writer_class(output_format)(output, append, in_place)
+
+
+def last_dates(
+        output: str,
+        output_format: str,
+        base: str,
+        symbols: t.List[str]
+) -> t.Dict[str, str]:
+    """
+    Finds the last date written for each symbol of a base currency in an output file
+    Rows are written in date order, so files are read backwards until every symbol
+    is found. Compressed files are read in order, keeping the last date of each symbol
+    :param output: Name of file, without extension
+    :param output_format: One of WRITERS keys, appendable
+    :param base: Original currency
+    :param symbols: List of currencies to look for
+    :return: Dict of symbols and last date (YYYY-MM-DD format). Symbols not in the file are omitted
+    """
+    cls = writer_class(output_format)
+    if not cls.appendable:
+        raise ValueError(f"Cannot append to {cls.extension} files")
+    file_name = output_file_name(output, cls.extension)
+    found = {}
+    if not os.path.isfile(file_name):
+        return found
+    for line in cls.read_lines(file_name):
+        row = cls.parse_line(line)
+        if row is None or row['base'] != base or row['symbol'] not in symbols:
+            continue
+        found[row['symbol']] = max(found.get(row['symbol'], row['date']), row['date'])
+        if cls.reads_backwards and len(found) == len(set(symbols)):
+            break
+    return found
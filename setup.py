@@ -11,6 +11,18 @@ setup(
     extras_require={
         "dev": [
             "pytest"
+        ],
+        "async": [
+            "aiohttp>=3.8"
+        ],
+        "numpy": [
+            "numpy"
+        ],
+        "arrow": [
+            "pyarrow"
+        ],
+        "orjson": [
+            "orjson"
         ]
     },
     entry_points="""
@@ -1,5 +1,9 @@
 import pytest
+import json
+import threading
+import time
 from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 
 def get_date_days_away(days: int):
@@ -91,4 +95,83 @@ def convert_wrong_symbols():
     return [
         "convert --base ZZZ --symbol EUR --amount 50",
         "convert --symbol ZZZ --amount 50"
-    ]
\ No newline at end of file
+    ]
+
+
+@pytest.fixture(autouse=True, scope="session")
+def currencies_cache(tmp_path_factory):
+    # Keep the supported currencies cache out of the user's home
+    import exrates
+    exrates.CURRENCIES_CACHE_PATH = str(tmp_path_factory.mktemp("cache") / "currencies.json")
+    return exrates.CURRENCIES_CACHE_PATH
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.paths.append(self.path)
+        server.conditional.append(self.headers.get('If-None-Match'))
+        if server.delay:
+            time.sleep(server.delay)
+        if server.etag is not None and self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.send_header("ETag", server.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if server.failures > 0:
+            server.failures -= 1
+            status, body = 503, b'{"message": "unavailable"}'
+        elif self.path in server.statuses:
+            status, body = server.statuses[self.path], b'{"message": "error"}'
+        elif self.path in server.routes:
+            status, body = 200, json.dumps(server.routes[self.path]).encode()
+        elif self.path == "/currencies":
+            status, body = 200, json.dumps({'EUR': 'Euro', 'USD': 'United States Dollar'}).encode()
+        else:
+            status, body = 200, json.dumps({'base': 'USD', 'date': '2021-02-02', 'rates': {'EUR': 0.83029}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if server.etag is not None:
+            self.send_header("ETag", server.etag)
+        if server.cache_control is not None:
+            self.send_header("Cache-Control", server.cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients cancelling requests close connections abruptly
+        pass
+
+
+@pytest.fixture()
+def stub_server():
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.paths = []
+    server.failures = 0
+    server.delay = 0
+    # If-None-Match header of each request
+    server.conditional = []
+    # Validator and Cache-Control header of responses, if any
+    server.etag = None
+    server.cache_control = None
+    # Responses by path, a default response is sent for any other path
+    server.routes = {}
+    # Error statuses by path
+    server.statuses = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
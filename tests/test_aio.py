@@ -0,0 +1,180 @@
+import pytest
+import asyncio
+import threading
+from unittest import mock
+from conftest import *
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from exrates import aio
+from exrates.httpcache import HttpCache
+
+
+@pytest.fixture()
+def base_url(stub_server):
+    host, port = stub_server.server_address
+    return f"http://{host}:{port}"
+
+
+@pytest.fixture()
+def range_routes(stub_server):
+    stub_server.routes = {
+        "/2021-02-01..2021-02-02?from=USD&to=EUR": {
+            'base': 'USD',
+            'start_date': '2021-02-01',
+            'end_date': '2021-02-02',
+            'rates': {'2021-02-01': {'EUR': 0.82754}, '2021-02-02': {'EUR': 0.83029}}
+        },
+        "/2021-02-03..2021-02-04?from=USD&to=EUR": {
+            'base': 'USD',
+            'start_date': '2021-02-03',
+            'end_date': '2021-02-04',
+            'rates': {'2021-02-03': {'EUR': 0.83195}, '2021-02-04': {'EUR': 0.83507}}
+        },
+        "/2021-02-02?from=USD&to=EUR&amount=50.0": {
+            'base': 'USD',
+            'date': '2021-02-02',
+            'rates': {'EUR': 41.514}
+        }
+    }
+    return stub_server.routes
+
+
+def test_async_history(base_url, range_routes):
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url) as client:
+            return await aio.exrates_history('2021-02-01', '2021-02-04', 'USD', ['EUR'], client=client)
+
+    with mock.patch("exrates.HISTORY_CHUNK_DAYS", 2):
+        data = asyncio.run(run())
+    assert [(line['date'], line['rate']) for line in data] == [
+        ('2021-02-01', 0.82754),
+        ('2021-02-02', 0.83029),
+        ('2021-02-03', 0.83195),
+        ('2021-02-04', 0.83507)
+    ]
+
+
+def test_async_convert(base_url, range_routes):
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url) as client:
+            return await aio.exrates_convert('2021-02-02', 'USD', 'EUR', 50.0, client=client)
+
+    assert asyncio.run(run()) == 41.514
+
+
+def test_async_concurrency_limit(stub_server, base_url):
+    stub_server.delay = 0.05
+
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url, max_concurrency=2) as client:
+            peak = 0
+
+            async def watch():
+                nonlocal peak
+                while True:
+                    peak = max(peak, client.stats()['in_flight'])
+                    await asyncio.sleep(0.005)
+
+            watcher = asyncio.ensure_future(watch())
+            await asyncio.gather(*(aio.frankfurter_get_call(f"latest?to=EUR&n={n}", client) for n in range(6)))
+            watcher.cancel()
+            return peak, client.stats()
+
+    peak, stats = asyncio.run(run())
+    assert peak == 2
+    assert stats['requests'] == 6
+
+
+def test_async_retries(stub_server, base_url):
+    stub_server.failures = 2
+
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url, backoff_factor=0) as client:
+            return await aio.frankfurter_get_call("latest", client), client.stats()
+
+    data, stats = asyncio.run(run())
+    assert data['rates'] == {'EUR': 0.83029}
+    assert stats['retries'] == 2
+
+
+def test_async_cancellation(stub_server, base_url):
+    stub_server.delay = 0.5
+
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url) as client:
+            task = asyncio.ensure_future(aio.exrates_history('2021-02-01', '2021-02-04', 'USD', ['EUR'], client=client))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return client.stats()
+
+    assert asyncio.run(run())['in_flight'] == 0
+
+
+def test_async_client_errors_not_retried(stub_server, base_url):
+    stub_server.statuses = {"/2021-02-01..2021-02-02?from=USD&to=XXX": 404}
+
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url, backoff_factor=0) as client:
+            with pytest.raises(aiohttp.ClientResponseError):
+                await aio.request_chunk('2021-02-01', '2021-02-02', 'USD', ['XXX'], client)
+            return client.stats()
+
+    stats = asyncio.run(run())
+    assert stats['requests'] == 1
+    assert stats['retries'] == 0
+
+
+def test_async_revalidates_cached_responses(stub_server, base_url):
+    stub_server.etag = '"v1"'
+
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url, cache=HttpCache()) as client:
+            first = await aio.frankfurter_get_call("latest", client)
+            second = await aio.frankfurter_get_call("latest", client)
+            return first, second, client.stats()
+
+    first, second, stats = asyncio.run(run())
+    assert first == second
+    assert stub_server.conditional == [None, '"v1"']
+    assert stats['revalidated'] == 1
+
+
+def test_async_reads_snapshot(stub_server, base_url):
+    snapshot = mock.Mock()
+    snapshot.rates.return_value = {'2021-02-01': {'EUR': 0.82754}}
+
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url) as client:
+            return await aio.exrates_history('2021-02-01', '2021-02-01', 'USD', ['EUR'], client=client)
+
+    with mock.patch("exrates.get_snapshot", return_value=snapshot):
+        data = asyncio.run(run())
+    assert data == [{'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82754}]
+    assert stub_server.paths == []
+
+
+def test_async_store_calls_run_in_threads(base_url, range_routes, tmp_path):
+    from exrates.store import RateStore
+    store = RateStore(str(tmp_path / "rates.sqlite"))
+    threads = set()
+    missing, get = store.missing, store.get
+
+    def record(function):
+        def wrapper(*args, **kwargs):
+            threads.add(threading.get_ident())
+            return function(*args, **kwargs)
+        return wrapper
+
+    store.missing, store.get = record(missing), record(get)
+
+    async def run():
+        async with aio.AsyncFrankfurterClient(base_url) as client:
+            rows = await aio.exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR'], store=store, client=client)
+            return rows, threading.get_ident()
+
+    rows, loop_thread = asyncio.run(run())
+    assert [row['rate'] for row in rows] == [0.82754, 0.83029]
+    assert threads and loop_thread not in threads
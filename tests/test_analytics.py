@@ -0,0 +1,98 @@
+import pytest
+import math
+import sys
+from unittest import mock
+from conftest import *
+from exrates.analytics import RateSeries, exrates_analytics, pairwise_correlation, rolling
+from exrates.store import RateStore
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture()
+def rates():
+    return {
+        '2021-02-01': {'CAD': 1.25, 'EUR': 0.8},
+        '2021-02-02': {'CAD': 1.3, 'EUR': 0.84},
+        '2021-02-03': {'CAD': 1.2, 'EUR': 0.82},
+        '2021-02-04': {'EUR': 0.83},
+    }
+
+
+def test_series_from_rates(rates):
+    series = RateSeries.from_rates(rates, 'USD', ['CAD', 'EUR'])
+    assert series.dates == list(rates)
+    assert series.rates.shape == (4, 2)
+    assert math.isnan(series.rates[3, 0])
+    assert series.rates[1, 1] == 0.84
+
+
+def test_log_returns_and_drawdown(rates):
+    series = RateSeries.from_rates(rates, 'USD', ['CAD', 'EUR'])
+    returns = series.log_returns()
+    assert np.isnan(returns[0]).all()
+    assert returns[1, 0] == pytest.approx(math.log(1.3 / 1.25))
+    assert np.isnan(returns[3, 0])
+
+    drawdown = series.drawdown()
+    assert drawdown[1, 1] == 0
+    assert drawdown[2, 0] == pytest.approx(1.2 / 1.3 - 1)
+    assert drawdown[3, 1] == pytest.approx(0.83 / 0.84 - 1)
+
+
+def test_rolling():
+    values = np.array([[1.0], [2.0], [4.0], [8.0]])
+    assert np.isnan(rolling(values, 2, 'mean')[0, 0])
+    assert rolling(values, 2, 'mean')[1:, 0].tolist() == [1.5, 3.0, 6.0]
+    assert rolling(values, 3, 'std')[3, 0] == pytest.approx(np.std([2.0, 4.0, 8.0], ddof=1))
+    assert np.isnan(rolling(values, 5, 'mean')).all()
+    with pytest.raises(ValueError):
+        rolling(values, 0, 'mean')
+
+
+def test_pairwise_correlation():
+    values = np.array([
+        [1.0, 2.0, -1.0],
+        [2.0, 4.0, np.nan],
+        [3.0, 6.5, -3.0],
+        [4.0, np.nan, -4.0],
+    ])
+    result = pairwise_correlation(values)
+    for i in range(3):
+        for j in range(3):
+            # Same as numpy over the rows both columns have
+            both = ~np.isnan(values[:, i]) & ~np.isnan(values[:, j])
+            expected = np.corrcoef(values[both, i], values[both, j])[0, 1]
+            assert result[i, j] == pytest.approx(expected)
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_analytics_reads_the_store(frankfurter_get_call, rates, tmp_path, capsys):
+    frankfurter_get_call.return_value = {
+        'amount': 1.0, 'base': 'USD', 'start_date': '2021-02-01', 'end_date': '2021-02-04', 'rates': rates
+    }
+    store = RateStore(str(tmp_path / "rates.sqlite"))
+    rows = exrates_analytics('2021-02-01', '2021-02-04', 'USD', ['CAD', 'EUR'], window=2, store=store)
+    again = exrates_analytics('2021-02-01', '2021-02-04', 'USD', ['CAD', 'EUR'], window=2, store=store)
+
+    frankfurter_get_call.assert_called_once()
+    assert rows == again
+    assert len(rows) == 7
+    assert rows[0] == {
+        'date': '2021-02-01', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.25,
+        'log_return': None, 'rolling_mean': None, 'rolling_std': None, 'drawdown': 0.0
+    }
+    assert rows[2]['rolling_mean'] == pytest.approx(1.275)
+    assert '"symbol": "EUR"' in capsys.readouterr().out
+
+    correlations = exrates_analytics(
+        '2021-02-01', '2021-02-04', 'USD', ['CAD', 'EUR'], correlation=True, printable=False, store=store
+    )
+    store.close()
+    assert [(row['symbol'], row['other']) for row in correlations] == [('CAD', 'EUR')]
+
+
+def test_analytics_without_numpy(rates):
+    with mock.patch.dict(sys.modules, {'numpy': None}):
+        with pytest.raises(ImportError, match="exrates\\[numpy\\]"):
+            RateSeries.from_rates(rates, 'USD', ['CAD'])
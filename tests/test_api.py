@@ -6,25 +6,38 @@ import requests
 import typing as t
 from unittest import mock
 from conftest import *
-from exrates import frankfurter_get_call
+from exrates import frankfurter_get_call, set_client, FRANKFURTER_API_BASE_URL
+from exrates.client import FrankfurterClient
+
+
+@pytest.fixture(autouse=True)
+def client():
+    # Retries without waiting between attempts
+    frankfurter_client = FrankfurterClient(FRANKFURTER_API_BASE_URL, backoff_factor=0)
+    set_client(frankfurter_client)
+    yield frankfurter_client
+    set_client(None)
 
 
 @pytest.fixture()
 def get_ok_response():
     mock_response = mock.Mock()
+    mock_response.url = "latest"
     mock_response.status_code = 200
     mock_response.raise_for_status.return_value = None
-    mock_response.json.return_value = {'test': 'test'}
+    mock_response.content = b'{"test": "test"}'
     return mock_response
 
 
 @pytest.fixture()
 def get_bad_responses():
     mock_response_not_found = mock.Mock()
+    mock_response_not_found.url = "latest"
     mock_response_not_found.status_code = 404
     mock_response_not_found.raise_for_status.side_effect = requests.exceptions.HTTPError
 
     mock_response_server_error = mock.Mock()
+    mock_response_server_error.url = "latest"
     mock_response_server_error.status_code = 500
     mock_response_server_error.raise_for_status.side_effect = requests.exceptions.HTTPError
 
@@ -37,6 +50,7 @@ def get_bad_responses():
 @pytest.fixture()
 def get_chunked_encoding():
     mock_response = mock.Mock()
+    mock_response.url = "latest"
     mock_response.raise_for_status.side_effect = requests.exceptions.ChunkedEncodingError
     return mock_response
 
@@ -76,17 +90,17 @@ def frankfurter_full_requests():
     ]
 
 
-@mock.patch("requests.get")
+@mock.patch("requests.Session.get")
 def test_ok_status(
         request,
         get_ok_response
 ):
     request.return_value = get_ok_response
     response = frankfurter_get_call(get_ok_response.url)
-    assert response == get_ok_response.json()
+    assert response == {'test': 'test'}
 
 
-@mock.patch("requests.get")
+@mock.patch("requests.Session.get")
 def test_wrong_status(
         request,
         get_bad_responses
@@ -97,7 +111,7 @@ def test_wrong_status(
             frankfurter_get_call(response.url)
 
 
-@mock.patch("requests.get")
+@mock.patch("requests.Session.get")
 def test_chunked_encoding_error(
         request,
         get_chunked_encoding
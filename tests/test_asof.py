@@ -0,0 +1,84 @@
+import pytest
+from unittest import mock
+from conftest import *
+from exrates.asof import AsOfIndex
+
+
+@pytest.fixture()
+def frankfurter_response():
+    return {
+        'base': 'EUR', 'start_date': '2021-01-29', 'end_date': '2021-02-05',
+        'rates': {
+            '2021-01-29': {'CAD': 1.5508, 'USD': 1.2136},
+            '2021-02-01': {'CAD': 1.5474, 'USD': 1.2084},
+            '2021-02-05': {'CAD': 1.5309, 'USD': 1.1983},
+        }
+    }
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_as_of(
+        frankfurter_get_call,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    index = AsOfIndex(['CAD', 'USD'], lookback_days=3)
+    index.load('2021-02-01', '2021-02-09')
+
+    assert len(index) == 3
+    assert index.as_of('2021-01-28') is None
+    assert index.as_of('2021-01-31') == '2021-01-29'
+    assert index.as_of('2021-02-01') == '2021-02-01'
+    assert index.as_of('2021-02-04') == '2021-02-01'
+    assert index.as_of('2021-02-08') == '2021-02-05'
+    # Beyond the lookback days
+    assert index.as_of('2021-02-09') is None
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_rate(
+        frankfurter_get_call,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    index = AsOfIndex(['CAD', 'USD'])
+    index.load('2021-02-01', '2021-02-07')
+
+    assert index.rate('2021-02-06', 'EUR', 'USD') == ('2021-02-05', 1.1983)
+    assert index.rate('2021-02-06', 'USD', 'EUR') == ('2021-02-05', 0.83452)
+    assert index.rate('2021-02-02', 'USD', 'CAD') == ('2021-02-01', 1.2805)
+    assert index.rate('2021-02-02', 'CAD', 'CAD') == ('2021-02-01', 1.0)
+    with pytest.raises(ValueError):
+        index.rate('2021-02-02', 'USD', 'ZZZ')
+    with pytest.raises(ValueError):
+        index.rate('2020-01-01', 'USD', 'CAD')
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_load_requests_only_new_days(
+        frankfurter_get_call,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    index = AsOfIndex(['CAD', 'USD'], lookback_days=0)
+    index.load('2021-02-01', '2021-02-03')
+    index.load('2021-02-02', '2021-02-03')
+    assert frankfurter_get_call.call_count == 1
+    index.load('2021-01-29', '2021-02-05')
+    assert [call.args[0].split('?')[0] for call in frankfurter_get_call.call_args_list[1:]] == [
+        '2021-01-29', '2021-02-04..2021-02-05'
+    ]
+    assert index.as_of('2021-01-29') == '2021-01-29'
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_factor_is_not_rounded(
+        frankfurter_get_call,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    index = AsOfIndex(['CAD', 'USD'])
+    index.load('2021-02-01', '2021-02-01')
+
+    assert index.factor('2021-02-01', 'USD', 'CAD') == ('2021-02-01', 1.5474 / 1.2084)
+    assert index.rate('2021-02-01', 'USD', 'CAD') == ('2021-02-01', 1.2805)
@@ -0,0 +1,162 @@
+import pytest
+import io
+import json
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from conftest import *
+from exrates.batch import plan_ranges, read_jobs, run_batch, valid_job
+
+RATES = {
+    'USD': {
+        '2021-02-01': {'CAD': 1.2805, 'EUR': 0.82754},
+        '2021-02-02': {'CAD': 1.2805, 'EUR': 0.83029},
+        '2021-02-03': {'CAD': 1.2817, 'EUR': 0.83292},
+        '2021-02-04': {'CAD': 1.2838, 'EUR': 0.83724},
+        '2021-02-05': {'CAD': 1.2761, 'EUR': 0.83452},
+    },
+    'EUR': {
+        '2021-02-01': {'USD': 1.2084},
+        '2021-02-02': {'USD': 1.2044},
+        '2021-02-03': {'USD': 1.2006},
+        '2021-02-04': {'USD': 1.1944},
+        '2021-02-05': {'USD': 1.1983},
+    },
+}
+
+
+def frankfurter_response(url):
+    path = urlsplit(url)
+    start, _, end = path.path.partition('..')
+    end = end or start
+    query = parse_qs(path.query)
+    base, symbols = query['from'][0], query['to'][0].split(',')
+    return {
+        'base': base, 'start_date': start, 'end_date': end,
+        'rates': {
+            date: {symbol: rate for symbol, rate in rates.items() if symbol in symbols}
+            for date, rates in RATES[base].items()
+            if start <= date <= end
+        }
+    }
+
+
+@pytest.fixture()
+def jobs_file(tmp_path):
+    jobs = [
+        {'id': 'week', 'command': 'history', 'start': '2021-02-01', 'end': '2021-02-05', 'symbol': ['EUR']},
+        {'id': 'cad', 'command': 'history', 'start': '2021-02-03', 'end': '2021-02-04', 'symbol': 'CAD',
+         'format': 'csv'},
+        {'id': 'weekend', 'command': 'convert', 'date': '2021-02-06', 'symbol': 'EUR', 'amount': 50},
+        {'id': 'eur', 'command': 'convert', 'date': '2021-02-02', 'base': 'EUR', 'symbol': 'USD', 'amount': 10},
+    ]
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('\n'.join(json.dumps(job) for job in jobs) + '\n')
+    return path
+
+
+def test_plan_ranges(jobs_file):
+    ranges = plan_ranges(read_jobs(str(jobs_file)))
+    assert [(start, end, base, symbols, [job['id'] for job in jobs])
+            for start, end, base, symbols, jobs in ranges] == [
+        ('2021-02-01', '2021-02-05', 'USD', ['EUR', 'CAD'], ['week', 'cad']),
+        # Convert jobs use EUR based rates
+        ('2021-01-23', '2021-02-06', 'EUR', ['USD'], ['eur', 'weekend']),
+    ]
+
+
+def test_plan_ranges_keeps_disjoint_ranges():
+    jobs = [
+        valid_job({'command': 'history', 'start': '2021-02-01', 'end': '2021-02-02', 'symbol': 'EUR'}, 1),
+        valid_job({'command': 'history', 'start': '2021-03-01', 'end': '2021-03-02', 'symbol': 'EUR'}, 2),
+    ]
+    assert [(start, end) for start, end, *_ in plan_ranges(jobs)] == [
+        ('2021-02-01', '2021-02-02'), ('2021-03-01', '2021-03-02')
+    ]
+
+
+@pytest.mark.parametrize("spec", [
+    [],
+    {'command': 'unknown'},
+    {'command': 'history', 'start': '2021-02-01', 'end': '2021-02-05'},
+    {'command': 'history', 'start': '2021-02-05', 'end': '2021-02-01', 'symbol': 'EUR'},
+    {'command': 'history', 'symbol': 'EUR', 'format': 'xml'},
+    {'command': 'history', 'symbol': 'EUR', 'base': ['USD', 'CAD']},
+    {'command': 'convert', 'date': '2021-02-01', 'symbol': 'EUR'},
+    {'id': '../escape', 'command': 'convert', 'symbol': 'EUR', 'amount': 1},
+])
+def test_invalid_jobs(spec):
+    with pytest.raises(ValueError):
+        valid_job(spec, 1)
+
+
+def test_duplicate_job_ids(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text(
+        '{"id": "q1", "command": "history", "start": "2021-02-01", "end": "2021-02-02", "symbol": "EUR"}\n'
+        '\n'
+        '{"command": "convert", "date": "2021-02-02", "symbol": "EUR", "amount": 10}\n'
+        '{"id": "q1", "command": "history", "start": "2021-02-03", "end": "2021-02-04", "symbol": "CAD"}\n'
+    )
+    with pytest.raises(ValueError, match="Duplicate job id q1 on lines 1 and 4"):
+        read_jobs(str(path))
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_run_batch(
+        frankfurter_get_call,
+        jobs_file,
+        tmp_path
+):
+    frankfurter_get_call.side_effect = frankfurter_response
+    summary = io.StringIO()
+    counts = run_batch(str(jobs_file), str(tmp_path / "out"), workers=0, summary=summary)
+
+    assert counts == {'jobs': 4, 'failed': 0}
+    # A request per merged range
+    assert frankfurter_get_call.call_count == 2
+    results = {row['id']: row for row in map(json.loads, summary.getvalue().splitlines())}
+    assert results['weekend']['value'] == 41.726
+    assert results['eur']['value'] == 12.044
+    assert results['week']['rows'] == 5
+    with open(results['week']['output']) as infile:
+        assert [json.loads(line)['rate'] for line in infile] == [0.82754, 0.83029, 0.83292, 0.83724, 0.83452]
+    with open(tmp_path / "out" / "cad.csv") as infile:
+        assert infile.read().splitlines()[1:] == ['2021-02-03,USD,CAD,1.2817', '2021-02-04,USD,CAD,1.2838']
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_run_batch_in_process_pool(
+        frankfurter_get_call,
+        jobs_file,
+        tmp_path
+):
+    frankfurter_get_call.side_effect = frankfurter_response
+    summary = io.StringIO()
+    assert run_batch(str(jobs_file), str(tmp_path), workers=2, summary=summary) == {'jobs': 4, 'failed': 0}
+    assert {row['id'] for row in map(json.loads, summary.getvalue().splitlines())} == {'week', 'cad', 'weekend', 'eur'}
+    assert (tmp_path / "week.jsonl").exists()
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_run_batch_failed_jobs(
+        frankfurter_get_call,
+        tmp_path
+):
+    def fail_usd(url):
+        if 'from=USD' in url:
+            raise ValueError("Unexpected response")
+        return frankfurter_response(url)
+
+    frankfurter_get_call.side_effect = fail_usd
+    path = tmp_path / "jobs.jsonl"
+    path.write_text(
+        '{"id": "usd", "command": "history", "start": "2021-02-01", "end": "2021-02-02", "symbol": "EUR"}\n'
+        '{"id": "empty", "command": "convert", "date": "2021-01-04", "symbol": "EUR", "amount": 10}\n'
+        '{"id": "eur", "command": "convert", "date": "2021-02-02", "symbol": "EUR", "amount": 10}\n'
+    )
+    summary = io.StringIO()
+    assert run_batch(str(path), str(tmp_path), workers=0, summary=summary) == {'jobs': 3, 'failed': 2}
+    results = {row['id']: row for row in map(json.loads, summary.getvalue().splitlines())}
+    assert 'error' in results['usd']
+    assert 'error' in results['empty']
+    assert results['eur']['value'] == 8.3029
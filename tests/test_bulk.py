@@ -0,0 +1,155 @@
+import pytest
+import csv
+import json
+from unittest import mock
+from conftest import *
+from exrates.bulk import convert_batch, convert_rows, row_date
+
+
+@pytest.fixture()
+def frankfurter_response():
+    return {
+        'base': 'EUR', 'start_date': '2021-01-29', 'end_date': '2021-02-05',
+        'rates': {
+            '2021-01-29': {'CAD': 1.5508, 'USD': 1.2136},
+            '2021-02-01': {'CAD': 1.5474, 'USD': 1.2084},
+            '2021-02-02': {'CAD': 1.5422, 'USD': 1.2044},
+            '2021-02-05': {'CAD': 1.5309, 'USD': 1.1983},
+        }
+    }
+
+
+@pytest.fixture(autouse=True)
+def currencies():
+    with mock.patch("exrates.cached_currencies", return_value={'CAD': "", 'EUR': "", 'USD': ""}):
+        yield
+
+
+@pytest.fixture()
+def input_rows():
+    return [
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'amount': 50.0},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'amount': 50.0},
+        {'date': '2021-02-01', 'base': 'EUR', 'symbol': 'USD', 'amount': 10.0},
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'CAD', 'amount': 2.5},
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'USD', 'amount': 3.0},
+    ]
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_convert_rows(
+        frankfurter_get_call,
+        frankfurter_response,
+        input_rows
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    rows = list(convert_rows(input_rows, block_size=2))
+
+    assert [row['value'] for row in rows] == [41.377, 41.514, 12.084, 3.2013, 3.0]
+    assert [row['rate_date'] for row in rows] == ['2021-02-01', '2021-02-02', '2021-02-01', '2021-02-01', '2021-02-01']
+    # Rates of every base are loaded at once, days already loaded are not requested again
+    frankfurter_get_call.assert_called_once()
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_convert_rows_on_days_without_publication(
+        frankfurter_get_call,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    rows = list(convert_rows([
+        {'date': '2021-02-03T09:30:00Z', 'base': 'USD', 'symbol': 'EUR', 'amount': 50.0},
+        {'date': '2021-02-06 23:59:59', 'base': 'USD', 'symbol': 'CAD', 'amount': 1.0},
+        {'date': '2021-01-31', 'base': 'EUR', 'symbol': 'USD', 'amount': 1.0},
+    ]))
+
+    assert [row['rate_date'] for row in rows] == ['2021-02-02', '2021-02-05', '2021-01-29']
+    assert [row['value'] for row in rows] == [41.514, 1.2776, 1.2136]
+    frankfurter_get_call.assert_called_once()
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_convert_rows_unknown_symbol(
+        frankfurter_get_call,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    with pytest.raises(ValueError):
+        list(convert_rows([{'date': '2021-02-01', 'base': 'USD', 'symbol': 'ZZZ', 'amount': 1}]))
+
+
+def test_convert_rows_invalid_date():
+    with pytest.raises(ValueError):
+        list(convert_rows([{'date': '01/02/2021', 'base': 'USD', 'symbol': 'EUR', 'amount': 1}]))
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_convert_batch_files(
+        frankfurter_get_call,
+        frankfurter_response,
+        input_rows,
+        tmp_path
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    input_path = tmp_path / "ledger.csv"
+    with open(input_path, 'w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=['date', 'base', 'symbol', 'amount'])
+        writer.writeheader()
+        writer.writerows(input_rows)
+
+    assert convert_batch(str(input_path), str(tmp_path / "converted.csv")) == 5
+    with open(tmp_path / "converted.csv", newline='') as infile:
+        assert [row['value'] for row in csv.DictReader(infile)] == ['41.377', '41.514', '12.084', '3.2013', '3.0']
+
+    assert convert_batch(str(input_path), str(tmp_path / "converted.jsonl"), output_format='jsonl') == 5
+    with open(tmp_path / "converted.jsonl") as infile:
+        assert [json.loads(line)['value'] for line in infile] == [41.377, 41.514, 12.084, 3.2013, 3.0]
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_convert_batch_invalid_row(
+        frankfurter_get_call,
+        frankfurter_response,
+        input_rows,
+        tmp_path
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    input_path = tmp_path / "ledger.jsonl"
+    with open(input_path, 'w') as outfile:
+        for row in input_rows[:2]:
+            outfile.write(json.dumps(row) + '\n')
+        outfile.write('\n{"date": "2021-02-01", "base": "USD", "symbol": "EUR", "amount": "ten"}\n{"date": \n')
+        outfile.write(json.dumps(input_rows[2]) + '\n')
+    output_path = tmp_path / "converted.jsonl"
+
+    with pytest.raises(ValueError, match="line 5"):
+        convert_batch(str(input_path), str(output_path))
+    # No partial output file is left
+    assert list(tmp_path.iterdir()) == [input_path]
+
+    assert convert_batch(str(input_path), str(output_path), skip_invalid=True) == 3
+    with open(output_path) as infile:
+        assert [json.loads(line)['value'] for line in infile] == [41.377, 41.514, 12.084]
+    assert sorted(tmp_path.iterdir()) == [output_path, input_path]
+
+
+def test_convert_rows_invalid_row_line_number():
+    with pytest.raises(ValueError, match="line 2"):
+        list(convert_rows([{'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'amount': 1}, {'date': '2021-02-01'}]))
+
+
+@pytest.mark.parametrize("value, date", [
+    ('2021-02-06', '2021-02-06'),
+    ('2021-02-06 23:59:59', '2021-02-06'),
+    ('2021-02-06T23:30:00Z', '2021-02-06'),
+    ('2021-02-06T23:30:00-05:00', '2021-02-07'),
+    ('2021-02-07T00:30:00+01:00', '2021-02-06'),
+])
+def test_row_date(value, date):
+    assert row_date(value) == date
+
+
+@pytest.mark.parametrize("value", ['2021-02-06junk', '2021-02-06T25:00:00', '01/02/2021', ''])
+def test_row_date_invalid(value):
+    with pytest.raises(ValueError):
+        row_date(value)
@@ -0,0 +1,59 @@
+import pytest
+from datetime import date as Date
+from unittest import mock
+from conftest import *
+from exrates import exrates_convert, exrates_history, set_calendar
+from exrates.business_days import PublicationCalendar, closing_days, easter_sunday
+
+
+@pytest.fixture()
+def calendar():
+    publication_calendar = PublicationCalendar()
+    set_calendar(publication_calendar)
+    yield publication_calendar
+    set_calendar(None)
+
+
+@pytest.mark.parametrize('year,expected', [
+    (2000, Date(2000, 4, 23)),
+    (2019, Date(2019, 4, 21)),
+    (2021, Date(2021, 4, 4)),
+    (2038, Date(2038, 4, 25)),
+])
+def test_easter_sunday(year, expected):
+    assert easter_sunday(year) == expected
+
+
+def test_closing_days():
+    # Weekend holidays are omitted: 2021-05-01 is a Saturday, 2021-12-25 and 2021-12-26 a weekend
+    assert closing_days(2021) == {Date(2021, 1, 1), Date(2021, 4, 2), Date(2021, 4, 5)}
+    assert closing_days(2019) == {
+        Date(2019, 1, 1), Date(2019, 4, 19), Date(2019, 4, 22), Date(2019, 5, 1), Date(2019, 12, 25), Date(2019, 12, 26)
+    }
+    # Only New Year's Day and Christmas Day before TARGET closing days
+    assert closing_days(2000) == {Date(2000, 12, 25)}
+
+
+def test_publication_days(calendar):
+    assert calendar.publication_days('2021-04-01', '2021-04-07') == ['2021-04-01', '2021-04-06', '2021-04-07']
+    assert calendar.trim('2021-04-02', '2021-04-10') == ('2021-04-06', '2021-04-09')
+    assert calendar.trim('2021-04-02', '2021-04-05') is None
+    assert calendar.previous_publication_day('2021-04-05', 10) == '2021-04-01'
+    assert calendar.previous_publication_day('2021-04-05', 2) is None
+
+
+def test_observed_publications(calendar):
+    assert not calendar.is_publication_day('2021-05-01')
+    # Observed rates are trusted over the rules
+    calendar.observe(['2021-04-30', '2021-05-01'])
+    assert calendar.is_publication_day('2021-05-01')
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_days_without_publication_not_requested(frankfurter_get_call, calendar):
+    assert exrates_history('2021-04-02', '2021-04-05', 'USD', ['EUR'], printable=False) == []
+    frankfurter_get_call.assert_not_called()
+
+    frankfurter_get_call.return_value = {'amount': 50.0, 'base': 'USD', 'date': '2021-04-01', 'rates': {'EUR': 42.537}}
+    assert exrates_convert('2021-04-05', 'USD', 'EUR', 50.0, printable=False) == 42.537
+    frankfurter_get_call.assert_called_once_with("2021-04-01?from=USD&to=EUR&amount=50.0")
@@ -0,0 +1,59 @@
+import pytest
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from conftest import *
+from exrates import frankfurter_get_call, supported_currencies, set_client
+from exrates.client import FrankfurterClient
+
+
+@pytest.fixture()
+def client(stub_server):
+    host, port = stub_server.server_address
+    frankfurter_client = FrankfurterClient(f"http://{host}:{port}", backoff_factor=0, max_retries=2)
+    set_client(frankfurter_client)
+    yield frankfurter_client
+    set_client(None)
+    frankfurter_client.close()
+
+
+def test_connections_are_reused(stub_server, client):
+    assert supported_currencies() == {'EUR': 'Euro', 'USD': 'United States Dollar'}
+    for _ in range(3):
+        assert frankfurter_get_call("2021-02-02?from=USD&to=EUR")['rates'] == {'EUR': 0.83029}
+
+    stats = client.stats()
+    assert stats['requests'] == 4
+    assert stats['retries'] == 0
+    assert stats['pool']['connections_opened'] == 1
+    assert stats['pool']['idle_connections'] == 1
+
+
+def test_transient_errors_are_retried(stub_server, client):
+    stub_server.failures = 2
+    assert frankfurter_get_call("2021-02-02?from=USD&to=EUR")['rates'] == {'EUR': 0.83029}
+    assert len(stub_server.paths) == 3
+    assert client.stats()['retries'] == 2
+
+
+def test_retries_are_bounded(stub_server, client):
+    stub_server.failures = 5
+    with pytest.raises(requests.exceptions.HTTPError):
+        frankfurter_get_call("2021-02-02?from=USD&to=EUR")
+    assert len(stub_server.paths) == 3
+
+
+def test_backoff_is_bounded():
+    frankfurter_client = FrankfurterClient("http://localhost", backoff_factor=1, backoff_max=4)
+    for attempt in range(10):
+        assert 0 <= frankfurter_client.backoff(attempt) <= 4
+
+
+def test_concurrent_calls_share_a_request(stub_server, client):
+    stub_server.delay = 0.1
+    urls = ["2021-02-02?from=USD&to=EUR", "2021-02-02?to=EUR&from=USD"] * 4
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        responses = list(executor.map(frankfurter_get_call, urls))
+
+    assert all(response['rates'] == {'EUR': 0.83029} for response in responses)
+    assert len(stub_server.paths) == 1
+    assert client.stats()['deduplicated'] == len(urls) - 1
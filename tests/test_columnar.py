@@ -0,0 +1,62 @@
+import pytest
+import sys
+from unittest import mock
+from conftest import *
+from exrates import exrates_history, exrates_history_table
+from exrates.columnar import HistoryTable, to_day_number, from_day_number
+
+
+@pytest.fixture()
+def frankfurter_response():
+    return {
+        'amount': 1.0,
+        'base': 'USD',
+        'start_date': '2021-02-01',
+        'end_date': '2021-02-02',
+        'rates':
+            {
+                '2021-02-01': {'CAD': 1.2805, 'EUR': 0.82754},
+                '2021-02-02': {'CAD': 1.2805, 'EUR': 0.83029}
+            }
+    }
+
+
+def test_day_numbers():
+    assert to_day_number('1970-01-01') == 0
+    assert from_day_number(to_day_number('2021-02-01')) == '2021-02-01'
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_table_iterates_as_rows(
+        frankfurter_get_call,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    rows = exrates_history('2021-02-01', '2021-02-02', 'USD', ['CAD', 'EUR'], printable=False)
+    table = exrates_history_table('2021-02-01', '2021-02-02', 'USD', ['CAD', 'EUR'])
+
+    assert len(table) == 4
+    assert list(table) == rows
+    assert list(HistoryTable.from_rows(rows)) == rows
+    assert table.nbytes == 4 * (4 + 2 + 2 + 8)
+
+
+def test_table_to_numpy(frankfurter_response):
+    np = pytest.importorskip("numpy")
+    table = HistoryTable.from_rates(frankfurter_response['rates'].items(), 'USD')
+    arrays = table.to_numpy()
+
+    assert arrays['rate'].dtype == np.float64
+    assert list(arrays['rate']) == [1.2805, 0.82754, 1.2805, 0.83029]
+    assert str(arrays['date'].astype('datetime64[D]')[-1]) == '2021-02-02'
+    assert [table.currencies[code] for code in arrays['symbol']] == ['CAD', 'EUR', 'CAD', 'EUR']
+    # Arrays share memory with the table
+    arrays['rate'][0] = 1.0
+    assert table.rates[0] == 1.0
+
+
+def test_table_without_numpy():
+    table = HistoryTable()
+    with mock.patch.dict(sys.modules, {'numpy': None}):
+        with pytest.raises(ImportError):
+            table.to_numpy()
@@ -0,0 +1,106 @@
+import pytest
+from unittest import mock
+from conftest import *
+from exrates import exrates_history, exrates_convert
+from exrates.cross import derive_rates, anchor_symbols, CROSS_RATE_TOLERANCE
+from exrates.store import RateStore
+
+
+@pytest.fixture()
+def eur_response():
+    return {
+        'amount': 1.0,
+        'base': 'EUR',
+        'start_date': '2021-02-01',
+        'end_date': '2021-02-02',
+        'rates':
+            {
+                '2021-02-01': {'CAD': 1.5474, 'USD': 1.2084},
+                '2021-02-02': {'CAD': 1.5422, 'USD': 1.2044}
+            }
+    }
+
+
+@pytest.fixture()
+def usd_rows():
+    # As returned by the API for USD base
+    return [
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2805},
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82754},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2805},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029}
+    ]
+
+
+def test_derive_rates():
+    assert anchor_symbols('USD', ['EUR', 'CAD']) == ['CAD', 'USD']
+    assert derive_rates({'CAD': 1.5474, 'USD': 1.2084}, 'USD', ['EUR', 'CAD']) == {'CAD': 1.2805, 'EUR': 0.82754}
+    assert derive_rates({'CAD': 1.5474, 'USD': 1.2084}, 'EUR', ['CAD']) == {'CAD': 1.5474}
+    assert derive_rates({'CAD': 1.5474}, 'USD', ['CAD']) == {}
+    converted = derive_rates({'USD': 1.2044}, 'USD', ['EUR'], 50.0)['EUR']
+    assert abs(converted - 41.514) / 41.514 <= CROSS_RATE_TOLERANCE
+
+
+@mock.patch("exrates.CROSS_RATES", True)
+@mock.patch("exrates.frankfurter_get_call")
+def test_history_from_eur_rates(
+        frankfurter_get_call,
+        eur_response,
+        usd_rows
+):
+    frankfurter_get_call.return_value = eur_response
+    data = exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR', 'CAD'], printable=False)
+
+    frankfurter_get_call.assert_called_once_with("2021-02-01..2021-02-02?from=EUR&to=CAD,USD")
+    assert data == usd_rows
+
+
+@mock.patch("exrates.CROSS_RATES", True)
+@mock.patch("exrates.frankfurter_get_call")
+def test_bases_share_stored_eur_rates(
+        frankfurter_get_call,
+        eur_response,
+        tmp_path
+):
+    frankfurter_get_call.return_value = eur_response
+    store = RateStore(str(tmp_path / "rates.sqlite"))
+    exrates_history('2021-02-01', '2021-02-02', 'USD', ['CAD'], printable=False, store=store)
+    exrates_history('2021-02-01', '2021-02-02', 'CAD', ['USD'], printable=False, store=store)
+    conversion = exrates_convert('2021-02-02', 'USD', 'EUR', 50.0, printable=False, store=store)
+
+    frankfurter_get_call.assert_called_once()
+    assert conversion == 41.514
+    store.close()
+
+
+@mock.patch("exrates.CROSS_RATES", True)
+@mock.patch("exrates.frankfurter_get_call")
+def test_convert_from_eur_rates(frankfurter_get_call):
+    frankfurter_get_call.return_value = {'amount': 1.0, 'base': 'EUR', 'date': '2021-02-02', 'rates': {'USD': 1.2044}}
+    conversion = exrates_convert('2021-02-02', 'USD', 'EUR', 50.0, printable=False)
+
+    frankfurter_get_call.assert_called_once_with("2021-02-02?from=EUR&to=USD")
+    assert conversion == 41.514
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_history_of_several_bases(
+        frankfurter_get_call,
+        eur_response,
+        usd_rows
+):
+    frankfurter_get_call.return_value = eur_response
+    data = exrates_history('2021-02-01', '2021-02-02', ['USD', 'EUR'], ['EUR', 'CAD'], printable=False)
+
+    # A single request of EUR based rates serves every base
+    frankfurter_get_call.assert_called_once_with("2021-02-01..2021-02-02?from=EUR&to=CAD,USD")
+    eur_rows = [
+        {'date': '2021-02-01', 'base': 'EUR', 'symbol': 'CAD', 'rate': 1.5474},
+        {'date': '2021-02-02', 'base': 'EUR', 'symbol': 'CAD', 'rate': 1.5422}
+    ]
+    assert data == [*usd_rows[:2], eur_rows[0], *usd_rows[2:], eur_rows[1]]
+
+
+def test_several_bases_are_not_incremental():
+    with pytest.raises(ValueError):
+        exrates_history('2021-02-01', '2021-02-02', ['USD', 'EUR'], ['CAD'], output="rates", incremental=True)
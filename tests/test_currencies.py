@@ -0,0 +1,84 @@
+import pytest
+import json
+import time
+import requests
+from unittest import mock
+from conftest import *
+from exrates import cached_currencies, parse_args, write_currencies_cache, \
+    FALLBACK_CURRENCIES, CURRENCIES_CHECK_INTERVAL
+
+
+@pytest.fixture()
+def cache_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "currencies.json")
+    monkeypatch.setattr("exrates.CURRENCIES_CACHE_PATH", path)
+    return path
+
+
+@pytest.fixture()
+def api_currencies():
+    return {'EUR': 'Euro', 'USD': 'United States Dollar', 'XYZ': 'New Currency'}
+
+
+@mock.patch("exrates.supported_currencies")
+def test_fresh_cache_does_not_call_api(
+        supported_currencies,
+        cache_path,
+        api_currencies
+):
+    write_currencies_cache(api_currencies)
+    assert cached_currencies() == api_currencies
+    supported_currencies.assert_not_called()
+
+
+@mock.patch("exrates.supported_currencies")
+def test_stale_cache_is_refreshed(
+        supported_currencies,
+        cache_path,
+        api_currencies
+):
+    supported_currencies.return_value = api_currencies
+    write_currencies_cache({'EUR': 'Euro'}, fetched_at=0)
+    assert cached_currencies() == api_currencies
+    with open(cache_path, 'r') as infile:
+        assert json.load(infile)['currencies'] == api_currencies
+
+
+@mock.patch("exrates.supported_currencies")
+def test_unreachable_api_uses_fallback(
+        supported_currencies,
+        cache_path
+):
+    supported_currencies.side_effect = requests.exceptions.ConnectionError
+    assert cached_currencies() == FALLBACK_CURRENCIES
+    # Failed attempts are not repeated right away
+    assert cached_currencies(refresh=True) == FALLBACK_CURRENCIES
+    supported_currencies.assert_called_once()
+
+
+@mock.patch("exrates.supported_currencies")
+def test_unknown_symbol_refreshes_cache(
+        supported_currencies,
+        cache_path,
+        api_currencies
+):
+    supported_currencies.return_value = api_currencies
+    write_currencies_cache(FALLBACK_CURRENCIES, fetched_at=time.time() - CURRENCIES_CHECK_INTERVAL)
+
+    parse_args("convert --symbol EUR --amount 50".split())
+    supported_currencies.assert_not_called()
+
+    args = parse_args("convert --symbol XYZ --amount 50".split())
+    supported_currencies.assert_called_once()
+    assert args.symbol == 'XYZ'
+
+
+@pytest.mark.parametrize("fetched", [{}, {'message': 'error'}, {'EUR': 1}, ['EUR']])
+@mock.patch("exrates.supported_currencies")
+def test_invalid_currency_list_not_cached(
+        supported_currencies,
+        fetched,
+        cache_path
+):
+    supported_currencies.return_value = fetched
+    assert cached_currencies(refresh=True) == FALLBACK_CURRENCIES
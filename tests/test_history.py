@@ -2,9 +2,10 @@ import pytest
 import os
 import json
 import shutil
+import requests
 from unittest import mock
 from conftest import *
-from exrates import exrates_history
+from exrates import exrates_history, iter_history, stream_history
 
 @pytest.fixture()
 def input_data():
@@ -169,3 +170,127 @@ def test_exrates_history_file_write_wrong_path(
             data['symbol'],
             output=file_path
         )
+
+
+@pytest.fixture()
+def daily_rates():
+    return {
+        '2021-01-29': {'CAD': 1.2795, 'EUR': 0.82481},
+        '2021-02-01': {'CAD': 1.2805, 'EUR': 0.82754},
+        '2021-02-02': {'CAD': 1.2805, 'EUR': 0.83029},
+        '2021-02-03': {'CAD': 1.2826, 'EUR': 0.83195},
+        '2021-02-04': {'CAD': 1.2814, 'EUR': 0.83507}
+    }
+
+
+def range_response(daily_rates):
+    # Answers any URL as the Frankfurter API would
+    def response(url):
+        dates, _ = url.split('?')
+        start, _, end = dates.partition('..')
+        if not end:
+            published = [date for date in daily_rates if date <= start]
+            return {'base': 'USD', 'date': published[-1], 'rates': daily_rates[published[-1]]}
+        return {
+            'base': 'USD',
+            'start_date': start,
+            'end_date': end,
+            'rates': {date: rates for date, rates in daily_rates.items() if start <= date <= end}
+        }
+    return response
+
+
+@mock.patch("exrates.HISTORY_CHUNK_DAYS", 2)
+@mock.patch("exrates.frankfurter_get_call")
+def test_exrates_history_chunks(
+        frankfurter_get_call,
+        daily_rates
+):
+    frankfurter_get_call.side_effect = range_response(daily_rates)
+    data = exrates_history('2021-01-29', '2021-02-04', 'USD', ['CAD', 'EUR'], printable=False)
+
+    urls = sorted(call.args[0] for call in frankfurter_get_call.call_args_list)
+    # Weekend days at the ends of chunks are not requested
+    assert urls == [
+        "2021-01-29?from=USD&to=CAD,EUR",
+        "2021-02-01?from=USD&to=CAD,EUR",
+        "2021-02-02..2021-02-03?from=USD&to=CAD,EUR",
+        "2021-02-04?from=USD&to=CAD,EUR",
+    ]
+    assert data == [
+        {'date': date, 'base': 'USD', 'symbol': symbol, 'rate': rate}
+        for date, rates in daily_rates.items()
+        for symbol, rate in rates.items()
+    ]
+
+
+@mock.patch("exrates.HISTORY_CHUNK_DAYS", 3)
+@mock.patch("exrates.frankfurter_get_call")
+def test_exrates_history_chunk_retries(
+        frankfurter_get_call,
+        daily_rates
+):
+    response = range_response(daily_rates)
+    failures = []
+
+    def failing_response(url):
+        if url.startswith("2021-02-01") and not failures:
+            failures.append(url)
+            raise requests.exceptions.ConnectionError
+        return response(url)
+
+    frankfurter_get_call.side_effect = failing_response
+    data = exrates_history('2021-01-29', '2021-02-04', 'USD', ['CAD', 'EUR'], printable=False)
+
+    assert frankfurter_get_call.call_count == 4
+    assert [line['date'] for line in data] == [date for date in daily_rates for _ in range(2)]
+
+
+@pytest.mark.parametrize('status,calls', [(404, 1), (503, 3)])
+@mock.patch("exrates.frankfurter_get_call")
+def test_exrates_history_chunk_retries_transient_errors_only(
+        frankfurter_get_call,
+        status,
+        calls
+):
+    response = requests.Response()
+    response.status_code = status
+    frankfurter_get_call.side_effect = requests.exceptions.HTTPError(response=response)
+    with pytest.raises(requests.exceptions.HTTPError):
+        exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR'], printable=False)
+
+    assert frankfurter_get_call.call_count == calls
+
+
+@mock.patch("exrates.HISTORY_MAX_WORKERS", 1)
+@mock.patch("exrates.HISTORY_CHUNK_DAYS", 1)
+@mock.patch("exrates.frankfurter_get_call")
+def test_iter_history_is_lazy(
+        frankfurter_get_call,
+        daily_rates
+):
+    frankfurter_get_call.side_effect = range_response(daily_rates)
+    rows = iter_history('2021-01-29', '2021-02-04', 'USD', ['CAD', 'EUR'])
+
+    assert next(rows) == {'date': '2021-01-29', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2795}
+    assert frankfurter_get_call.call_count <= 2
+    rows.close()
+
+
+@mock.patch("exrates.HISTORY_CHUNK_DAYS", 2)
+@mock.patch("exrates.frankfurter_get_call")
+def test_stream_history_matches_exrates_history(
+        frankfurter_get_call,
+        daily_rates,
+        tmp_path,
+        capsys
+):
+    frankfurter_get_call.side_effect = range_response(daily_rates)
+    data = exrates_history('2021-01-29', '2021-02-04', 'USD', ['CAD', 'EUR'], output=str(tmp_path / "list"))
+    listed = capsys.readouterr().out
+    count = stream_history('2021-01-29', '2021-02-04', 'USD', ['CAD', 'EUR'], output=str(tmp_path / "stream"))
+    streamed = capsys.readouterr().out
+
+    assert count == len(data) == 10
+    assert streamed == listed
+    assert (tmp_path / "stream.jsonl").read_text() == (tmp_path / "list.jsonl").read_text() == listed
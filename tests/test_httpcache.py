@@ -0,0 +1,140 @@
+import pytest
+import json
+from conftest import *
+import exrates
+from exrates import cached_currencies, frankfurter_get_call, set_client, supported_currencies
+from exrates.client import FrankfurterClient
+from exrates.httpcache import CachedResponse, HttpCache, expiration, parse_cache_control
+
+URL = "2021-02-02?from=USD&to=EUR"
+
+
+@pytest.fixture()
+def client(stub_server):
+    host, port = stub_server.server_address
+    frankfurter_client = FrankfurterClient(f"http://{host}:{port}", backoff_factor=0, cache=HttpCache())
+    set_client(frankfurter_client)
+    yield frankfurter_client
+    set_client(None)
+    frankfurter_client.close()
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('public, max-age=300, no-transform') == {
+        'public': None, 'max-age': '300', 'no-transform': None
+    }
+    assert parse_cache_control('') == {}
+
+
+def test_expiration():
+    assert expiration({'Cache-Control': 'max-age=300'}, 1000.0) == 1300.0
+    assert expiration({'Cache-Control': 'max-age=300', 'Age': '100'}, 1000.0) == 1200.0
+    assert expiration({'Cache-Control': 'no-cache, max-age=300'}, 1000.0) == 1000.0
+    assert expiration({'Cache-Control': 'no-store'}, 1000.0) is None
+    assert expiration({
+        'Date': 'Tue, 02 Feb 2021 15:00:00 GMT', 'Expires': 'Tue, 02 Feb 2021 15:01:00 GMT'
+    }, 1000.0) == 1060.0
+    assert expiration({}, 1000.0) == 1000.0
+
+
+def test_only_reusable_responses_are_kept():
+    assert CachedResponse.from_response({}, b'{}', 1000.0) is None
+    assert CachedResponse.from_response({'ETag': '"a"', 'Cache-Control': 'no-store'}, b'{}', 1000.0) is None
+    assert CachedResponse.from_response({'ETag': '"a"'}, b'{}', 1000.0).validators() == {'If-None-Match': '"a"'}
+    assert CachedResponse.from_response({'Cache-Control': 'max-age=60'}, b'{}', 1000.0).is_fresh(1059.0)
+
+
+def test_cache_is_bounded(tmp_path):
+    cache = HttpCache(str(tmp_path / "http.sqlite"), max_entries=2)
+    for number in range(3):
+        cache.put(f"url{number}", CachedResponse(b'{}', etag=f'"{number}"'), now=number)
+    assert cache.get("url0") is None
+    assert cache.get("url2").etag == '"2"'
+    assert len(cache) == 2
+    cache.close()
+
+
+def test_cache_is_bounded_by_bytes():
+    cache = HttpCache(max_bytes=10)
+    for number in range(3):
+        cache.put(f"url{number}", CachedResponse(b'{"a": 1}', etag=f'"{number}"'), now=number)
+    assert cache.get("url1") is None
+    assert cache.get("url2").etag == '"2"'
+    assert len(cache) == 1
+    # Responses larger than the bound are not kept
+    cache.put("url3", CachedResponse(b'0' * 11, etag='"3"'), now=3)
+    assert cache.get("url3") is None
+    assert len(cache) == 1
+    cache.close()
+
+
+def test_fresh_responses_are_reused(stub_server, client):
+    stub_server.cache_control = "max-age=300"
+    for _ in range(3):
+        assert frankfurter_get_call(URL)['rates'] == {'EUR': 0.83029}
+    assert len(stub_server.paths) == 1
+    assert client.stats()['cache_hits'] == 2
+
+
+def test_stale_responses_are_revalidated(stub_server, client):
+    stub_server.etag = '"v1"'
+    stub_server.cache_control = "no-cache"
+    metrics = exrates.get_metrics()
+    metrics.reset()
+    for _ in range(3):
+        assert frankfurter_get_call(URL)['rates'] == {'EUR': 0.83029}
+
+    assert stub_server.conditional == [None, '"v1"', '"v1"']
+    assert client.stats()['revalidated'] == 2
+    counters = metrics.stats()['counters']
+    assert counters['requests'] == 3
+    assert counters['http_revalidations'] == 2
+    # Only the first response has a body
+    assert counters['bytes_received'] == len(json.dumps({'base': 'USD', 'date': '2021-02-02', 'rates': {'EUR': 0.83029}}))
+
+
+def test_changed_responses_replace_cached_ones(stub_server, client):
+    stub_server.etag = '"v1"'
+    frankfurter_get_call(URL)
+    stub_server.etag = '"v2"'
+    stub_server.routes[f"/{URL}"] = {'base': 'USD', 'date': '2021-02-02', 'rates': {'EUR': 0.8}}
+    assert frankfurter_get_call(URL)['rates'] == {'EUR': 0.8}
+    assert frankfurter_get_call(URL)['rates'] == {'EUR': 0.8}
+    assert stub_server.conditional == [None, '"v1"', '"v2"']
+
+
+def test_validators_persist_across_clients(stub_server, tmp_path):
+    stub_server.etag = '"v1"'
+    host, port = stub_server.server_address
+    for _ in range(2):
+        frankfurter_client = FrankfurterClient(f"http://{host}:{port}", cache=HttpCache(str(tmp_path / "http.sqlite")))
+        set_client(frankfurter_client)
+        try:
+            assert supported_currencies() == {'EUR': 'Euro', 'USD': 'United States Dollar'}
+        finally:
+            set_client(None)
+            frankfurter_client.close()
+    assert stub_server.conditional == [None, '"v1"']
+
+
+def test_not_modified_currencies_refresh_cache(stub_server, client, tmp_path):
+    stub_server.etag = '"v1"'
+    path = str(tmp_path / "currencies.json")
+    assert cached_currencies(refresh=True, path=path) == {'EUR': 'Euro', 'USD': 'United States Dollar'}
+    _, fetched_at, _ = exrates.read_currencies_cache(path)
+    exrates.write_currencies_cache({'EUR': 'Euro', 'USD': 'United States Dollar'}, path, fetched_at=0, checked_at=0)
+
+    assert cached_currencies(path=path) == {'EUR': 'Euro', 'USD': 'United States Dollar'}
+    assert stub_server.conditional == [None, '"v1"']
+    assert exrates.read_currencies_cache(path)[1] >= fetched_at
+
+
+def test_error_response_keeps_currencies_cache(stub_server, client, tmp_path):
+    stub_server.statuses = {"/currencies": 404}
+    path = str(tmp_path / "currencies.json")
+    exrates.write_currencies_cache({'EUR': 'Euro', 'USD': 'United States Dollar'}, path, fetched_at=0, checked_at=0)
+
+    assert cached_currencies(refresh=True, path=path) == {'EUR': 'Euro', 'USD': 'United States Dollar'}
+    currencies, fetched_at, _ = exrates.read_currencies_cache(path)
+    assert currencies == {'EUR': 'Euro', 'USD': 'United States Dollar'}
+    assert fetched_at == 0
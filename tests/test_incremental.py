@@ -0,0 +1,186 @@
+import pytest
+import csv
+import gzip
+import json
+from unittest import mock
+from conftest import *
+from exrates import exrates_history
+from exrates.writers import get_writer, last_dates
+
+
+@pytest.fixture()
+def daily_rates():
+    return {
+        '2021-02-01': {'CAD': 1.2805, 'EUR': 0.82754},
+        '2021-02-02': {'CAD': 1.2805, 'EUR': 0.83029},
+        '2021-02-03': {'CAD': 1.2826, 'EUR': 0.83195},
+        '2021-02-04': {'CAD': 1.2814, 'EUR': 0.83507}
+    }
+
+
+@pytest.fixture()
+def frankfurter_response(daily_rates):
+    def response(url):
+        dates, query = url.split('?')
+        symbols = query.split('&to=')[1].split(',')
+        start, _, end = dates.partition('..')
+        end = end or start
+        return {
+            'base': 'USD',
+            'start_date': start,
+            'end_date': end,
+            'rates': {
+                date: {symbol: rate for symbol, rate in rates.items() if symbol in symbols}
+                for date, rates in daily_rates.items()
+                if start <= date <= end
+            }
+        }
+    return response
+
+
+@pytest.mark.parametrize("output_format", ['jsonl', 'jsonl.gz', 'csv'])
+@mock.patch("exrates.frankfurter_get_call")
+def test_incremental_appends_new_rows(
+        frankfurter_get_call,
+        output_format,
+        frankfurter_response,
+        tmp_path
+):
+    frankfurter_get_call.side_effect = frankfurter_response
+    output = str(tmp_path / "rates")
+    exrates_history('2021-02-01', '2021-02-02', 'USD', ['CAD', 'EUR'], output=output,
+                    printable=False, output_format=output_format, incremental=True)
+    assert last_dates(output, output_format, 'USD', ['CAD', 'EUR']) == {'CAD': '2021-02-02', 'EUR': '2021-02-02'}
+
+    frankfurter_get_call.reset_mock()
+    new_rows = exrates_history('2021-02-01', '2021-02-04', 'USD', ['CAD', 'EUR'], output=output,
+                               printable=False, output_format=output_format, incremental=True)
+
+    frankfurter_get_call.assert_called_once_with("2021-02-03..2021-02-04?from=USD&to=CAD,EUR")
+    assert [line['date'] for line in new_rows] == ['2021-02-03'] * 2 + ['2021-02-04'] * 2
+    assert last_dates(output, output_format, 'USD', ['CAD', 'EUR']) == {'CAD': '2021-02-04', 'EUR': '2021-02-04'}
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_incremental_new_symbol(
+        frankfurter_get_call,
+        frankfurter_response,
+        tmp_path
+):
+    frankfurter_get_call.side_effect = frankfurter_response
+    output = str(tmp_path / "rates")
+    exrates_history('2021-02-01', '2021-02-03', 'USD', ['EUR'], output=output, printable=False)
+    exrates_history('2021-02-01', '2021-02-04', 'USD', ['CAD', 'EUR'], output=output,
+                    printable=False, incremental=True)
+
+    with open(f"{output}.jsonl") as infile:
+        rows = [json.loads(line) for line in infile]
+    assert [(row['date'], row['symbol']) for row in rows] == [
+        ('2021-02-01', 'EUR'), ('2021-02-02', 'EUR'), ('2021-02-03', 'EUR'),
+        ('2021-02-01', 'CAD'), ('2021-02-02', 'CAD'), ('2021-02-03', 'CAD'),
+        ('2021-02-04', 'CAD'), ('2021-02-04', 'EUR')
+    ]
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_incremental_up_to_date(
+        frankfurter_get_call,
+        frankfurter_response,
+        tmp_path
+):
+    frankfurter_get_call.side_effect = frankfurter_response
+    output = str(tmp_path / "rates")
+    exrates_history('2021-02-01', '2021-02-04', 'USD', ['EUR'], output=output, printable=False)
+    frankfurter_get_call.reset_mock()
+
+    assert exrates_history('2021-02-01', '2021-02-04', 'USD', ['EUR'], output=output,
+                           printable=False, incremental=True) == []
+    frankfurter_get_call.assert_not_called()
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_incremental_failure_restores_file(
+        frankfurter_get_call,
+        frankfurter_response,
+        tmp_path
+):
+    frankfurter_get_call.side_effect = frankfurter_response
+    output = str(tmp_path / "rates")
+    exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR'], output=output, printable=False)
+    with open(f"{output}.jsonl", 'rb') as infile:
+        previous = infile.read()
+
+    def failing_rows(*args):
+        yield {'date': '2021-02-03', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83195}
+        raise RuntimeError
+
+    with mock.patch("exrates.iter_history", failing_rows), mock.patch("exrates.WRITE_BATCH_SIZE", 1):
+        with pytest.raises(RuntimeError):
+            exrates_history('2021-02-01', '2021-02-04', 'USD', ['EUR'], output=output,
+                            printable=False, incremental=True)
+    with open(f"{output}.jsonl", 'rb') as infile:
+        assert infile.read() == previous
+    assert [path.name for path in tmp_path.iterdir()] == ["rates.jsonl"]
+
+
+@pytest.mark.parametrize("output_format", ['jsonl', 'jsonl.gz', 'csv'])
+def test_append_replaces_file_when_closed(output_format, tmp_path):
+    output = str(tmp_path / "rates")
+    rows = [{'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82754}]
+    writer = get_writer(output, output_format)
+    writer.write_batch(rows)
+    writer.close()
+    with open(writer.file_name, 'rb') as infile:
+        previous = infile.read()
+
+    writer = get_writer(output, output_format, append=True)
+    writer.write_batch([{'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029}])
+    writer.finish()
+    # Appended rows are only visible once complete
+    with open(writer.file_name, 'rb') as infile:
+        assert infile.read() == previous
+    writer.close()
+    assert last_dates(output, output_format, 'USD', ['EUR']) == {'EUR': '2021-02-02'}
+
+
+@pytest.mark.parametrize("output_format", ['jsonl', 'jsonl.gz', 'csv'])
+def test_append_in_place(output_format, tmp_path):
+    output = str(tmp_path / "rates")
+    writer = get_writer(output, output_format)
+    writer.write_batch([{'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82754}])
+    writer.close()
+    with open(writer.file_name, 'rb') as infile:
+        previous = infile.read()
+
+    with mock.patch("exrates.writers.shutil.copy2") as copy2:
+        writer = get_writer(output, output_format, append=True, in_place=True)
+        writer.write_batch([{'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029}])
+        # A failed append is truncated away
+        writer.abort()
+        assert [path.name for path in tmp_path.iterdir()] == [f"rates.{output_format}"]
+        with open(writer.file_name, 'rb') as infile:
+            assert infile.read() == previous
+
+        writer = get_writer(output, output_format, append=True, in_place=True)
+        writer.write_batch([{'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029}])
+        writer.close()
+    copy2.assert_not_called()
+    assert last_dates(output, output_format, 'USD', ['EUR']) == {'EUR': '2021-02-02'}
+
+
+def test_gzip_last_dates_read_in_order(tmp_path):
+    output = str(tmp_path / "rates")
+    writer = get_writer(output, 'jsonl.gz')
+    writer.write_batch([
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2805},
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82754},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029},
+    ])
+    writer.close()
+
+    assert last_dates(output, 'jsonl.gz', 'USD', ['CAD', 'EUR']) == {'CAD': '2021-02-01', 'EUR': '2021-02-02'}
+
+
+def test_incremental_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        last_dates(str(tmp_path / "rates"), 'parquet', 'USD', ['EUR'])
@@ -0,0 +1,48 @@
+import pytest
+import json
+from unittest import mock
+from exrates import jsonlib
+from conftest import *
+
+ROWS = [
+    {'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029},
+    {'date': '2021-02-01', 'base': 'USD', 'symbol': 'JPY', 'rate': 104.9},
+]
+
+
+@pytest.fixture(params=["json", "orjson"])
+def backend(request):
+    orjson = pytest.importorskip("orjson") if request.param == "orjson" else None
+    with mock.patch("exrates.jsonlib.BACKEND", request.param), \
+            mock.patch("exrates.jsonlib.orjson", orjson, create=True):
+        yield request.param
+
+
+def test_loads(backend):
+    assert jsonlib.loads(b'{"rates": {"EUR": 0.83029}}') == {'rates': {'EUR': 0.83029}}
+    assert jsonlib.loads('{"name": "Polish Z\\u0142oty"}') == {'name': 'Polish Złoty'}
+
+
+def test_dump_lines(backend):
+    # Same layout as json.dumps, whichever backend is installed
+    assert jsonlib.dump_lines(ROWS) == (
+        b'{"date": "2021-02-01", "base": "USD", "symbol": "EUR", "rate": 0.83029}\n'
+        b'{"date": "2021-02-01", "base": "USD", "symbol": "JPY", "rate": 104.9}\n'
+    )
+    assert jsonlib.dump_lines(ROWS) == ''.join(f"{json.dumps(row)}\n" for row in ROWS).encode('utf-8')
+    assert jsonlib.dump_lines([]) == b''
+    assert [jsonlib.loads(line) for line in jsonlib.dump_lines(ROWS).splitlines()] == ROWS
+
+
+def test_dump_lines_compact(backend):
+    assert jsonlib.dump_lines(ROWS, compact=True) == (
+        b'{"date":"2021-02-01","base":"USD","symbol":"EUR","rate":0.83029}\n'
+        b'{"date":"2021-02-01","base":"USD","symbol":"JPY","rate":104.9}\n'
+    )
+    with mock.patch("exrates.jsonlib.COMPACT", True):
+        assert jsonlib.dump_lines(ROWS) == jsonlib.dump_lines(ROWS, compact=True)
+
+
+def test_dumps(backend):
+    assert jsonlib.dumps({'name': 'Polish Złoty'}) == b'{"name": "Polish Z\\u0142oty"}'
+    assert jsonlib.dumps({'name': 'Polish Złoty'}, compact=True) == '{"name":"Polish Złoty"}'.encode('utf-8')
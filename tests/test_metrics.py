@@ -0,0 +1,80 @@
+import pytest
+import sys
+from unittest import mock
+import exrates
+from conftest import *
+from exrates.client import FrankfurterClient
+from exrates.metrics import Metrics, STAGES
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    metrics = Metrics()
+    exrates.set_metrics(metrics)
+    yield metrics
+    exrates.set_metrics(None)
+
+
+@pytest.fixture()
+def client(stub_server):
+    host, port = stub_server.server_address
+    frankfurter_client = FrankfurterClient(f"http://{host}:{port}", backoff_factor=0, max_retries=2)
+    exrates.set_client(frankfurter_client)
+    yield frankfurter_client
+    exrates.set_client(None)
+    frankfurter_client.close()
+
+
+def test_timers_and_counters(metrics):
+    with metrics.timer('fetch'):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.timer('fetch'):
+            raise ValueError()
+    metrics.count('bytes_received', 100)
+    metrics.count('retries')
+
+    stats = metrics.stats()
+    assert stats['stages']['fetch']['calls'] == 2
+    assert stats['stages']['fetch']['seconds'] >= 0
+    assert stats['stages']['write'] == {'calls': 0, 'seconds': 0.0}
+    assert stats['counters']['bytes_received'] == 100
+    assert stats['counters']['retries'] == 1
+
+    metrics.reset()
+    assert metrics.stats()['counters']['bytes_received'] == 0
+
+
+def test_prometheus(metrics):
+    metrics.observe('decode', 0.5)
+    metrics.count('requests', 3)
+    text = metrics.prometheus()
+    assert 'exrates_stage_seconds_total{stage="decode"} 0.5\n' in text
+    assert 'exrates_stage_calls_total{stage="decode"} 1\n' in text
+    assert '# TYPE exrates_requests_total counter\n' in text
+    assert 'exrates_requests_total 3\n' in text
+    assert all(f'stage="{stage}"' in text for stage in STAGES)
+
+
+def test_history_stages(metrics, stub_server, client, tmp_path, capsys):
+    stub_server.failures = 1
+    exrates.stream_history("2021-02-02", "2021-02-02", "USD", ["EUR"], str(tmp_path / "rates"), printable=True)
+
+    stats = metrics.stats()
+    assert stats['counters']['requests'] == 1
+    assert stats['counters']['retries'] == 1
+    assert stats['counters']['rows'] == 1
+    assert stats['counters']['bytes_received'] > 0
+    for stage in STAGES:
+        assert stats['stages'][stage]['calls'] >= 1
+
+
+def test_stats_option(metrics, capsys):
+    rows = {'2021-02-02': {'EUR': 0.83029}}
+    with mock.patch("exrates.fetch_rates", return_value=rows), \
+            mock.patch.object(sys, 'argv', "exrates --stats history -f 2021-02-02 -t 2021-02-02 -s EUR".split()):
+        exrates.main_impl()
+    captured = capsys.readouterr()
+    assert '"symbol": "EUR"' in captured.out
+    assert 'transform' in captured.err
+    assert 'rows' in captured.err
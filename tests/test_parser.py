@@ -1,5 +1,6 @@
 import pytest
-from exrates import parse_args
+from unittest import mock
+from exrates import parse_args, selected_command
 from conftest import *
 
 
@@ -35,3 +36,86 @@ def test_convert_wrong_symbols(convert_wrong_symbols):
     for item in convert_wrong_symbols:
         with pytest.raises(SystemExit):
             parse_args(item.split())
+
+
+def test_convert_batch_args():
+    args = parse_args("convert-batch --input ledger.csv --output-format jsonl".split())
+    assert args.input == "ledger.csv"
+    assert args.output is None
+    assert args.output_format == "jsonl"
+    with pytest.raises(SystemExit):
+        parse_args("convert-batch --output converted.csv".split())
+
+
+def test_serve_args():
+    args = parse_args("serve --port 9000".split())
+    assert args.host == "127.0.0.1"
+    assert args.port == 9000
+    assert args.cache_size == 1024
+
+
+def test_selected_command():
+    assert selected_command("history --symbol USD".split()) == "history"
+    assert selected_command("--store rates.db --cross-rates convert -s USD".split()) == "convert"
+    assert selected_command("--snapshot rates.snap".split()) is None
+    assert selected_command("--http-cache http.sqlite history".split()) == "history"
+    assert selected_command([]) is None
+
+
+def test_only_selected_subcommand_is_built():
+    with mock.patch("exrates.cached_currencies") as cached_currencies:
+        args = parse_args("serve".split())
+    assert args.command == "serve"
+    cached_currencies.assert_not_called()
+    with pytest.raises(SystemExit):
+        parse_args("unknown".split())
+
+
+def test_history_bases():
+    assert parse_args("history --symbol EUR".split()).base == ["USD"]
+    assert parse_args("history --base USD CAD USD --symbol EUR".split()).base == ["USD", "CAD"]
+    assert "JPY" in parse_args("history --base all --symbol EUR".split()).base
+    with pytest.raises(SystemExit):
+        parse_args("history --base USD CAD --symbol EUR --output rates --incremental".split())
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_history_incremental_requires_appendable_format(output_format):
+    parse_args("history --symbol EUR --output rates --incremental --format csv".split())
+    with pytest.raises(SystemExit):
+        parse_args(f"history --symbol EUR --output rates --incremental --format {output_format}".split())
+
+
+def test_analytics_args():
+    args = parse_args("analytics -f 2021-01-04 -t 2021-02-01 -s EUR CAD --window 5".split())
+    assert args.base == "USD"
+    assert args.symbol == ["EUR", "CAD"]
+    assert args.window == 5
+    assert not args.correlation
+    with pytest.raises(SystemExit):
+        parse_args("analytics -s EUR --window 0".split())
+    with pytest.raises(SystemExit):
+        parse_args("analytics -f 2021-02-01 -t 2021-01-04 -s EUR".split())
+
+
+def test_batch_args():
+    args = parse_args("batch --jobs jobs.jsonl --workers 0".split())
+    assert args.jobs == "jobs.jsonl"
+    assert args.output_dir == "."
+    assert args.workers == 0
+    with pytest.raises(SystemExit):
+        parse_args("batch --output-dir out".split())
+    with pytest.raises(SystemExit):
+        parse_args("batch --jobs jobs.jsonl --workers -1".split())
+
+
+def test_watch_args():
+    args = parse_args("watch -s EUR CAD --output rates --format csv".split())
+    assert args.base == "USD"
+    assert args.symbol == ["EUR", "CAD"]
+    assert args.output == "rates"
+    assert args.interval == 60
+    with pytest.raises(SystemExit):
+        parse_args("watch -s EUR --format parquet".split())
+    with pytest.raises(SystemExit):
+        parse_args("watch -s EUR --interval 0".split())
@@ -0,0 +1,171 @@
+import pytest
+import json
+import threading
+import time
+import urllib.request
+from urllib.error import HTTPError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import mock
+from conftest import *
+from exrates.server import RateCache, RateServer, LatencyHistogram
+
+
+@pytest.fixture()
+def daily_rates():
+    return {
+        '2021-02-01': {'CAD': 1.2805, 'EUR': 0.82754},
+        '2021-02-02': {'CAD': 1.2794, 'EUR': 0.83029},
+        '2021-02-03': {'CAD': 1.2831, 'EUR': 0.83292},
+    }
+
+
+@pytest.fixture()
+def eur_rates():
+    return {
+        '2021-02-01': {'CAD': 1.5474, 'USD': 1.2084},
+        '2021-02-02': {'CAD': 1.5409, 'USD': 1.2044},
+        '2021-02-03': {'CAD': 1.5405, 'USD': 1.2006},
+    }
+
+
+@pytest.fixture()
+def upstream(daily_rates, eur_rates):
+    # Answers range URLs as the Frankfurter API would, slowly enough for requests to overlap
+    def response(url):
+        time.sleep(0.05)
+        dates, query = url.split('?')
+        start, _, end = dates.partition('..')
+        end = end or start
+        base = 'EUR' if 'from=EUR' in query else 'USD'
+        return {
+            'base': base,
+            'start_date': start,
+            'end_date': end,
+            'rates': {
+                date: rates
+                for date, rates in (eur_rates if base == 'EUR' else daily_rates).items()
+                if start <= date <= end
+            }
+        }
+    with mock.patch("exrates.frankfurter_get_call", side_effect=response) as frankfurter_get_call:
+        yield frankfurter_get_call
+
+
+@pytest.fixture()
+def rate_server():
+    server = RateServer(("127.0.0.1", 0), cache_size=8)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path):
+    url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read().decode('utf-8')
+    except HTTPError as ex:
+        return ex.code, ex.read().decode('utf-8')
+
+
+def test_history(upstream, rate_server):
+    status, body = get(rate_server, "/history?start=2021-02-01&end=2021-02-02&base=USD&symbol=EUR,CAD")
+
+    assert status == 200
+    assert json.loads(body) == [
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2805},
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82754},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2794},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029},
+    ]
+    # Same symbols in another order are answered from memory
+    status, _ = get(rate_server, "/history?start=2021-02-01&end=2021-02-02&base=USD&symbol=CAD&symbol=EUR")
+    assert status == 200
+    assert upstream.call_count == 1
+    assert rate_server.cache.stats()['hits'] == 1
+
+
+def test_convert(upstream, rate_server):
+    status, body = get(rate_server, "/convert?date=2021-02-03&base=USD&symbol=EUR&amount=50")
+
+    assert status == 200
+    assert json.loads(body)['value'] == 41.646
+
+
+def test_default_date_is_computed_per_request(upstream, rate_server):
+    with mock.patch("exrates.current_date", return_value='2021-02-03'):
+        status, body = get(rate_server, "/convert?base=USD&symbol=EUR&amount=50")
+
+    assert status == 200
+    assert json.loads(body)['date'] == '2021-02-03'
+
+
+def test_unexpected_errors(upstream, rate_server):
+    upstream.side_effect = RuntimeError("Unexpected")
+    status, body = get(rate_server, "/history?start=2021-02-01&end=2021-02-02&symbol=EUR")
+
+    assert status == 500
+    assert json.loads(body) == {'error': "Internal server error"}
+
+
+@pytest.mark.parametrize('path,status', [
+    ("/history?start=2021-02-03&end=2021-02-01&symbol=EUR", 400),
+    ("/history?start=2021-02-01&end=2021-02-03", 400),
+    ("/convert?date=2021-02-30&symbol=EUR&amount=1", 400),
+    ("/convert?date=2021-02-03&symbol=EUR&amount=many", 400),
+    ("/convert?date=2021-02-03&symbol=JPY&amount=1", 404),
+    ("/unknown", 404),
+])
+def test_invalid_requests(upstream, rate_server, path, status):
+    assert get(rate_server, path)[0] == status
+
+
+def test_concurrent_requests_coalesced(upstream, rate_server):
+    path = "/history?start=2021-02-01&end=2021-02-03&base=USD&symbol=EUR"
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda _: get(rate_server, path), range(8)))
+
+    assert len({body for _, body in responses}) == 1
+    assert upstream.call_count == 1
+
+
+def test_metrics(upstream, rate_server):
+    get(rate_server, "/history?start=2021-02-01&end=2021-02-01&symbol=EUR")
+    get(rate_server, "/history?start=2021-02-01&end=2021-02-01&symbol=EUR")
+    status, body = get(rate_server, "/metrics")
+
+    assert status == 200
+    assert 'exrates_request_duration_seconds_bucket{endpoint="/history",le="+Inf"} 2' in body
+    assert 'exrates_request_duration_seconds_count{endpoint="/history"} 2' in body
+    assert 'exrates_request_duration_seconds_count{endpoint="/convert"} 0' in body
+    assert 'exrates_rate_cache_hits 1' in body
+    assert 'exrates_stage_seconds_total{stage="transform"}' in body
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(seconds)
+
+    assert histogram.cumulative() == [('0.1', 2), ('1.0', 3), ('+Inf', 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+
+
+def test_rate_cache_eviction_and_expiry():
+    cache = RateCache(max_size=2, ttl=60)
+    published = datetime(2021, 2, 3, tzinfo=timezone.utc).timestamp()
+    cache.put(('2021-02-01', '2021-02-01', 'USD', ('EUR',)), {}, fetched_at=published)
+    cache.put(('2021-02-02', '2021-02-02', 'USD', ('EUR',)), {}, fetched_at=published)
+    cache.put(('2999-01-01', '2999-01-01', 'USD', ('EUR',)), {}, fetched_at=0)
+
+    # Least recently used table is evicted
+    assert cache.get(('2021-02-01', '2021-02-01', 'USD', ('EUR',))) is None
+    # Published rates never expire
+    assert cache.get(('2021-02-02', '2021-02-02', 'USD', ('EUR',))) == {}
+    # Rates that can still change expire after ttl
+    assert cache.get(('2999-01-01', '2999-01-01', 'USD', ('EUR',)), now=30) == {}
+    assert cache.get(('2999-01-01', '2999-01-01', 'USD', ('EUR',)), now=60) is None
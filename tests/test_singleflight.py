@@ -0,0 +1,104 @@
+import pytest
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from conftest import *
+from exrates.singleflight import AsyncSingleFlight, SingleFlight, normalize_url
+
+
+@pytest.mark.parametrize('url,expected', [
+    ("latest", "latest"),
+    ("/latest", "latest"),
+    ("2021-02-02?to=EUR,CAD&from=USD", "2021-02-02?from=USD&to=CAD,EUR"),
+    ("2021-02-01..2021-02-02?from=USD&to=EUR", "2021-02-01..2021-02-02?from=USD&to=EUR"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_concurrent_calls_are_coalesced():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow(value):
+        calls.append(value)
+        release.wait(5)
+        return {'value': value}
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(flight.do, 'key', slow, 1) for _ in range(4)]
+        while flight.deduplicated < 3:
+            time.sleep(0.001)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert flight.in_flight() == 0
+    # Later calls are not coalesced with finished ones
+    assert flight.do('key', lambda: 'again') == 'again'
+
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("failed")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(flight.do, 'key', failing) for _ in range(2)]
+        while flight.deduplicated < 1:
+            time.sleep(0.001)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+
+def test_async_calls_are_coalesced():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def slow(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def run():
+        return await asyncio.gather(*(flight.do('key', slow, 1) for _ in range(5)))
+
+    assert asyncio.run(run()) == [1] * 5
+    assert calls == [1]
+    assert flight.deduplicated == 4
+    assert flight.in_flight() == 0
+
+
+def test_async_call_cancelled_with_last_caller():
+    flight = AsyncSingleFlight()
+
+    async def run():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(5)
+
+        first = asyncio.ensure_future(flight.do('key', slow))
+        second = asyncio.ensure_future(flight.do('key', slow))
+        await started.wait()
+        call = flight._calls['key']
+        first.cancel()
+        await asyncio.sleep(0)
+        # Still awaited by the second caller
+        assert not call.task.cancelled()
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return call.task.cancelled()
+
+    assert asyncio.run(run())
+    assert flight.in_flight() == 0
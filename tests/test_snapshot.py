@@ -0,0 +1,108 @@
+import pytest
+import math
+from unittest import mock
+from conftest import *
+from exrates import exrates_convert, exrates_history, set_snapshot
+from exrates.cross import derive_rates
+from exrates.snapshot import Snapshot, export_snapshot, write_snapshot
+
+
+@pytest.fixture()
+def anchor_rates():
+    # Friday, then Monday. HRK is not published on Monday
+    return {
+        '2021-02-05': {'CAD': 1.5389, 'HRK': 7.5705, 'USD': 1.1983},
+        '2021-02-08': {'CAD': 1.5355, 'USD': 1.2060},
+    }
+
+
+@pytest.fixture()
+def snapshot(tmp_path, anchor_rates):
+    path = str(tmp_path / "rates.snapshot")
+    write_snapshot(path, anchor_rates)
+    with Snapshot(path) as snapshot:
+        yield snapshot
+
+
+@pytest.fixture()
+def shared_snapshot(snapshot):
+    set_snapshot(snapshot)
+    yield snapshot
+    set_snapshot(None)
+
+
+def test_snapshot_layout(snapshot, anchor_rates):
+    assert snapshot.currencies == ('CAD', 'HRK', 'USD')
+    assert (snapshot.first_date, snapshot.last_date, snapshot.days) == ('2021-02-05', '2021-02-08', 4)
+    assert snapshot.anchor_rates('2021-02-05') == anchor_rates['2021-02-05']
+    assert snapshot.anchor_rates('2021-02-08', ['USD', 'HRK', 'JPY']) == {'USD': 1.2060}
+    assert snapshot.anchor_rates('2021-02-06') == {}
+    assert snapshot.anchor_rates('2021-03-01') == {}
+
+
+def test_snapshot_rates(snapshot, anchor_rates):
+    rates = snapshot.rates('2021-02-01', '2021-02-10', 'USD', ['CAD', 'EUR', 'HRK'])
+
+    # Weekend days are omitted
+    assert list(rates) == ['2021-02-05', '2021-02-08']
+    assert rates['2021-02-05'] == derive_rates(anchor_rates['2021-02-05'], 'USD', ['CAD', 'EUR', 'HRK'])
+    assert rates['2021-02-08'] == {'CAD': 1.2732, 'EUR': 0.82919}
+    assert snapshot.rates('2021-02-05', '2021-02-08', 'EUR', ['USD']) == {
+        '2021-02-05': {'USD': 1.1983},
+        '2021-02-08': {'USD': 1.2060}
+    }
+
+
+def test_snapshot_as_of(snapshot):
+    assert snapshot.as_of('2021-02-07') == '2021-02-05'
+    assert snapshot.as_of('2021-02-08') == '2021-02-08'
+    assert snapshot.as_of('2021-02-07', lookback_days=1) is None
+    assert snapshot.as_of('2021-02-04') is None
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_history_and_convert_from_snapshot(frankfurter_get_call, shared_snapshot):
+    history = exrates_history('2021-02-05', '2021-02-07', 'USD', ['EUR'], printable=False)
+    assert history == [{'date': '2021-02-05', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83452}]
+    # Sunday uses Friday rates
+    assert exrates_convert('2021-02-07', 'USD', 'CAD', 50.0, printable=False) == 64.212
+    with pytest.raises(ValueError):
+        exrates_convert('2021-02-08', 'USD', 'HRK', 50.0, printable=False)
+    frankfurter_get_call.assert_not_called()
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_export_snapshot(frankfurter_get_call, tmp_path, anchor_rates):
+    frankfurter_get_call.return_value = {
+        'base': 'EUR',
+        'start_date': '2021-02-05',
+        'end_date': '2021-02-08',
+        'rates': anchor_rates
+    }
+    path = str(tmp_path / "rates.snapshot")
+
+    assert export_snapshot(path, '2021-02-05', '2021-02-08', ['CAD', 'HRK', 'USD']) == 2
+    frankfurter_get_call.assert_called_once_with("2021-02-05..2021-02-08?from=EUR&to=CAD,HRK,USD")
+    with Snapshot(path) as snapshot:
+        assert snapshot.rates('2021-02-05', '2021-02-08', 'EUR', ['CAD']) == {
+            '2021-02-05': {'CAD': 1.5389},
+            '2021-02-08': {'CAD': 1.5355}
+        }
+
+
+def test_snapshot_to_numpy(snapshot):
+    np = pytest.importorskip("numpy")
+    matrix = snapshot.to_numpy()
+
+    assert matrix.shape == (4, 3)
+    assert matrix[0].tolist() == [1.5389, 7.5705, 1.1983]
+    assert np.isnan(matrix[1]).all()
+    assert math.isnan(matrix[3, 1])
+    del matrix
+
+
+def test_invalid_snapshot(tmp_path):
+    path = tmp_path / "rates.snapshot"
+    path.write_bytes(b"not a snapshot at all, but long enough")
+    with pytest.raises(ValueError):
+        Snapshot(str(path))
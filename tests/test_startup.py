@@ -0,0 +1,54 @@
+import typing as t
+import os
+import subprocess
+import sys
+import exrates
+from conftest import *
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cumulative microseconds allowed to import exrates, as reported by -X importtime
+IMPORT_TIME_BUDGET_US = 100_000
+# Modules only needed to call the API or read stores, never imported by import exrates
+LAZY_MODULES = ('requests', 'urllib3', 'asyncio', 'sqlite3', 'concurrent.futures', 'mmap')
+
+
+def import_times(code: str) -> t.Dict[str, int]:
+    """
+    Runs code in a new interpreter with -X importtime
+    :param code: Code to run
+    :return: Dict of imported modules and their cumulative import time in microseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env={**os.environ, "PYTHONPATH": ROOT},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_is_within_budget():
+    # Best of several runs, so a busy machine does not fail the test
+    cumulative = min(import_times("import exrates")["exrates"] for _ in range(3))
+    assert cumulative < IMPORT_TIME_BUDGET_US
+
+
+def test_import_skips_lazy_modules():
+    times = import_times("import exrates")
+    assert [module for module in LAZY_MODULES if module in times] == []
+
+
+def test_lazy_attributes():
+    from exrates.client import FrankfurterClient
+    from exrates.store import RateStore
+    assert exrates.FrankfurterClient is FrankfurterClient
+    assert exrates.RateStore is RateStore
+    with pytest.raises(AttributeError):
+        exrates.missing_attribute
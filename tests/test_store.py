@@ -0,0 +1,119 @@
+import pytest
+import requests
+from unittest import mock
+from conftest import *
+from exrates import exrates_history, exrates_convert
+from exrates.store import RateStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    rate_store = RateStore(str(tmp_path / "rates.sqlite"))
+    yield rate_store
+    rate_store.close()
+
+
+@pytest.fixture()
+def frankfurter_response():
+    return {
+        'amount': 1.0,
+        'base': 'USD',
+        'start_date': '2021-01-29',
+        'end_date': '2021-02-02',
+        'rates':
+            {
+                '2021-01-29': {'CAD': 1.2795, 'EUR': 0.82481},
+                '2021-02-01': {'CAD': 1.2805, 'EUR': 0.82754},
+                '2021-02-02': {'CAD': 1.2805, 'EUR': 0.83029}
+            }
+    }
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_history_served_from_store(
+        frankfurter_get_call,
+        store,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    first = exrates_history('2021-01-29', '2021-02-02', 'USD', ['CAD', 'EUR'], printable=False, store=store)
+    second = exrates_history('2021-01-29', '2021-02-02', 'USD', ['EUR', 'CAD'], printable=False, store=store)
+
+    assert frankfurter_get_call.call_count == 1
+    assert first == second
+    assert [line['date'] for line in first] == ['2021-01-29'] * 2 + ['2021-02-01'] * 2 + ['2021-02-02'] * 2
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_history_requests_only_missing(
+        frankfurter_get_call,
+        store,
+        frankfurter_response
+):
+    frankfurter_get_call.return_value = frankfurter_response
+    exrates_history('2021-01-29', '2021-01-30', 'USD', ['EUR'], printable=False, store=store)
+    exrates_history('2021-01-29', '2021-02-02', 'USD', ['EUR'], printable=False, store=store)
+
+    urls = [call.args[0] for call in frankfurter_get_call.call_args_list]
+    assert urls == [
+        "2021-01-29?from=USD&to=EUR",
+        "2021-02-01..2021-02-02?from=USD&to=EUR"
+    ]
+
+
+def test_store_missing_runs(store):
+    store.put('USD', ['EUR'], '2021-02-01', '2021-02-02', {'2021-02-01': {'EUR': 0.82754}}, fetched_at=1e10)
+
+    assert store.missing('USD', ['EUR'], '2021-01-31', '2021-02-03') == [
+        ('2021-01-31', '2021-01-31', ['EUR']),
+        ('2021-02-03', '2021-02-03', ['EUR'])
+    ]
+    assert store.missing('USD', ['CAD', 'EUR'], '2021-02-01', '2021-02-02') == [
+        ('2021-02-01', '2021-02-02', ['CAD'])
+    ]
+
+
+def test_store_unpublished_entries_expire(store):
+    # Entry retrieved the same day, before rates were published
+    fetched_at = datetime(2021, 2, 2, 9).timestamp()
+    store.put('USD', ['EUR'], '2021-02-02', '2021-02-02', {}, fetched_at=fetched_at)
+
+    assert store.missing('USD', ['EUR'], '2021-02-02', '2021-02-02', now=fetched_at + 60) == []
+    assert store.missing('USD', ['EUR'], '2021-02-02', '2021-02-02', now=fetched_at + store.today_ttl) == [
+        ('2021-02-02', '2021-02-02', ['EUR'])
+    ]
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_convert_on_weekend_uses_last_publication(
+        frankfurter_get_call,
+        store
+):
+    # Conversions use EUR based rates, as published
+    store.put('EUR', ['USD'], '2021-01-21', '2021-02-02', {'2021-01-29': {'USD': 1.2136}})
+
+    conversion = exrates_convert('2021-01-31', 'USD', 'EUR', 50.0, printable=False, store=store)
+    assert conversion == 41.2
+    frankfurter_get_call.assert_not_called()
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_failed_requests_are_not_stored(
+        frankfurter_get_call,
+        store,
+        frankfurter_response
+):
+    frankfurter_get_call.side_effect = requests.exceptions.ConnectionError
+    with pytest.raises(requests.exceptions.ConnectionError):
+        exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR'], printable=False, store=store)
+    assert store.missing('USD', ['EUR'], '2021-02-01', '2021-02-02') == [('2021-02-01', '2021-02-02', ['EUR'])]
+
+    # A response cut short is empty, and not stored as days without publication
+    frankfurter_get_call.side_effect = None
+    frankfurter_get_call.return_value = {}
+    assert exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR'], printable=False, store=store) == []
+    assert store.missing('USD', ['EUR'], '2021-02-01', '2021-02-02') == [('2021-02-01', '2021-02-02', ['EUR'])]
+
+    frankfurter_get_call.return_value = frankfurter_response
+    assert len(exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR'], printable=False, store=store)) == 2
+    assert store.missing('USD', ['EUR'], '2021-02-01', '2021-02-02') == []
@@ -0,0 +1,117 @@
+import pytest
+import json
+import shutil
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from conftest import *
+from exrates.watch import MAX_SLEEP, Watcher, poll_delay
+
+RATES = {
+    '2021-01-29': {'CAD': 1.2779, 'EUR': 0.82399},
+    '2021-02-01': {'CAD': 1.2805, 'EUR': 0.82754},
+    '2021-02-02': {'CAD': 1.2805, 'EUR': 0.83029},
+}
+PUBLISHED_AT = datetime(2021, 2, 2, 14, 10, tzinfo=timezone.utc)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    """
+    Clock advanced by the watcher sleeps, answering API calls with the rates published so far
+    """
+
+    def __init__(self, now):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += timedelta(seconds=seconds)
+
+    def response(self, url):
+        url = urlsplit(url)
+        start, _, end = url.path.partition('..')
+        symbols = parse_qs(url.query)['to'][0].split(',')
+        published = {
+            date: {symbol: rate for symbol, rate in rates.items() if symbol in symbols}
+            for date, rates in RATES.items()
+            if date != '2021-02-02' or self.now >= PUBLISHED_AT
+        }
+        if not end:
+            # Days without publication get the previous published rates
+            date = max(date for date in published if date <= start)
+            return {'base': 'USD', 'date': date, 'rates': published[date]}
+        return {
+            'base': 'USD', 'start_date': start, 'end_date': end,
+            'rates': {date: rates for date, rates in published.items() if start <= date <= end}
+        }
+
+
+def test_poll_delay():
+    # Monday before, within and after the publication window
+    assert poll_delay(utc(2021, 2, 1, 13, 30), False) == 25 * 60
+    assert poll_delay(utc(2021, 2, 1, 14, 30), False, interval=30) == 30
+    assert poll_delay(utc(2021, 2, 1, 18, 0), False, slow_interval=600) == 600
+    assert poll_delay(utc(2021, 2, 1, 10, 0), False) == MAX_SLEEP
+    with mock.patch("exrates.watch.MAX_SLEEP", 10 ** 6):
+        # Published on Friday, next window on Monday
+        assert poll_delay(utc(2021, 2, 5, 15, 0), True) == (2 * 24 + 22) * 3600 + 55 * 60
+        # Saturday
+        assert poll_delay(utc(2021, 2, 6, 13, 55), False) == 2 * 24 * 3600
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_watch_outputs_new_rows(frankfurter_get_call, capsys):
+    clock = FakeClock(utc(2021, 2, 2, 13, 0))
+    frankfurter_get_call.side_effect = clock.response
+    watcher = Watcher('USD', ['EUR', 'CAD'], clock=clock, sleep=clock.sleep)
+
+    assert watcher.run(max_polls=20) == 2
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(row['date'], row['symbol'], row['rate']) for row in rows] == [
+        ('2021-02-02', 'CAD', 1.2805), ('2021-02-02', 'EUR', 0.83029)
+    ]
+    # Waits for the window, then polls every minute until publication, then waits for the next day
+    assert clock.sleeps[:3] == [55 * 60, 60, 60]
+    assert clock.sleeps[16:] == [MAX_SLEEP] * 4
+    # The priming request and a request per poll until publication
+    assert frankfurter_get_call.call_count == 1 + 1 + 16
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_watch_appends_missing_rows_to_output(frankfurter_get_call, tmp_path):
+    output = str(tmp_path / "rates")
+    with open(f"{output}.jsonl", 'w') as outfile:
+        outfile.write(json.dumps({'date': '2021-01-29', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82399}) + '\n')
+    clock = FakeClock(utc(2021, 2, 2, 15, 0))
+    frankfurter_get_call.side_effect = clock.response
+    watcher = Watcher('USD', ['EUR'], output, printable=False, clock=clock, sleep=clock.sleep)
+
+    assert watcher.run(max_polls=1) == 2
+    with open(f"{output}.jsonl") as infile:
+        assert [json.loads(line)['date'] for line in infile] == ['2021-01-29', '2021-02-01', '2021-02-02']
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_watch_copies_output_once(frankfurter_get_call, tmp_path):
+    output = str(tmp_path / "rates")
+    with open(f"{output}.jsonl", 'w') as outfile:
+        outfile.write(json.dumps({'date': '2021-01-29', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82399}) + '\n')
+    clock = FakeClock(utc(2021, 2, 2, 13, 0))
+    frankfurter_get_call.side_effect = clock.response
+    watcher = Watcher('USD', ['EUR'], output, printable=False, clock=clock, sleep=clock.sleep)
+
+    with mock.patch("exrates.writers.shutil.copy2", wraps=shutil.copy2) as copy2:
+        assert watcher.run(max_polls=20) == 2
+    # Missing rows are appended to a copy at startup, the published row in place
+    copy2.assert_called_once()
+    with open(f"{output}.jsonl") as infile:
+        assert [json.loads(line)['date'] for line in infile] == ['2021-01-29', '2021-02-01', '2021-02-02']
+    assert [path.name for path in tmp_path.iterdir()] == ["rates.jsonl"]
@@ -0,0 +1,69 @@
+import pytest
+import csv
+import gzip
+import json
+import os
+from unittest import mock
+from conftest import *
+from exrates import exrates_history
+from exrates.writers import get_writer
+
+
+@pytest.fixture()
+def rows():
+    return [
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2805},
+        {'date': '2021-02-01', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.82754},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'CAD', 'rate': 1.2805},
+        {'date': '2021-02-02', 'base': 'USD', 'symbol': 'EUR', 'rate': 0.83029}
+    ]
+
+
+def write(output, output_format, rows):
+    writer = get_writer(output, output_format)
+    writer.write_batch(rows[:3])
+    writer.write_batch(rows[3:])
+    writer.close()
+    return writer.file_name
+
+
+def test_jsonl_writers(tmp_path, rows):
+    with open(write(str(tmp_path / "rates"), 'jsonl', rows)) as infile:
+        assert [json.loads(line) for line in infile] == rows
+    with gzip.open(write(str(tmp_path / "rates"), 'jsonl.gz', rows), 'rt') as infile:
+        assert [json.loads(line) for line in infile] == rows
+
+
+def test_csv_writer(tmp_path, rows):
+    with open(write(str(tmp_path / "rates"), 'csv', rows), newline='') as infile:
+        assert [{**row, 'rate': float(row['rate'])} for row in csv.DictReader(infile)] == rows
+
+
+def test_arrow_writers(tmp_path, rows):
+    pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    table = pyarrow.parquet.read_table(write(str(tmp_path / "rates"), 'parquet', rows))
+    assert table.to_pylist() == rows
+    with pyarrow.ipc.open_file(write(str(tmp_path / "rates"), 'arrow', rows)) as reader:
+        assert reader.num_record_batches == 2
+        assert reader.read_all().to_pylist() == rows
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        get_writer(str(tmp_path / "rates"), 'xml')
+
+
+@mock.patch("exrates.frankfurter_get_call")
+def test_failed_history_keeps_previous_file(frankfurter_get_call, tmp_path, rows):
+    output = str(tmp_path / "rates")
+    file_name = write(output, 'csv', rows)
+    frankfurter_get_call.side_effect = RuntimeError
+    with pytest.raises(RuntimeError):
+        exrates_history('2021-02-01', '2021-02-02', 'USD', ['EUR'], output=output, output_format='csv')
+
+    assert os.listdir(tmp_path) == ["rates.csv"]
+    with open(file_name, newline='') as infile:
+        assert len(list(csv.DictReader(infile))) == 4